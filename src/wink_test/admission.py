@@ -0,0 +1,269 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, suppress
+
+import redis.asyncio as redis
+from pydantic import BaseModel, NonNegativeInt, PositiveFloat, PositiveInt, ValidationError
+
+__all__ = (
+    "AdmissionSettings",
+    "AdmissionController",
+    "TokenBucketRateLimiter",
+)
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionSettings(BaseModel):
+    """
+    Модель настроек контроля допуска запросов к балансировщику. Ограничения действуют в пределах одного воркера, а сами
+    пороги общие для всех воркеров: изменённые через API, они хранятся в Redis.
+    """
+
+    max_concurrency: PositiveInt = 256
+    """
+    Максимальное количество одновременно обрабатываемых запросов.
+    """
+
+    max_queue_size: NonNegativeInt = 1024
+    """
+    Максимальное количество запросов, ожидающих обработки. Запросы сверх этого количества сразу отклоняются.
+    """
+
+    queue_timeout: PositiveFloat = 0.5
+    """
+    Максимальное время ожидания в очереди (в секундах).
+    """
+
+    retry_after: PositiveInt = 1
+    """
+    Значение заголовка `Retry-After` (в секундах) для отклонённых запросов.
+    """
+
+    degrade_to_cdn: bool = False
+    """
+    Вместо отклонения запроса с кодом 503 сразу делать редирект на CDN без обращения к счетчику.
+    """
+
+    rate_limit: PositiveFloat | None = None
+    """
+    Количество запросов в секунду для одного клиента. Если не задано, ограничение не применяется.
+    """
+
+    rate_limit_burst: PositiveInt = 20
+    """
+    Размер "ведра" токенов клиента - максимальное количество запросов, выполняемых подряд.
+    """
+
+    rate_limit_max_clients: PositiveInt = 65536
+    """
+    Максимальное количество отслеживаемых клиентов. Давно не обращавшиеся клиенты вытесняются.
+    """
+
+    sync_interval: PositiveFloat = 1.0
+    """
+    Интервал проверки порогов в Redis (в секундах): за это время изменение порогов доходит до всех воркеров.
+    """
+
+
+class TokenBucketRateLimiter:
+    """
+    Ограничитель частоты запросов клиентов по алгоритму "ведра токенов". Хранит состояние в памяти воркера.
+    """
+
+    def __init__(self, rate: float, burst: int, max_clients: int):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self.buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        """
+        Количество токенов и время последнего обновления для каждого клиента, в порядке последнего обращения.
+        """
+
+    def allow(self, client: str) -> bool:
+        """
+        Расходует токен клиента. Возвращает `False`, если токенов не осталось.
+        """
+
+        now = time.monotonic()
+        if bucket := self.buckets.get(client):
+            tokens, updated_at = bucket
+            tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+            self.buckets.move_to_end(client)
+        else:
+            tokens = self.burst
+
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+
+        self.buckets[client] = (tokens, now)
+        if len(self.buckets) > self.max_clients:
+            self.buckets.popitem(last=False)
+        return allowed
+
+
+class AdmissionController:
+    """
+    Ограничивает количество одновременно обрабатываемых запросов с ограниченной очередью ожидания.
+    """
+
+    redis_key = "admission-settings"
+    """
+    Ключ Redis с порогами, заданными через `PUT /settings/admission`.
+    """
+
+    def __init__(self, settings: AdmissionSettings):
+        self.settings = settings
+        self.rate_limiter: TokenBucketRateLimiter | None = None
+        self.active_count = 0
+        self.admitted_count = 0
+        self.shed_count = 0
+        self.rate_limited_count = 0
+        self.degraded_count = 0
+        self._waiters: deque[asyncio.Future[None]] = deque()
+        self._stored_settings: str | None = None
+        """
+        Последнее применённое значение ключа Redis.
+        """
+        self.update_settings(settings)
+
+    @property
+    def queued_count(self) -> int:
+        return len(self._waiters)
+
+    def update_settings(self, settings: AdmissionSettings):
+        """
+        Применяет новые настройки без перезапуска. Состояние ограничителя частоты сохраняется, если он уже был включён.
+        """
+
+        self.settings = settings
+        if settings.rate_limit:
+            if self.rate_limiter:
+                self.rate_limiter.rate = settings.rate_limit
+                self.rate_limiter.burst = settings.rate_limit_burst
+                self.rate_limiter.max_clients = settings.rate_limit_max_clients
+            else:
+                self.rate_limiter = TokenBucketRateLimiter(
+                    settings.rate_limit, settings.rate_limit_burst, settings.rate_limit_max_clients
+                )
+        else:
+            self.rate_limiter = None
+
+        self._wake_waiters()
+
+    async def save_settings(self, redis_client: redis.Redis, settings: AdmissionSettings):
+        """
+        Сохраняет пороги в Redis и применяет их. Остальные воркеры применяют их при следующей проверке.
+        """
+
+        dumped_settings = settings.model_dump_json()
+        await redis_client.set(self.redis_key, dumped_settings)
+        self._stored_settings = dumped_settings
+        self.update_settings(settings)
+
+    async def sync_settings(self, redis_client: redis.Redis) -> bool:
+        """
+        Применяет пороги из Redis, если они изменились. Возвращает `True`, если пороги были применены.
+        """
+
+        raw_value = await redis_client.get(self.redis_key)
+        if raw_value is None:
+            return False
+        dumped_settings = raw_value.decode() if isinstance(raw_value, bytes) else raw_value
+        if dumped_settings == self._stored_settings:
+            return False
+
+        self._stored_settings = dumped_settings
+        try:
+            settings = AdmissionSettings.model_validate_json(dumped_settings)
+        except ValidationError:
+            logger.warning("Пороги контроля допуска в Redis некорректны: %s", dumped_settings)
+            return False
+        self.update_settings(settings)
+        return True
+
+    @asynccontextmanager
+    async def run(self, redis_client: redis.Redis):
+        """
+        Менеджер контекста, в рамках которого пороги периодически синхронизируются с Redis.
+        """
+
+        task = asyncio.create_task(self._sync_periodically(redis_client))
+        try:
+            yield
+        finally:
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+
+    async def _sync_periodically(self, redis_client: redis.Redis):
+        while True:
+            try:
+                await self.sync_settings(redis_client)
+            except Exception:
+                logger.exception("Не удалось прочитать пороги контроля допуска из Redis")
+            await asyncio.sleep(self.settings.sync_interval)
+
+    def allow_client(self, client: str) -> bool:
+        """
+        Проверяет ограничение частоты запросов клиента.
+        """
+
+        if self.rate_limiter and not self.rate_limiter.allow(client):
+            self.rate_limited_count += 1
+            return False
+        return True
+
+    async def acquire(self) -> bool:
+        """
+        Занимает слот обработки запроса. Возвращает `False`, если запрос нужно отклонить: очередь заполнена или
+        время ожидания истекло. После обработки допущенного запроса слот нужно освободить через `release()`.
+        """
+
+        if self.active_count < self.settings.max_concurrency and not self._waiters:
+            self.active_count += 1
+            self.admitted_count += 1
+            return True
+
+        if len(self._waiters) >= self.settings.max_queue_size:
+            self.shed_count += 1
+            return False
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            async with asyncio.timeout(self.settings.queue_timeout):
+                await waiter
+        except TimeoutError:
+            # Слот мог быть передан одновременно с истечением времени ожидания.
+            if not (waiter.done() and not waiter.cancelled()):
+                self.shed_count += 1
+                return False
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            with suppress(ValueError):
+                self._waiters.remove(waiter)
+
+        self.admitted_count += 1
+        return True
+
+    def release(self):
+        """
+        Освобождает слот и передаёт его следующему запросу из очереди.
+        """
+
+        self.active_count -= 1
+        self._wake_waiters()
+
+    def _wake_waiters(self):
+        while self._waiters and self.active_count < self.settings.max_concurrency:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                self.active_count += 1
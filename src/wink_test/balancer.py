@@ -1,6 +1,10 @@
+import hashlib
 import math
+import re
+import zlib
 from contextlib import asynccontextmanager
 from fractions import Fraction
+from functools import cached_property
 from typing import Annotated, Any, Callable
 
 from asyncpg import Record
@@ -8,11 +12,14 @@ from asyncpg.pool import PoolConnectionProxy
 from pydantic import BaseModel, BeforeValidator, HttpUrl, PositiveInt, TypeAdapter, UrlConstraints, field_serializer
 
 from wink_test.postgres import Postgres
+from wink_test.url_signing import UrlSigningSettings
 
 __all__ = (
     "BalancerSettings",
     "parse_redirect_ratio",
+    "should_redirect_to_cdn",
     "calculate_should_redirect_to_cdn",
+    "rewrite_video_url_for_cdn",
     "BalancerSettingsDbModel",
 )
 
@@ -59,6 +66,11 @@ class BalancerSettings(BaseModel):
     Отношение редиректов на CDN и origin сервера.
     """
 
+    url_signing: UrlSigningSettings | None = None
+    """
+    Настройки подписи URL на CDN. Если не заданы, URL не подписываются.
+    """
+
     @field_serializer("redirect_ratio")
     def serialize_redirect_ratio(self, redirect_ratio: Fraction) -> str:
         """
@@ -66,17 +78,39 @@ class BalancerSettings(BaseModel):
         """
         return f"{redirect_ratio.numerator}:{redirect_ratio.denominator}"
 
+    @cached_property
+    def version(self) -> int:
+        """
+        Версия настроек - контрольная сумма CRC32 от сериализованных значений. Совпадает во всех воркерах. Настройки
+        подписи учитываются через SHA-256, чтобы по версии нельзя было подобрать ключи.
+        """
+        url_signing_digest = (
+            hashlib.sha256(self.url_signing.dump_json_with_secrets().encode()).hexdigest() if self.url_signing else ""
+        )
+        return zlib.crc32(
+            f"{self.cdn_host}|{self.serialize_redirect_ratio(self.redirect_ratio)}|{url_signing_digest}".encode()
+        )
+
 
 async def calculate_should_redirect_to_cdn(request_index: int, redirect_ratio: Fraction) -> bool:
     """
     Определяет, делать ли редирект на CDN. Возвращает `True`, если это так.
 
-    Каждый N-ый запрос отправляется на origin сервер, все остальные будут перенаправлены на CDN.
-
     :param request_index: порядковый номер запроса (начиная с 0).
     :param redirect_ratio: отношение количества редиректов на CDN и на origin сервера.
     """
 
+    return should_redirect_to_cdn(request_index, redirect_ratio)
+
+
+def should_redirect_to_cdn(request_index: int, redirect_ratio: Fraction) -> bool:
+    """
+    Синхронный вариант `calculate_should_redirect_to_cdn`, в котором и реализовано правило выбора.
+
+    Каждый N-ый запрос отправляется на origin сервер, все остальные будут перенаправлены на CDN. Решение зависит
+    только от номера запроса по модулю суммы числителя и знаменателя отношения.
+    """
+
     requests_count_per_block = redirect_ratio.numerator + redirect_ratio.denominator
     cdn_requests_count = redirect_ratio.numerator
     origin_servers_requests_count = redirect_ratio.denominator
@@ -90,6 +124,35 @@ async def calculate_should_redirect_to_cdn(request_index: int, redirect_ratio: F
         return (relative_request_index + 1) % do_cdn_request_at_every == 0
 
 
+file_server_subdomain_pattern = re.compile(r"^(s\d+)\.")
+"""
+Поиск поддомена файлового сервера s1, s2, ..., sN.
+"""
+
+
+def rewrite_video_url_for_cdn(video: HttpUrl, cdn_host: HttpUrl) -> HttpUrl:
+    """
+    Переписывает URL видео на origin сервере в URL на CDN: `http://s1.origin/video/1.m3u8` -> `http://cdn/s1/video/1.m3u8`.
+    Если хост видео не содержит поддомена файлового сервера, URL возвращается без изменений.
+
+    :param video: URL видео на origin сервере.
+    :param cdn_host: URL сервиса CDN.
+    """
+
+    assert video.host
+    if match := file_server_subdomain_pattern.search(video.host):
+        return HttpUrl(format_cdn_url(cdn_host, match.group(1), video.path or "/"))
+    return video
+
+
+def format_cdn_url(cdn_host: HttpUrl, file_server_subdomain: str, path: str) -> str:
+    """
+    Формирует URL на CDN для файла с файлового сервера `file_server_subdomain`.
+    """
+
+    return f"{cdn_host.scheme}://{cdn_host.host}/{file_server_subdomain}{path}"
+
+
 class BalancerSettingsDbModel:
     table_name = "settings"
 
@@ -99,8 +162,8 @@ class BalancerSettingsDbModel:
 
     @asynccontextmanager
     async def acquire_connection(self):
-        assert self.db_connection.pool
-        async with self.db_connection.pool.acquire() as conn:
+        pool = await self.db_connection.get_pool()
+        async with pool.acquire() as conn:
             yield conn
 
     async def create_table(self):
@@ -110,17 +173,20 @@ class BalancerSettingsDbModel:
                     onerow_id bool PRIMARY KEY DEFAULT true,
                     cdn_host text,
                     redirect_ratio text,
+                    url_signing text,
                     CONSTRAINT onerow_uni CHECK (onerow_id)
                 );
+                ALTER TABLE {self.table_name} ADD COLUMN IF NOT EXISTS url_signing text;
             """)
 
     async def create_object(self, settings: BalancerSettings) -> BalancerSettings:
         async with self.acquire_connection() as conn:
             dumped_settings = settings.model_dump(mode="json")
             await conn.execute(
-                f"INSERT INTO {self.table_name}(cdn_host, redirect_ratio) VALUES($1, $2);",
+                f"INSERT INTO {self.table_name}(cdn_host, redirect_ratio, url_signing) VALUES($1, $2, $3);",
                 dumped_settings["cdn_host"],
                 dumped_settings["redirect_ratio"],
+                settings.url_signing.dump_json_with_secrets() if settings.url_signing else None,
             )
 
             if new_persistent_settings := await self._get_object(conn):
@@ -134,22 +200,46 @@ class BalancerSettingsDbModel:
         async with self.acquire_connection() as conn:
             return await self._get_object(conn)
 
-    async def _get_object(self, connection: "PoolConnectionProxy[Record]") -> BalancerSettings | None:
-        record = await connection.fetchrow(f"SELECT * FROM {self.table_name} WHERE onerow_id = true;")
+    async def _get_object(
+        self, connection: "PoolConnectionProxy[Record]", for_update: bool = False
+    ) -> BalancerSettings | None:
+        lock_clause = " FOR UPDATE" if for_update else ""
+        record = await connection.fetchrow(f"SELECT * FROM {self.table_name} WHERE onerow_id = true{lock_clause};")
         if record:
             return BalancerSettings(
                 cdn_host=HttpUrl(record["cdn_host"]),
                 redirect_ratio=parse_redirect_ratio(record["redirect_ratio"]),
+                url_signing=UrlSigningSettings.model_validate_json(record["url_signing"])
+                if record["url_signing"]
+                else None,
             )
 
     async def update_object(self, settings: BalancerSettings) -> BalancerSettings | None:
+        """
+        Сохраняет настройки. Если `url_signing` не передан, настройки подписи не меняются (чтобы отключить подпись,
+        нужно явно передать `null`), а скрытые значения ключей, как их отдаёт `GET /settings`, заменяются сохранёнными.
+
+        :raises ValueError: скрытое значение у ключа, которого нет среди сохранённых.
+        """
+
         async with self.acquire_connection() as conn:
-            dumped_settings = settings.model_dump(mode="json")
-            await conn.execute(
-                f"UPDATE {self.table_name} set cdn_host = $1, redirect_ratio = $2 WHERE onerow_id = true;",
-                dumped_settings["cdn_host"],
-                dumped_settings["redirect_ratio"],
-            )
+            async with conn.transaction():
+                stored_settings = await self._get_object(conn, for_update=True)
+                stored_url_signing = stored_settings.url_signing if stored_settings else None
+                if "url_signing" not in settings.model_fields_set:
+                    url_signing = stored_url_signing
+                elif settings.url_signing:
+                    url_signing = settings.url_signing.restore_masked_keys(stored_url_signing)
+                else:
+                    url_signing = None
+
+                dumped_settings = settings.model_dump(mode="json")
+                await conn.execute(
+                    f"UPDATE {self.table_name} set cdn_host = $1, redirect_ratio = $2, url_signing = $3 WHERE onerow_id = true;",
+                    dumped_settings["cdn_host"],
+                    dumped_settings["redirect_ratio"],
+                    url_signing.dump_json_with_secrets() if url_signing else None,
+                )
 
             if updated_settings := await self._get_object(conn):
                 if callable(self.on_invalidate):
@@ -0,0 +1,335 @@
+"""
+Журнал решений балансировщика. Каждое решение о редиректе записывается в заранее выделенный кольцевой буфер
+записей фиксированного размера, а фоновая задача периодически сбрасывает накопленные записи в бинарные файлы
+с ротацией. Если фоновая задача не успевает, новые записи отбрасываются (с подсчётом), а не блокируют запрос.
+
+Чтение файлов журнала:
+
+    python -m wink_test.decision_log --format csv decisions/*.bin
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import os
+import struct
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import BinaryIO, Iterator, NamedTuple, Sequence
+
+from pydantic import BaseModel, PositiveFloat, PositiveInt
+
+__all__ = (
+    "DecisionLogSettings",
+    "DecisionLogRecord",
+    "DecisionLog",
+    "read_decision_log",
+)
+
+logger = logging.getLogger(__name__)
+
+file_magic = b"WKDL"
+"""
+Сигнатура файла журнала решений.
+"""
+
+file_format_version = 2
+"""
+Версия формата файла журнала решений. Файлы версии 1 отличаются только тем, что в них нет флага обрезки.
+"""
+
+supported_file_format_versions = (1, file_format_version)
+"""
+Версии формата, которые можно прочитать.
+"""
+
+file_header_struct = struct.Struct("<4sHH")
+"""
+Заголовок файла: сигнатура, версия формата, размер записи.
+"""
+
+max_video_host_size = 64
+max_video_path_size = 179
+
+record_struct = struct.Struct(f"<qIB{max_video_host_size}s{max_video_path_size}s")
+"""
+Запись журнала (256 байт): время в наносекундах, версия настроек, флаги, хост видео, путь видео. Хост и путь
+дополняются нулями либо обрезаются до размера поля (64 и 179 байт); обрезка отмечается флагом `truncated_flag`.
+"""
+
+redirected_to_cdn_flag = 0x01
+"""
+Флаг записи: редирект на CDN (иначе - на origin сервер).
+"""
+
+truncated_flag = 0x02
+"""
+Флаг записи: хост или путь видео не поместились в поле записи и обрезаны.
+"""
+
+
+class DecisionLogSettings(BaseModel):
+    """
+    Модель настроек журнала решений.
+    """
+
+    directory: Path
+    """
+    Директория для файлов журнала.
+    """
+
+    capacity: PositiveInt = 65536
+    """
+    Количество записей в кольцевом буфере воркера.
+    """
+
+    flush_interval: PositiveFloat = 1.0
+    """
+    Интервал сброса буфера в файл (в секундах).
+    """
+
+    max_file_size: PositiveInt = 64 * 1024 * 1024
+    """
+    Размер файла (в байтах), после превышения которого начинается новый файл.
+    """
+
+    max_files: PositiveInt | None = None
+    """
+    Количество хранимых файлов воркера. Более старые файлы удаляются. Если не задано, файлы не удаляются.
+    """
+
+
+class DecisionLogRecord(NamedTuple):
+    """
+    Прочитанная запись журнала решений.
+    """
+
+    timestamp_ns: int
+    settings_version: int
+    redirected_to_cdn: bool
+    video_host: str
+    video_path: str
+    truncated: bool
+    """
+    Хост или путь видео обрезаны до размера поля записи.
+    """
+
+
+class DecisionLog:
+    """
+    Журнал решений балансировщика с кольцевым буфером и фоновой записью в файлы.
+    """
+
+    def __init__(self, settings: DecisionLogSettings):
+        self.settings = settings
+        self.capacity = settings.capacity
+        self.buffer = bytearray(self.capacity * record_struct.size)
+        self.appended_count = 0
+        """
+        Количество записей, добавленных в буфер.
+        """
+        self.flushed_count = 0
+        """
+        Количество записей, забранных из буфера на запись в файл.
+        """
+        self.dropped_count = 0
+        """
+        Количество отброшенных записей (буфер переполнен или произошла ошибка записи в файл).
+        """
+        self.truncated_count = 0
+        """
+        Количество записей с обрезанным хостом или путём видео.
+        """
+        self._file: BinaryIO | None = None
+        self._file_size = 0
+        self._file_paths: deque[Path] = deque()
+        self._file_index = 0
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+
+    @property
+    def pending_count(self) -> int:
+        return self.appended_count - self.flushed_count
+
+    def append(self, video_host: str, video_path: str, redirected_to_cdn: bool, settings_version: int) -> bool:
+        """
+        Добавляет запись в буфер. Не блокирует: при переполненном буфере запись отбрасывается и возвращается `False`.
+        """
+
+        pending_count = self.pending_count
+        if pending_count >= self.capacity:
+            self.dropped_count += 1
+            return False
+
+        encoded_host = video_host.encode()
+        encoded_path = video_path.encode()
+        flags = redirected_to_cdn_flag if redirected_to_cdn else 0
+        if len(encoded_host) > max_video_host_size or len(encoded_path) > max_video_path_size:
+            flags |= truncated_flag
+            self.truncated_count += 1
+
+        record_struct.pack_into(
+            self.buffer,
+            (self.appended_count % self.capacity) * record_struct.size,
+            time.time_ns(),
+            settings_version,
+            flags,
+            encoded_host,
+            encoded_path,
+        )
+        self.appended_count += 1
+
+        # Буфер заполнен наполовину - будим фоновую задачу, не дожидаясь интервала.
+        if pending_count + 1 == self.capacity // 2:
+            self._wakeup.set()
+        return True
+
+    def take_pending(self) -> bytes:
+        """
+        Забирает из буфера все накопленные записи в виде непрерывного блока байт.
+        """
+
+        pending_count = self.pending_count
+        if not pending_count:
+            return b""
+
+        view = memoryview(self.buffer)
+        start = self.flushed_count % self.capacity
+        end = start + pending_count
+        if end <= self.capacity:
+            data = view[start * record_struct.size : end * record_struct.size].tobytes()
+        else:
+            data = (
+                view[start * record_struct.size :].tobytes()
+                + view[: (end - self.capacity) * record_struct.size].tobytes()
+            )
+
+        self.flushed_count += pending_count
+        return data
+
+    async def flush(self):
+        """
+        Записывает накопленные записи в файл в отдельном потоке.
+        """
+
+        if data := self.take_pending():
+            try:
+                await asyncio.to_thread(self._write, data)
+            except OSError:
+                logger.exception("Не удалось записать журнал решений")
+                self.dropped_count += len(data) // record_struct.size
+
+    @asynccontextmanager
+    async def run(self):
+        """
+        Менеджер контекста, в рамках которого работает фоновая запись журнала.
+        """
+
+        self._stopping = False
+        task = asyncio.create_task(self._flush_periodically())
+        try:
+            yield
+        finally:
+            self._stopping = True
+            self._wakeup.set()
+            await task
+            await self.flush()
+            self._close_file()
+
+    async def _flush_periodically(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.settings.flush_interval)
+            except TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def _write(self, data: bytes):
+        if not self._file:
+            self._open_file()
+        assert self._file
+
+        self._file.write(data)
+        self._file.flush()
+        self._file_size += len(data)
+        if self._file_size >= self.settings.max_file_size:
+            self._close_file()
+
+    def _open_file(self):
+        self.settings.directory.mkdir(parents=True, exist_ok=True)
+        path = (
+            self.settings.directory
+            / f"decisions-{os.getpid()}-{threading.get_native_id()}-{time.time_ns()}-{self._file_index}.bin"
+        )
+        self._file_index += 1
+        self._file = path.open("wb")
+        self._file.write(file_header_struct.pack(file_magic, file_format_version, record_struct.size))
+        self._file_size = file_header_struct.size
+        self._file_paths.append(path)
+
+        if self.settings.max_files:
+            while len(self._file_paths) > self.settings.max_files:
+                self._file_paths.popleft().unlink(missing_ok=True)
+
+    def _close_file(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+
+def read_decision_log(path: Path) -> Iterator[DecisionLogRecord]:
+    """
+    Читает записи из файла журнала решений. Недописанная последняя запись пропускается.
+
+    :param path: путь к файлу журнала.
+    """
+
+    with path.open("rb") as file:
+        magic, version, record_size = file_header_struct.unpack(file.read(file_header_struct.size))
+        if magic != file_magic or version not in supported_file_format_versions or record_size != record_struct.size:
+            raise ValueError(f"Файл {path} не является журналом решений поддерживаемой версии.")
+
+        chunk_size = record_struct.size * 4096
+        while chunk := file.read(chunk_size):
+            chunk = chunk[: len(chunk) - len(chunk) % record_struct.size]
+            for timestamp_ns, settings_version, flags, video_host, video_path in record_struct.iter_unpack(chunk):
+                yield DecisionLogRecord(
+                    timestamp_ns=timestamp_ns,
+                    settings_version=settings_version,
+                    redirected_to_cdn=bool(flags & redirected_to_cdn_flag),
+                    video_host=video_host.rstrip(b"\0").decode(errors="replace"),
+                    video_path=video_path.rstrip(b"\0").decode(errors="replace"),
+                    truncated=bool(flags & truncated_flag),
+                )
+
+
+def main(argv: Sequence[str] | None = None):
+    """
+    Конвертирует файлы журнала решений в CSV или JSON Lines и выводит результат в stdout.
+    """
+
+    parser = argparse.ArgumentParser(description="Конвертация файлов журнала решений балансировщика.")
+    parser.add_argument("--format", choices=("csv", "json"), default="csv", help="формат вывода")
+    parser.add_argument("paths", nargs="+", type=Path, help="файлы журнала")
+    args = parser.parse_args(argv)
+
+    if args.format == "csv":
+        writer = csv.writer(sys.stdout)
+        writer.writerow(DecisionLogRecord._fields)
+        for path in args.paths:
+            writer.writerows(read_decision_log(path))
+    else:
+        for path in args.paths:
+            for record in read_decision_log(path):
+                sys.stdout.write(json.dumps(record._asdict(), ensure_ascii=False) + "\n")
+
+
+if __name__ == "__main__":
+    main()
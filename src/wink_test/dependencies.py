@@ -1,21 +1,33 @@
-from dataclasses import dataclass
+import asyncio
+import threading
+from contextvars import ContextVar
+from dataclasses import dataclass, field
 from typing import Annotated
 
 from fastapi import Depends
 from pydantic import ValidationError
 from redis.asyncio import Redis
 
+from wink_test.admission import AdmissionController
 from wink_test.balancer import BalancerSettings, BalancerSettingsDbModel
+from wink_test.decision_log import DecisionLog
+from wink_test.edge_routing import EdgeRouter
+from wink_test.hot_videos import HotVideoTracker
+from wink_test.manifest_proxy import ManifestCache
 from wink_test.postgres import Postgres
+from wink_test.session_affinity import SessionAffinityCache
 from wink_test.settings import (
     DatabaseOnlySettings,
     Settings,
     construct_settings_from_env,
     construct_settings_from_env_and_db,
 )
-from wink_test.shared_counter import SharedCounter
+from wink_test.shared_counter import LocalCounter, SharedCounter
+from wink_test.url_signing import UrlSigner
 
 __all__ = (
+    "LoopState",
+    "warmup_request_counter",
     "AppState",
     "get_app_state",
     "get_settings",
@@ -28,24 +40,116 @@ __all__ = (
     "DbConnectionDependency",
     "get_balancer_settings_db_model",
     "BalancerSettingsDbModelDependency",
+    "get_decision_log",
+    "DecisionLogDependency",
+    "get_admission_controller",
+    "AdmissionControllerDependency",
+    "get_edge_router",
+    "EdgeRouterDependency",
+    "get_url_signer",
+    "UrlSignerDependency",
+    "get_hot_video_tracker",
+    "HotVideoTrackerDependency",
+    "get_session_affinity",
+    "SessionAffinityDependency",
+    "get_manifest_cache",
+    "ManifestCacheDependency",
 )
 
 
 @dataclass
-class AppState:
-    settings: Settings | None = None
+class LoopState:
+    """
+    Состояние, привязанное к циклу событий: соединения и объекты, использующие примитивы asyncio. В режиме с несколькими
+    потоками (`wink_test.threaded_server`) у цикла событий каждого потока своё состояние.
+    """
+
+    event_loop: asyncio.AbstractEventLoop | None = None
+    ready: bool = False
     redis_connection: Redis | None = None
-    request_counter: SharedCounter | None = None
+    request_counter: SharedCounter | LocalCounter | None = None
     db_connection: Postgres | None = None
     balancer_settings_db_model: BalancerSettingsDbModel | None = None
+    decision_log: DecisionLog | None = None
+    admission_controller: AdmissionController | None = None
+    edge_router: EdgeRouter | None = None
+    hot_video_tracker: HotVideoTracker | None = None
+    session_affinity: SessionAffinityCache | None = None
+    manifest_cache: ManifestCache | None = None
+
+
+current_loop_state: ContextVar[LoopState] = ContextVar("current_loop_state")
+"""
+Состояние цикла событий текущего потока. Контекст копируется в задачи цикла и в потоки, где FastAPI выполняет
+синхронные зависимости, поэтому все они видят состояние своего цикла событий.
+"""
+
+
+warmup_request_counter: ContextVar[SharedCounter | LocalCounter | None] = ContextVar(
+    "warmup_request_counter", default=None
+)
+"""
+Счетчик служебных запросов прогрева. Пока он задан, журнал решений, статистика популярных видео и привязка
+сессий не ведутся, плейлисты не проксируются, контроль допуска не применяется, а URL подписываются отдельным
+экземпляром `UrlSigner`, чтобы служебные запросы не попадали в статистику и кэш подписей.
+"""
+
+
+@dataclass
+class AppState:
+    """
+    Состояние приложения. Настройки, подписи URL и счетчик запросов в памяти процесса общие для всех потоков,
+    остальное хранится в состоянии цикла событий (`loop`).
+    """
+
+    preloaded: bool = False
+    settings: Settings | None = None
+    url_signer: UrlSigner | None = None
+    local_request_counter: LocalCounter | None = None
+    worker_index: int = 0
+    """
+    Индекс воркера на узле. Задаётся Gunicorn при запуске воркера (`wink_test.gunicorn_conf`).
+    """
+    main_loop: LoopState = field(default_factory=LoopState)
+    """
+    Состояние цикла событий по умолчанию (в режиме с одним циклом событий на процесс).
+    """
+    loop_states: list[LoopState] = field(default_factory=list)
+    """
+    Состояния циклов событий, созданные `enter_loop`.
+    """
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    """
+    Блокировка для ленивого создания общих объектов.
+    """
+
+    @property
+    def loop(self) -> LoopState:
+        return current_loop_state.get(self.main_loop)
+
+    def enter_loop(self) -> LoopState:
+        """
+        Создаёт отдельное состояние цикла событий для текущего потока. Вызывается до запуска цикла событий потока.
+        """
+
+        loop_state = LoopState()
+        with self.lock:
+            self.loop_states.append(loop_state)
+        current_loop_state.set(loop_state)
+        return loop_state
+
+    def get_loop_states(self) -> list[LoopState]:
+        with self.lock:
+            return self.loop_states.copy() if self.loop_states else [self.main_loop]
 
     def update_balancer_settings(self, new_settings: BalancerSettings):
+        # Снимок настроек заменяется одним присваиванием, поэтому потоки видят либо старые, либо новые настройки.
         if current_settings := self.settings:
             self.settings = Settings(
                 cdn_host=new_settings.cdn_host,
                 redirect_ratio=new_settings.redirect_ratio,
-                redis_url=current_settings.redis_url,
-                database=current_settings.database,
+                url_signing=new_settings.url_signing,
+                **current_settings.model_dump(exclude={"cdn_host", "redirect_ratio", "url_signing"}),
             )
 
 
@@ -58,17 +162,23 @@ def get_app_state():
 
 async def get_settings():
     if not app_state.settings:
+        settings: Settings | None = None
         try:
             if db_settings := DatabaseOnlySettings().database:
-                app_state.settings = await construct_settings_from_env_and_db(db_settings)
+                settings = await construct_settings_from_env_and_db(db_settings)
         except ValidationError:
             pass
 
         try:
-            app_state.settings = construct_settings_from_env()
+            settings = construct_settings_from_env()
         except ValidationError:
             pass
 
+        # Если настройки одновременно загрузили несколько потоков, все используют первый снимок.
+        with app_state.lock:
+            if not app_state.settings:
+                app_state.settings = settings
+
     if app_state.settings:
         return app_state.settings
     else:
@@ -79,32 +189,48 @@ SettingsDependency = Annotated[Settings, Depends(get_settings)]
 
 
 def get_redis_connection(settings: SettingsDependency):
-    if not app_state.redis_connection:
+    if not app_state.loop.redis_connection:
         assert settings.redis_url.host
         assert settings.redis_url.port
-        app_state.redis_connection = Redis(host=settings.redis_url.host, port=settings.redis_url.port)
+        app_state.loop.redis_connection = Redis(host=settings.redis_url.host, port=settings.redis_url.port)
 
-    return app_state.redis_connection
+    return app_state.loop.redis_connection
 
 
 RedisConnectionDependency = Annotated[Redis, Depends(get_redis_connection)]
 
 
-def get_request_counter(redis_connection: RedisConnectionDependency):
-    if not app_state.request_counter:
-        app_state.request_counter = SharedCounter(redis_connection, "request-counter")
+def get_request_counter(settings: SettingsDependency, redis_connection: RedisConnectionDependency):
+    if warmup_counter := warmup_request_counter.get():
+        return warmup_counter
+
+    loop_state = app_state.loop
+    if not loop_state.request_counter:
+        if settings.counter.local:
+            with app_state.lock:
+                if not app_state.local_request_counter:
+                    app_state.local_request_counter = LocalCounter()
+            loop_state.request_counter = app_state.local_request_counter
+        else:
+            loop_state.request_counter = SharedCounter(
+                redis_connection,
+                "request-counter",
+                stripes=settings.counter.stripes,
+                stripe=settings.counter.get_stripe(app_state.worker_index),
+                hash_tag=settings.counter.hash_tag,
+            )
 
-    return app_state.request_counter
+    return loop_state.request_counter
 
 
-RequestCounterDependency = Annotated[SharedCounter, Depends(get_request_counter)]
+RequestCounterDependency = Annotated[SharedCounter | LocalCounter, Depends(get_request_counter)]
 
 
 def get_db_connection(settings: SettingsDependency):
-    if not app_state.db_connection and settings.database:
-        app_state.db_connection = Postgres(settings=settings.database)
+    if not app_state.loop.db_connection and settings.database:
+        app_state.loop.db_connection = Postgres(settings=settings.database)
 
-    return app_state.db_connection
+    return app_state.loop.db_connection
 
 
 DbConnectionDependency = Annotated[Postgres | None, Depends(get_db_connection)]
@@ -114,10 +240,97 @@ def get_balancer_settings_db_model(db_connection: DbConnectionDependency):
     def invalidate(new_settings: BalancerSettings):
         app_state.update_balancer_settings(new_settings)
 
-    if not app_state.balancer_settings_db_model and db_connection:
-        app_state.balancer_settings_db_model = BalancerSettingsDbModel(db_connection, on_invalidate=invalidate)
+    if not app_state.loop.balancer_settings_db_model and db_connection:
+        app_state.loop.balancer_settings_db_model = BalancerSettingsDbModel(db_connection, on_invalidate=invalidate)
 
-    return app_state.balancer_settings_db_model
+    return app_state.loop.balancer_settings_db_model
 
 
 BalancerSettingsDbModelDependency = Annotated[BalancerSettingsDbModel | None, Depends(get_balancer_settings_db_model)]
+
+
+def get_decision_log(settings: SettingsDependency):
+    if warmup_request_counter.get():
+        return None
+
+    if not app_state.loop.decision_log and settings.decision_log:
+        app_state.loop.decision_log = DecisionLog(settings.decision_log)
+
+    return app_state.loop.decision_log
+
+
+DecisionLogDependency = Annotated[DecisionLog | None, Depends(get_decision_log)]
+
+
+def get_admission_controller(settings: SettingsDependency):
+    if not app_state.loop.admission_controller and settings.admission:
+        app_state.loop.admission_controller = AdmissionController(settings.admission)
+
+    return app_state.loop.admission_controller
+
+
+AdmissionControllerDependency = Annotated[AdmissionController | None, Depends(get_admission_controller)]
+
+
+def get_edge_router(settings: SettingsDependency, db_connection: DbConnectionDependency):
+    if not app_state.loop.edge_router and settings.edge_routing:
+        app_state.loop.edge_router = EdgeRouter(settings.edge_routing, db_connection)
+
+    return app_state.loop.edge_router
+
+
+EdgeRouterDependency = Annotated[EdgeRouter | None, Depends(get_edge_router)]
+
+
+def get_url_signer():
+    if warmup_request_counter.get():
+        return UrlSigner()
+
+    if not app_state.url_signer:
+        with app_state.lock:
+            if not app_state.url_signer:
+                app_state.url_signer = UrlSigner()
+
+    return app_state.url_signer
+
+
+UrlSignerDependency = Annotated[UrlSigner, Depends(get_url_signer)]
+
+
+def get_hot_video_tracker(settings: SettingsDependency):
+    if warmup_request_counter.get():
+        return None
+
+    if not app_state.loop.hot_video_tracker and settings.hot_videos:
+        app_state.loop.hot_video_tracker = HotVideoTracker(settings.hot_videos)
+
+    return app_state.loop.hot_video_tracker
+
+
+HotVideoTrackerDependency = Annotated[HotVideoTracker | None, Depends(get_hot_video_tracker)]
+
+
+def get_session_affinity(settings: SettingsDependency, redis_connection: RedisConnectionDependency):
+    if warmup_request_counter.get():
+        return None
+
+    if not app_state.loop.session_affinity and settings.session_affinity:
+        app_state.loop.session_affinity = SessionAffinityCache(settings.session_affinity, redis_connection)
+
+    return app_state.loop.session_affinity
+
+
+SessionAffinityDependency = Annotated[SessionAffinityCache | None, Depends(get_session_affinity)]
+
+
+def get_manifest_cache(settings: SettingsDependency):
+    if warmup_request_counter.get():
+        return None
+
+    if not app_state.loop.manifest_cache and settings.manifest_proxy:
+        app_state.loop.manifest_cache = ManifestCache(settings.manifest_proxy)
+
+    return app_state.loop.manifest_cache
+
+
+ManifestCacheDependency = Annotated[ManifestCache | None, Depends(get_manifest_cache)]
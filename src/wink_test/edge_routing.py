@@ -0,0 +1,340 @@
+"""
+Выбор ближайшего узла CDN по адресу клиента. Таблица соответствия подсетей (IPv4 и IPv6) узлам CDN загружается из
+файла или из БД и преобразуется в индекс поиска по наиболее длинному префиксу: вложенные подсети разворачиваются
+в непересекающиеся диапазоны адресов, а поиск выполняется двоичным поиском по началам диапазонов.
+"""
+
+import asyncio
+import logging
+import socket
+from array import array
+from bisect import bisect_right
+from contextlib import asynccontextmanager, suppress
+from ipaddress import IPv4Network, IPv6Network, ip_network
+from pathlib import Path
+from typing import Generic, Iterable, Sequence, TypeVar
+
+from pydantic import BaseModel, HttpUrl, IPvAnyNetwork, PositiveFloat
+
+from wink_test.postgres import Postgres
+
+__all__ = (
+    "EdgeRoutingSettings",
+    "PrefixIndex",
+    "parse_edge_map",
+    "CdnEdgesDbModel",
+    "EdgeRouter",
+)
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+ipv4_mapped_ipv6_prefix = b"\0" * 10 + b"\xff\xff"
+
+
+class EdgeRoutingSettings(BaseModel):
+    """
+    Модель настроек выбора узла CDN по адресу клиента.
+    """
+
+    file: Path | None = None
+    """
+    Файл с таблицей соответствия: в каждой строке подсеть и URL узла CDN через пробел, например
+    `10.0.0.0/8 http://cdn-eu`. Строки, начинающиеся с `#`, пропускаются.
+    """
+
+    from_database: bool = False
+    """
+    Загружать таблицу соответствия из таблицы `cdn_edges` в БД.
+    """
+
+    reload_interval: PositiveFloat = 60.0
+    """
+    Интервал проверки обновлений таблицы соответствия (в секундах).
+    """
+
+    trusted_proxies: list[IPvAnyNetwork] = []
+    """
+    Подсети доверенных прокси-серверов. Для запросов от них адрес клиента берётся из заголовка `X-Forwarded-For`.
+    """
+
+
+def build_range_table(ranges: list[tuple[int, int, int]], max_address: int) -> tuple[list[int], list[int]]:
+    """
+    Преобразует набор (возможно вложенных) диапазонов адресов в непересекающиеся диапазоны. Для каждого адреса
+    действует значение наиболее узкого содержащего его диапазона.
+
+    :param ranges: диапазоны - первый адрес, последний адрес, индекс значения.
+    :param max_address: максимальный адрес.
+    :return: начала непересекающихся диапазонов и индексы значений (-1 - значение не задано).
+    """
+
+    starts = [0]
+    value_indices = [-1]
+
+    def set_value_from(address: int, value_index: int):
+        if address > max_address:
+            return
+        if starts[-1] == address:
+            value_indices[-1] = value_index
+        elif value_indices[-1] != value_index:
+            starts.append(address)
+            value_indices.append(value_index)
+
+    stack: list[tuple[int, int]] = []
+    # Более широкие диапазоны идут раньше вложенных в них.
+    for start, end, value_index in sorted(ranges, key=lambda item: (item[0], -item[1])):
+        while stack and stack[-1][0] < start:
+            stack_end, _ = stack.pop()
+            set_value_from(stack_end + 1, stack[-1][1] if stack else -1)
+        set_value_from(start, value_index)
+        stack.append((end, value_index))
+
+    while stack:
+        stack_end, _ = stack.pop()
+        set_value_from(stack_end + 1, stack[-1][1] if stack else -1)
+
+    return starts, value_indices
+
+
+class PrefixIndex(Generic[T]):
+    """
+    Индекс поиска значения по наиболее длинному префиксу подсети, содержащей адрес.
+    """
+
+    def __init__(self, prefixes: Iterable[tuple[IPv4Network | IPv6Network, T]]):
+        self.values: list[T] = []
+        value_indices: dict[T, int] = {}
+        ipv4_ranges: list[tuple[int, int, int]] = []
+        ipv6_ranges: list[tuple[int, int, int]] = []
+        self.prefixes_count = 0
+
+        for network, value in prefixes:
+            value_index = value_indices.get(value)
+            if value_index is None:
+                value_index = value_indices[value] = len(self.values)
+                self.values.append(value)
+
+            # Не используем `broadcast_address`: это кэшируемое свойство, которое создаёт объект адреса на каждую сеть.
+            ranges = ipv4_ranges if network.version == 4 else ipv6_ranges
+            start = int(network.network_address)
+            ranges.append((start, start + (1 << (network.max_prefixlen - network.prefixlen)) - 1, value_index))
+            self.prefixes_count += 1
+
+        ipv4_starts, ipv4_value_indices = build_range_table(ipv4_ranges, 2**32 - 1)
+        self._ipv4_starts = array("I", ipv4_starts)
+        self._ipv4_value_indices = array("i", ipv4_value_indices)
+        ipv6_starts, ipv6_value_indices = build_range_table(ipv6_ranges, 2**128 - 1)
+        self._ipv6_starts = ipv6_starts
+        self._ipv6_value_indices = array("i", ipv6_value_indices)
+
+    def lookup(self, address: str) -> T | None:
+        """
+        Возвращает значение для адреса или `None`, если адрес не входит ни в одну подсеть или некорректен.
+        """
+
+        try:
+            packed_address = socket.inet_pton(socket.AF_INET, address)
+        except OSError:
+            try:
+                packed_address = socket.inet_pton(socket.AF_INET6, address)
+            except OSError:
+                return None
+
+            if not packed_address.startswith(ipv4_mapped_ipv6_prefix):
+                index = bisect_right(self._ipv6_starts, int.from_bytes(packed_address)) - 1
+                value_index = self._ipv6_value_indices[index]
+                return self.values[value_index] if value_index >= 0 else None
+            packed_address = packed_address[12:]
+
+        index = bisect_right(self._ipv4_starts, int.from_bytes(packed_address)) - 1
+        value_index = self._ipv4_value_indices[index]
+        return self.values[value_index] if value_index >= 0 else None
+
+
+def parse_edge_map(rows: Iterable[tuple[str, str]]) -> list[tuple[IPv4Network | IPv6Network, HttpUrl]]:
+    """
+    Разбирает пары (подсеть, URL узла CDN).
+    """
+
+    cdn_hosts: dict[str, HttpUrl] = {}
+    prefixes: list[tuple[IPv4Network | IPv6Network, HttpUrl]] = []
+    for prefix, cdn_host in rows:
+        if (url := cdn_hosts.get(cdn_host)) is None:
+            url = cdn_hosts[cdn_host] = HttpUrl(cdn_host)
+        prefixes.append((ip_network(prefix, strict=False), url))
+    return prefixes
+
+
+def read_edge_map_file(path: Path) -> list[tuple[IPv4Network | IPv6Network, HttpUrl]]:
+    def read_rows():
+        with path.open() as file:
+            for line in file:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    prefix, cdn_host = line.split()
+                    yield prefix, cdn_host
+
+    return parse_edge_map(read_rows())
+
+
+def read_edge_map_file_if_modified(
+    path: Path, mtime: float | None
+) -> tuple[float, list[tuple[IPv4Network | IPv6Network, HttpUrl]] | None]:
+    """
+    Читает таблицу соответствия из файла, если время его изменения отличается от `mtime`.
+
+    :return: время изменения файла и таблица соответствия или `None`, если файл не изменился.
+    """
+
+    new_mtime = path.stat().st_mtime
+    if new_mtime == mtime:
+        return new_mtime, None
+    return new_mtime, read_edge_map_file(path)
+
+
+class CdnEdgesDbModel:
+    """
+    Таблица соответствия в БД. Любое изменение таблицы `cdn_edges` увеличивает версию в `cdn_edges_version`
+    (триггером), поэтому воркеры проверяют обновления одним запросом, не загружая всю таблицу.
+    """
+
+    table_name = "cdn_edges"
+    version_table_name = "cdn_edges_version"
+
+    def __init__(self, db_connection: Postgres):
+        self.db_connection = db_connection
+
+    async def create_table(self):
+        pool = await self.db_connection.get_pool()
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                # Воркеры создают таблицы одновременно, а CREATE OR REPLACE не защищён от параллельного выполнения.
+                await conn.execute(f"SELECT pg_advisory_xact_lock(hashtext('{self.table_name}'));")
+                await conn.execute(f"""
+                    CREATE TABLE IF NOT EXISTS {self.table_name}(
+                        prefix cidr PRIMARY KEY,
+                        cdn_host text NOT NULL
+                    );
+                    CREATE TABLE IF NOT EXISTS {self.version_table_name}(
+                        onerow_id bool PRIMARY KEY DEFAULT true,
+                        version bigint NOT NULL DEFAULT 0,
+                        CONSTRAINT onerow_uni CHECK (onerow_id)
+                    );
+                    INSERT INTO {self.version_table_name} DEFAULT VALUES ON CONFLICT DO NOTHING;
+                    CREATE OR REPLACE FUNCTION {self.version_table_name}_increment() RETURNS trigger AS $$
+                    BEGIN
+                        UPDATE {self.version_table_name} SET version = version + 1;
+                        RETURN NULL;
+                    END;
+                    $$ LANGUAGE plpgsql;
+                    CREATE OR REPLACE TRIGGER {self.version_table_name}_increment
+                        AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {self.table_name}
+                        FOR EACH STATEMENT EXECUTE FUNCTION {self.version_table_name}_increment();
+                """)
+
+    async def get_version(self) -> int:
+        pool = await self.db_connection.get_pool()
+        async with pool.acquire() as conn:
+            return await conn.fetchval(f"SELECT version FROM {self.version_table_name} WHERE onerow_id = true;")
+
+    async def get_objects(self) -> list[tuple[str, str]]:
+        pool = await self.db_connection.get_pool()
+        async with pool.acquire() as conn:
+            records = await conn.fetch(f"SELECT prefix::text AS prefix, cdn_host FROM {self.table_name};")
+            return [(record["prefix"], record["cdn_host"]) for record in records]
+
+
+class EdgeRouter:
+    """
+    Выбирает узел CDN по адресу клиента. Таблица соответствия периодически перезагружается в фоне: новый индекс
+    строится в отдельном потоке и подменяет старый одним присваиванием, не блокируя обработку запросов.
+    """
+
+    def __init__(self, settings: EdgeRoutingSettings, db_connection: Postgres | None = None):
+        self.settings = settings
+        self.db_model = CdnEdgesDbModel(db_connection) if settings.from_database and db_connection else None
+        self.index: PrefixIndex[HttpUrl] = PrefixIndex(())
+        self.trusted_proxies: PrefixIndex[bool] = PrefixIndex((network, True) for network in settings.trusted_proxies)
+        self.reloads_count = 0
+        self._file_mtime: float | None = None
+        self._db_version: int | None = None
+
+    def is_trusted_proxy(self, address: str) -> bool:
+        return bool(self.trusted_proxies.lookup(address))
+
+    def get_client_address(self, peer_address: str, forwarded_for: str | None) -> str:
+        """
+        Определяет адрес клиента. Заголовок `X-Forwarded-For` учитывается, только если запрос пришёл от доверенного
+        прокси: берётся самый правый адрес, не принадлежащий доверенным прокси.
+        """
+
+        if not forwarded_for or not self.is_trusted_proxy(peer_address):
+            return peer_address
+
+        addresses = [address.strip() for address in forwarded_for.split(",")]
+        for address in reversed(addresses):
+            if not self.is_trusted_proxy(address):
+                return address
+        return addresses[0]
+
+    def get_cdn_host(self, client_address: str) -> HttpUrl | None:
+        return self.index.lookup(client_address)
+
+    async def load_prefixes(self) -> Sequence[tuple[IPv4Network | IPv6Network, HttpUrl]] | None:
+        """
+        Загружает таблицу соответствия. Возвращает `None`, если таблица не изменилась.
+        """
+
+        if self.settings.file:
+            self._file_mtime, prefixes = await asyncio.to_thread(
+                read_edge_map_file_if_modified, self.settings.file, self._file_mtime
+            )
+            return prefixes
+
+        if self.db_model:
+            # Версия читается до таблицы: изменение между запросами приведёт к лишней перезагрузке, но не будет
+            # пропущено.
+            version = await self.db_model.get_version()
+            if version == self._db_version:
+                return None
+            rows = await self.db_model.get_objects()
+            prefixes = await asyncio.to_thread(parse_edge_map, rows)
+            self._db_version = version
+            return prefixes
+
+        return None
+
+    async def reload(self):
+        prefixes = await self.load_prefixes()
+        if prefixes is not None:
+            self.index = await asyncio.to_thread(PrefixIndex[HttpUrl], prefixes)
+            self.reloads_count += 1
+
+    @asynccontextmanager
+    async def run(self):
+        """
+        Менеджер контекста, в рамках которого таблица соответствия загружается и периодически перезагружается.
+        """
+
+        if self.db_model:
+            await self.db_model.create_table()
+        await self.reload()
+
+        task = asyncio.create_task(self._reload_periodically())
+        try:
+            yield
+        finally:
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+
+    async def _reload_periodically(self):
+        while True:
+            await asyncio.sleep(self.settings.reload_interval)
+            try:
+                await self.reload()
+            except Exception:
+                # При ошибке загрузки продолжаем работать со старым индексом.
+                logger.exception("Не удалось перезагрузить таблицу узлов CDN")
@@ -0,0 +1,30 @@
+"""
+Конфигурация Gunicorn с предзагрузкой приложения. Настройки загружаются и проверяются один раз в мастер-процессе,
+после чего воркеры получают их снимок при fork:
+
+    gunicorn -c python:wink_test.gunicorn_conf wink_test.main:app --bind 0.0.0.0:80 --workers 9
+"""
+
+from itertools import count
+from typing import Any
+
+from wink_test.dependencies import get_app_state
+from wink_test.main import preload
+
+preload_app = True
+worker_class = "uvicorn.workers.UvicornWorker"
+
+
+def when_ready(server: Any):
+    preload()
+
+
+def pre_fork(server: Any, worker: Any):
+    # Воркер получает наименьший индекс, не занятый живыми воркерами: перезапущенный воркер занимает индекс (и полосу
+    # счетчика запросов) своего предшественника.
+    busy_indexes = {getattr(live_worker, "index", None) for live_worker in server.WORKERS.values()}
+    worker.index = next(index for index in count() if index not in busy_indexes)
+
+
+def post_fork(server: Any, worker: Any):
+    get_app_state().worker_index = worker.index
@@ -0,0 +1,322 @@
+"""
+Отслеживание самых популярных видео в ограниченном объёме памяти. Частоты запросов оцениваются count-min sketch,
+а наиболее популярные видео хранятся в списке фиксированного размера: новое видео вытесняет из него видео с наименьшей
+оценкой (как в алгоритме space-saving). Старые запросы забываются с экспоненциальным затуханием.
+
+Затухание реализовано без обхода счетчиков: вес запроса растёт со временем как `exp(λ * (t - t0))`, а счетчики
+нормируются, только когда вес становится слишком большим. Оценки воркеров объединяются через Redis: каждый воркер
+периодически публикует свой снимок, а снимки складываются с приведением к общему моменту времени.
+"""
+
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import math
+import os
+import socket
+import threading
+import time
+from array import array
+from contextlib import asynccontextmanager, suppress
+from typing import Any, NamedTuple
+
+import redis.asyncio as redis
+from pydantic import BaseModel, PositiveFloat, PositiveInt
+
+__all__ = (
+    "HotVideosSettings",
+    "HotVideo",
+    "HotVideoTracker",
+)
+
+logger = logging.getLogger(__name__)
+
+max_weight = 2.0**128
+"""
+Вес запроса, при достижении которого счетчики нормируются.
+"""
+
+
+class HotVideosSettings(BaseModel):
+    """
+    Модель настроек отслеживания популярных видео.
+    """
+
+    width: PositiveInt = 2048
+    """
+    Количество счетчиков в строке count-min sketch.
+    """
+
+    depth: PositiveInt = 4
+    """
+    Количество строк (хэш-функций) count-min sketch.
+    """
+
+    capacity: PositiveInt = 100
+    """
+    Размер списка популярных видео.
+    """
+
+    half_life: PositiveFloat = 60.0
+    """
+    Период полураспада веса запроса (в секундах).
+    """
+
+    publish_interval: PositiveFloat = 5.0
+    """
+    Интервал публикации снимка воркера в Redis (в секундах).
+    """
+
+
+class HotVideo(NamedTuple):
+    video: str
+    """
+    Хост и путь видео.
+    """
+
+    requests_per_second: float
+    """
+    Оценка частоты запросов.
+    """
+
+    cdn_share: float
+    """
+    Доля редиректов на CDN (с момента попадания видео в список популярных).
+    """
+
+
+class HotVideoTracker:
+    """
+    Отслеживает популярные видео воркера. Память фиксирована: `width * depth` счетчиков и `capacity` записей списка.
+    """
+
+    redis_key = "hot-videos"
+    """
+    Хэш Redis со снимками воркеров.
+    """
+
+    def __init__(self, settings: HotVideosSettings, start_time: float | None = None):
+        self.settings = settings
+        self.decay_rate = math.log(2) / settings.half_life
+        self.start_time = time.time() if start_time is None else start_time
+        self.counts = array("d", bytes(8 * settings.width * settings.depth))
+        self.top: dict[str, list[float]] = {}
+        """
+        Список популярных видео: оценка, вес редиректов на CDN и вес редиректов на origin сервер.
+        """
+        self.added_count = 0
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{threading.get_native_id()}"
+        self._min_top_estimate = 0.0
+        """
+        Нижняя граница наименьшей оценки в списке популярных видео.
+        """
+
+    def get_weight(self, now: float) -> float:
+        return math.exp(self.decay_rate * (now - self.start_time))
+
+    def get_indices(self, video: str) -> list[int]:
+        # Индексы всех строк получаются из одного 64-битного хэша (двойное хэширование).
+        digest = int.from_bytes(hashlib.blake2b(video.encode(), digest_size=8).digest())
+        first_hash = digest & 0xFFFFFFFF
+        second_hash = (digest >> 32) | 1
+        width = self.settings.width
+        return [row * width + (first_hash + row * second_hash) % width for row in range(self.settings.depth)]
+
+    def estimate(self, video: str) -> float:
+        counts = self.counts
+        return min(counts[index] for index in self.get_indices(video))
+
+    def add(self, host: str, path: str, to_cdn: bool, now: float | None = None):
+        """
+        Учитывает запрос видео.
+
+        :param host: хост видео.
+        :param path: путь видео.
+        :param to_cdn: был ли сделан редирект на CDN.
+        :param now: текущее Unix время (по умолчанию - системное).
+        """
+
+        weight = self.get_weight(time.time() if now is None else now)
+        if weight > max_weight:
+            self.normalize(self.start_time + math.log(weight) / self.decay_rate)
+            weight = 1.0
+
+        video = host + path
+        counts = self.counts
+        estimate = math.inf
+        for index in self.get_indices(video):
+            value = counts[index] = counts[index] + weight
+            if value < estimate:
+                estimate = value
+
+        entry = self.top.get(video)
+        if entry is None:
+            if len(self.top) < self.settings.capacity:
+                entry = self.top[video] = [0.0, 0.0, 0.0]
+            elif estimate > self._min_top_estimate:
+                # Оценки в списке только растут, поэтому настоящий минимум ищем, лишь когда превышена его нижняя граница.
+                min_video = min(self.top, key=lambda top_video: self.top[top_video][0])
+                self._min_top_estimate = self.top[min_video][0]
+                if estimate > self._min_top_estimate:
+                    del self.top[min_video]
+                    entry = self.top[video] = [0.0, 0.0, 0.0]
+
+        if entry is not None:
+            entry[0] = estimate
+            entry[1 if to_cdn else 2] += weight
+
+        self.added_count += 1
+
+    def normalize(self, new_start_time: float):
+        """
+        Переносит начало отсчёта весов, пересчитывая счетчики.
+        """
+
+        factor = math.exp(self.decay_rate * (self.start_time - new_start_time))
+        counts = self.counts
+        for index in range(len(counts)):
+            counts[index] *= factor
+        for entry in self.top.values():
+            entry[0] *= factor
+            entry[1] *= factor
+            entry[2] *= factor
+        self._min_top_estimate *= factor
+        self.start_time = new_start_time
+
+    def merge(self, other: "HotVideoTracker"):
+        """
+        Добавляет оценки другого трекера с теми же настройками sketch.
+        """
+
+        if (other.settings.width, other.settings.depth, other.settings.half_life) != (
+            self.settings.width,
+            self.settings.depth,
+            self.settings.half_life,
+        ):
+            raise ValueError("Нельзя объединить трекеры с разными настройками.")
+
+        factor = math.exp(self.decay_rate * (other.start_time - self.start_time))
+        counts = self.counts
+        for index, value in enumerate(other.counts):
+            counts[index] += value * factor
+
+        for video, (_, cdn_weight, origin_weight) in other.top.items():
+            entry = self.top.setdefault(video, [0.0, 0.0, 0.0])
+            entry[1] += cdn_weight * factor
+            entry[2] += origin_weight * factor
+
+        for video, entry in self.top.items():
+            entry[0] = self.estimate(video)
+        if len(self.top) > self.settings.capacity:
+            top_videos = sorted(self.top.items(), key=lambda item: item[1][0], reverse=True)
+            self.top = dict(top_videos[: self.settings.capacity])
+        self._min_top_estimate = 0.0
+
+    def get_top(self, count: int, now: float | None = None) -> list[HotVideo]:
+        """
+        Возвращает `count` самых популярных видео.
+        """
+
+        weight = self.get_weight(time.time() if now is None else now)
+        hot_videos: list[HotVideo] = []
+        for video in self.top:
+            _, cdn_weight, origin_weight = self.top[video]
+            total_weight = cdn_weight + origin_weight
+            hot_videos.append(
+                HotVideo(
+                    video=video,
+                    requests_per_second=self.decay_rate * self.estimate(video) / weight,
+                    cdn_share=cdn_weight / total_weight if total_weight else 0.0,
+                )
+            )
+        hot_videos.sort(key=lambda hot_video: hot_video.requests_per_second, reverse=True)
+        return hot_videos[:count]
+
+    def dump(self, now: float | None = None) -> str:
+        """
+        Сериализует снимок трекера в JSON.
+        """
+
+        return json.dumps(
+            {
+                "published_at": time.time() if now is None else now,
+                "start_time": self.start_time,
+                "width": self.settings.width,
+                "depth": self.settings.depth,
+                "half_life": self.settings.half_life,
+                "counts": base64.b64encode(self.counts.tobytes()).decode(),
+                "top": [[video, *entry] for video, entry in self.top.items()],
+            }
+        )
+
+    @classmethod
+    def from_snapshot(cls, snapshot: dict[str, Any], settings: HotVideosSettings) -> "HotVideoTracker":
+        """
+        Восстанавливает трекер из разобранного снимка. Размеры sketch и период полураспада берутся из снимка.
+        """
+
+        tracker = cls(
+            settings.model_copy(
+                update={
+                    "width": snapshot["width"],
+                    "depth": snapshot["depth"],
+                    "half_life": snapshot["half_life"],
+                }
+            ),
+            start_time=snapshot["start_time"],
+        )
+        tracker.counts = array("d", base64.b64decode(snapshot["counts"]))
+        tracker.top = {video: entry for video, *entry in snapshot["top"]}
+        return tracker
+
+    async def publish(self, redis_client: redis.Redis):
+        await redis_client.hset(self.redis_key, self.worker_id, self.dump())  # type: ignore
+
+    async def read_merged(self, redis_client: redis.Redis) -> "HotVideoTracker":
+        """
+        Объединяет снимки всех воркеров из Redis (включая снимок этого воркера) и удаляет устаревшие снимки.
+        """
+
+        merged = HotVideoTracker(self.settings)
+        stale_time = time.time() - 3 * self.settings.publish_interval
+        stale_workers: list[str | bytes] = []
+        snapshots: dict[bytes | str, bytes | str] = await redis_client.hgetall(self.redis_key)  # type: ignore
+        for worker_id, data in snapshots.items():
+            snapshot = json.loads(data)
+            if snapshot["published_at"] < stale_time:
+                stale_workers.append(worker_id)
+                continue
+            try:
+                merged.merge(HotVideoTracker.from_snapshot(snapshot, self.settings))
+            except ValueError:
+                logger.warning("Снимок воркера %r несовместим с настройками трекера", worker_id)
+
+        if stale_workers:
+            await redis_client.hdel(self.redis_key, *stale_workers)  # type: ignore
+        return merged
+
+    @asynccontextmanager
+    async def run(self, redis_client: redis.Redis):
+        """
+        Менеджер контекста, в рамках которого снимок воркера периодически публикуется в Redis.
+        """
+
+        task = asyncio.create_task(self._publish_periodically(redis_client))
+        try:
+            yield
+        finally:
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+            with suppress(Exception):
+                await redis_client.hdel(self.redis_key, self.worker_id)  # type: ignore
+
+    async def _publish_periodically(self, redis_client: redis.Redis):
+        while True:
+            await asyncio.sleep(self.settings.publish_interval)
+            try:
+                await self.publish(redis_client)
+            except Exception:
+                logger.exception("Не удалось опубликовать снимок популярных видео")
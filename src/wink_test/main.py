@@ -1,17 +1,124 @@
+import asyncio
+import gc
+import logging
+import os
+import threading
+from contextlib import suppress
+
 from fastapi import FastAPI, Response, status
 from fastapi.concurrency import asynccontextmanager
 
-from wink_test.dependencies import get_app_state, get_settings
-from wink_test.routers import balancer_api, balancer_settings_api
+from wink_test import warmup
+from wink_test.dependencies import (
+    AppState,
+    get_app_state,
+    get_db_connection,
+    get_redis_connection,
+    get_settings,
+    warmup_request_counter,
+)
+from wink_test.routers import balancer_api, balancer_settings_api, stats_api
+from wink_test.settings import Settings
+from wink_test.shared_counter import LocalCounter, SharedCounter
+
+logger = logging.getLogger(__name__)
+
+
+async def warm_up(app: FastAPI, settings: Settings):
+    """
+    Прогревает воркер: открывает соединения и выполняет служебные запросы. Служебные запросы считаются отдельным
+    счетчиком, поэтому не влияют на распределение запросов клиентов, и не попадают в журнал решений и статистику
+    популярных видео.
+    """
+
+    redis_connection = get_redis_connection(settings)
+    await warmup.open_connections(redis_connection, get_db_connection(settings), settings.warmup)
+
+    if settings.warmup.requests:
+        warmup_counter: SharedCounter | LocalCounter
+        if settings.counter.local:
+            warmup_counter = LocalCounter()
+        else:
+            warmup_counter = SharedCounter(
+                redis_connection, f"warmup-counter-{os.getpid()}-{threading.get_native_id()}"
+            )
+        # Запросы выполняются в текущей задаче, поэтому счетчик прогрева виден только им, а не запросам клиентов.
+        token = warmup_request_counter.set(warmup_counter)
+        try:
+            await warmup.send_requests(app, settings.warmup.requests)
+        finally:
+            warmup_request_counter.reset(token)
+            await warmup_counter.reset()
+
+
+@asynccontextmanager
+async def readiness(app: FastAPI, settings: Settings, app_state: AppState):
+    """
+    Менеджер контекста готовности воркера (`GET /ready`). Воркер готов после успешного прогрева; если прогрев не
+    удался, он повторяется в фоне. При завершении работы воркер сразу перестаёт быть готовым.
+    """
+
+    async def warm_up_until_ready():
+        while True:
+            try:
+                await warm_up(app, settings)
+            except Exception:
+                logger.exception("Не удалось прогреть воркер, повтор через %s с.", settings.warmup.retry_interval)
+                await asyncio.sleep(settings.warmup.retry_interval)
+            else:
+                app_state.loop.ready = True
+                return
+
+    # Первая попытка выполняется до приёма запросов, чтобы воркер не получал их непрогретым.
+    try:
+        await warm_up(app, settings)
+        app_state.loop.ready = True
+        task = None
+    except Exception:
+        logger.exception("Не удалось прогреть воркер, повтор через %s с.", settings.warmup.retry_interval)
+        task = asyncio.create_task(warm_up_until_ready())
+
+    try:
+        yield
+    finally:
+        app_state.loop.ready = False
+        if task:
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     settings = await get_settings()
     app_state = get_app_state()
+    app_state.loop.event_loop = asyncio.get_running_loop()
     async with balancer_api.lifespan(app, settings):
         async with balancer_settings_api.lifespan(app, settings, app_state):
-            yield
+            async with readiness(app, settings, app_state):
+                yield
+
+
+def preload():
+    """
+    Загружает и проверяет настройки в мастер-процессе Gunicorn до запуска воркеров. Воркеры получают готовый снимок
+    настроек при fork и не обращаются к БД при запуске. Объекты мастер-процесса замораживаются (`gc.freeze`), чтобы
+    сборщик мусора воркеров не копировал общие страницы памяти.
+    """
+
+    async def load_settings():
+        settings = await get_settings()
+        app_state = get_app_state()
+        await balancer_settings_api.sync_balancer_settings(settings, app_state)
+
+    asyncio.run(load_settings())
+
+    # Соединения с БД открываются воркерами самостоятельно, при первом обращении к API настроек.
+    app_state = get_app_state()
+    app_state.loop.db_connection = None
+    app_state.loop.balancer_settings_db_model = None
+    app_state.preloaded = True
+    gc.freeze()
 
 
 app = FastAPI(lifespan=lifespan)
@@ -22,5 +129,13 @@ def health_check():
     return Response(status_code=status.HTTP_200_OK)
 
 
+@app.get("/ready")
+def readiness_check():
+    if get_app_state().loop.ready:
+        return Response(status_code=status.HTTP_200_OK)
+    return Response(status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+
 app.include_router(balancer_api.router)
 app.include_router(balancer_settings_api.router)
+app.include_router(stats_api.router)
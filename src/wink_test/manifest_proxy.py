@@ -0,0 +1,286 @@
+"""
+Проксирование плейлистов HLS. Вместо редиректа на плейлист, ссылки в котором ведут на origin сервер, балансировщик
+загружает плейлист с origin сервера, переписывает ссылки на сегменты и вложенные плейлисты на CDN (по тому же правилу
+`sN` поддоменов, что и редиректы) и возвращает переписанный плейлист. Так на CDN уходит весь просмотр, а не только
+первый запрос.
+
+Разобранные плейлисты кэшируются воркером с ограниченным временем жизни; одновременные запросы одного плейлиста ждут
+одну загрузку с origin сервера. Ссылки на CDN формируются при каждом ответе, поэтому один кэш подходит для всех узлов
+CDN и подписей URL.
+
+URL видео передаёт клиент, поэтому загружаются только плейлисты с файловых серверов (`sN` поддоменов заданных
+доменов) без строки запроса, а редиректы origin сервера не выполняются.
+"""
+
+import asyncio
+import re
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager, suppress
+from typing import Callable, NamedTuple
+from urllib.parse import urljoin, urlsplit, urlunsplit
+
+import httpx
+from pydantic import BaseModel, HttpUrl, PositiveFloat, PositiveInt, model_validator
+
+from wink_test.balancer import file_server_subdomain_pattern
+
+__all__ = (
+    "manifest_media_type",
+    "ManifestProxySettings",
+    "ManifestError",
+    "ManifestUri",
+    "Manifest",
+    "ManifestCache",
+    "is_manifest_path",
+    "parse_manifest",
+)
+
+manifest_media_type = "application/vnd.apple.mpegurl"
+
+uri_attribute_pattern = re.compile(r'URI="([^"]*)"')
+"""
+Поиск атрибута `URI` в тегах плейлиста (`#EXT-X-KEY`, `#EXT-X-MAP`, `#EXT-X-MEDIA`, ...).
+"""
+
+
+class ManifestProxySettings(BaseModel):
+    """
+    Модель настроек проксирования плейлистов HLS.
+    """
+
+    ttl: PositiveFloat = 2.0
+    """
+    Время жизни плейлиста в кэше (в секундах). Для live трансляций должно быть меньше длительности сегмента.
+    """
+
+    max_entries: PositiveInt = 1024
+    """
+    Максимальное количество плейлистов в кэше воркера.
+    """
+
+    max_size: PositiveInt = 4 * 2**20
+    """
+    Максимальный размер плейлиста (в байтах).
+    """
+
+    timeout: PositiveFloat = 5.0
+    """
+    Таймаут загрузки плейлиста с origin сервера (в секундах).
+    """
+
+    max_connections: PositiveInt = 100
+    """
+    Максимальное количество соединений воркера с origin серверами.
+    """
+
+    origin_domains: list[str]
+    """
+    Домены файловых серверов (например, `origin-cluster` для `s1.origin-cluster`). Плейлисты загружаются только с
+    хостов вида `sN.<домен>` этих доменов, поэтому список обязателен и не может быть пустым.
+    """
+
+    @model_validator(mode="after")
+    def check_origin_domains(self):
+        if not self.origin_domains:
+            raise ValueError("Не заданы домены файловых серверов, с которых можно загружать плейлисты.")
+        return self
+
+
+class ManifestError(Exception):
+    """
+    Плейлист не удалось загрузить или разобрать.
+    """
+
+
+class ManifestUri(NamedTuple):
+    url: str
+    """
+    Абсолютный URL на origin сервере.
+    """
+
+    file_server_subdomain: str | None
+    """
+    Поддомен файлового сервера (`sN`) или `None`, если URL не может быть переписан на CDN.
+    """
+
+    path: str
+
+
+class Manifest(NamedTuple):
+    """
+    Разобранный плейлист: фрагменты текста, между которыми стоят ссылки.
+    """
+
+    parts: tuple[str | ManifestUri, ...]
+
+    @property
+    def uris(self) -> list[ManifestUri]:
+        return [part for part in self.parts if isinstance(part, ManifestUri)]
+
+    def render(self, rewrite_uri: Callable[[ManifestUri], str]) -> str:
+        """
+        Собирает текст плейлиста, заменяя ссылки результатом `rewrite_uri`.
+        """
+
+        return "".join(part if isinstance(part, str) else rewrite_uri(part) for part in self.parts)
+
+
+def is_manifest_path(path: str) -> bool:
+    return path.endswith(".m3u8")
+
+
+def parse_uri(uri: str, manifest_url: str) -> ManifestUri:
+    url = urljoin(manifest_url, uri)
+    split_url = urlsplit(url)
+    match = file_server_subdomain_pattern.search(split_url.hostname or "")
+    return ManifestUri(url, match.group(1) if match else None, split_url.path or "/")
+
+
+def parse_manifest(text: str, manifest_url: str) -> Manifest:
+    """
+    Разбирает плейлист HLS. Относительные ссылки разрешаются относительно `manifest_url`: после переписывания
+    плейлист отдаётся с другого адреса.
+    """
+
+    if not text.lstrip().startswith("#EXTM3U"):
+        raise ManifestError("Ответ origin сервера не является плейлистом HLS.")
+
+    parts: list[str | ManifestUri] = []
+    text_part: list[str] = []
+
+    def add_uri(uri: str):
+        parts.append("".join(text_part))
+        text_part.clear()
+        parts.append(parse_uri(uri, manifest_url))
+
+    for line in text.splitlines(keepends=True):
+        content = line.strip()
+        if content.startswith("#"):
+            position = 0
+            for match in uri_attribute_pattern.finditer(line):
+                text_part.append(line[position : match.start(1)])
+                add_uri(match.group(1))
+                position = match.end(1)
+            text_part.append(line[position:])
+        elif content:
+            add_uri(content)
+            text_part.append(line[len(line.rstrip("\r\n")) :])
+        else:
+            text_part.append(line)
+
+    parts.append("".join(text_part))
+    return Manifest(tuple(part for part in parts if part))
+
+
+class ManifestCache:
+    """
+    Кэш разобранных плейлистов с загрузкой через общий пул соединений. Привязан к циклу событий.
+    """
+
+    def __init__(self, settings: ManifestProxySettings):
+        self.settings = settings
+        self.client = httpx.AsyncClient(
+            # Редирект мог бы увести загрузку с файлового сервера на произвольный адрес.
+            follow_redirects=False,
+            timeout=settings.timeout,
+            limits=httpx.Limits(
+                max_connections=settings.max_connections, max_keepalive_connections=settings.max_connections
+            ),
+        )
+        self._entries: OrderedDict[str, tuple[float, Manifest]] = OrderedDict()
+        self._fetches: dict[str, asyncio.Task[Manifest]] = {}
+        self.hits_count = 0
+        self.misses_count = 0
+        self.coalesced_count = 0
+        self.errors_count = 0
+
+    @property
+    def size(self) -> int:
+        return len(self._entries)
+
+    def get_origin_url(self, video: HttpUrl) -> str | None:
+        """
+        Возвращает URL плейлиста на файловом сервере без строки запроса или `None`, если `video` не указывает на
+        файловый сервер одного из `origin_domains` и плейлист загружать нельзя. Строка запроса отбрасывается, как и при переписывании ссылок на
+        CDN, поэтому разные строки запроса не создают новых записей в кэше.
+        """
+
+        host = video.host or ""
+        if not (match := file_server_subdomain_pattern.search(host)):
+            return None
+        if host[match.end() :] not in self.settings.origin_domains:
+            return None
+        split_url = urlsplit(str(video))
+        return urlunsplit((split_url.scheme, split_url.netloc, split_url.path, "", ""))
+
+    @asynccontextmanager
+    async def run(self):
+        """
+        Менеджер контекста, по выходу из которого прерываются загрузки и закрываются соединения.
+        """
+
+        try:
+            yield
+        finally:
+            for fetch in list(self._fetches.values()):
+                fetch.cancel()
+                with suppress(Exception, asyncio.CancelledError):
+                    await fetch
+            await self.client.aclose()
+
+    def _evict_expired(self, now: float):
+        # Время жизни одинаковое, поэтому записи упорядочены по времени истечения.
+        entries = self._entries
+        while entries:
+            url, (expires_at, _) = next(iter(entries.items()))
+            if expires_at > now:
+                break
+            del entries[url]
+
+    async def get(self, url: str, now: float | None = None) -> Manifest:
+        """
+        Возвращает разобранный плейлист из кэша или загружает его с origin сервера. Если плейлист уже загружается,
+        ожидается та же загрузка.
+
+        :raises ManifestError: плейлист не удалось загрузить или разобрать.
+        """
+
+        now = time.monotonic() if now is None else now
+        self._evict_expired(now)
+        if (entry := self._entries.get(url)) is not None:
+            self.hits_count += 1
+            return entry[1]
+
+        if (fetch := self._fetches.get(url)) is not None:
+            self.coalesced_count += 1
+        else:
+            self.misses_count += 1
+            # Загрузка выполняется отдельной задачей, чтобы отмена одного из ожидающих запросов не прерывала её.
+            fetch = self._fetches[url] = asyncio.create_task(self._fetch(url, now))
+            fetch.add_done_callback(lambda task: self._on_fetch_done(url, task))
+        return await asyncio.shield(fetch)
+
+    def _on_fetch_done(self, url: str, task: asyncio.Task[Manifest]):
+        del self._fetches[url]
+        if not task.cancelled() and task.exception():
+            self.errors_count += 1
+
+    async def _fetch(self, url: str, now: float) -> Manifest:
+        try:
+            async with self.client.stream("GET", url) as response:
+                response.raise_for_status()
+                content = bytearray()
+                async for chunk in response.aiter_bytes():
+                    content += chunk
+                    if len(content) > self.settings.max_size:
+                        raise ManifestError("Размер плейлиста превышает допустимый.")
+                manifest = parse_manifest(content.decode(response.encoding or "utf-8"), str(response.url))
+        except (httpx.HTTPError, UnicodeDecodeError) as exc:
+            raise ManifestError(f"Не удалось загрузить плейлист {url}: {exc}") from exc
+
+        self._entries[url] = (now + self.settings.ttl, manifest)
+        self._entries.move_to_end(url)
+        while len(self._entries) > self.settings.max_entries:
+            self._entries.popitem(last=False)
+        return manifest
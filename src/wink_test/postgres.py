@@ -1,7 +1,8 @@
+import asyncio
 from contextlib import asynccontextmanager
 
 import asyncpg
-from pydantic import BaseModel, PostgresDsn
+from pydantic import BaseModel, NonNegativeInt, PositiveFloat, PositiveInt, PostgresDsn
 
 __all__ = ("Postgres",)
 
@@ -31,26 +32,70 @@ class PostgresSettings(BaseModel):
     Название используемой БД.
     """
 
+    pool_min_size: NonNegativeInt = 0
+    """
+    Минимальное количество соединений в пуле.
+    """
+
+    pool_max_size: PositiveInt = 2
+    """
+    Максимальное количество соединений в пуле.
+    """
+
+    pool_idle_timeout: PositiveFloat = 60.0
+    """
+    Время (в секундах), после которого неиспользуемое соединение закрывается.
+    """
+
 
 class Postgres:
     """
-    Класс, оборачивающий соединение с БД.
+    Класс, оборачивающий соединение с БД. Пул соединений открывается при первом обращении.
     """
 
     def __init__(self, settings: PostgresSettings):
         self.settings = settings
         self.pool: asyncpg.Pool[asyncpg.Record] | None = None
+        self._pool_lock = asyncio.Lock()
+
+    def create_pool(self) -> "asyncpg.Pool[asyncpg.Record]":
+        return asyncpg.create_pool(
+            dsn=str(self.settings.url),
+            user=self.settings.user,
+            password=self.settings.password,
+            database=self.settings.name,
+            min_size=self.settings.pool_min_size,
+            max_size=self.settings.pool_max_size,
+            max_inactive_connection_lifetime=self.settings.pool_idle_timeout,
+        )
+
+    async def get_pool(self) -> "asyncpg.Pool[asyncpg.Record]":
+        """
+        Возвращает пул соединений, открывая его при первом вызове.
+        """
+
+        if self.pool:
+            return self.pool
+
+        async with self._pool_lock:
+            if not self.pool:
+                self.pool = await self.create_pool()
+            return self.pool
+
+    async def close(self):
+        """
+        Закрывает пул соединений. При следующем обращении пул будет открыт заново.
+        """
+
+        async with self._pool_lock:
+            if self.pool:
+                await self.pool.close()
+                self.pool = None
 
     @asynccontextmanager
     async def connect(self):
         try:
-            async with asyncpg.create_pool(
-                dsn=str(self.settings.url),
-                user=self.settings.user,
-                password=self.settings.password,
-                database=self.settings.name,
-            ) as pool:
-                self.pool = pool
-                yield
+            await self.get_pool()
+            yield
         finally:
-            self.pool = None
+            await self.close()
@@ -0,0 +1,68 @@
+"""
+Работа за обратным прокси (nginx). Прокси передаёт запрос клиента во внутренний `GET /decide`, который отвечает пустым
+телом и адресом редиректа в заголовке `X-Balancer-Location`; редирект клиенту отдаёт сам прокси. С заголовком
+`X-Accel-Redirect` nginx обрабатывает ответ во внутреннем location, а с `X-Accel-Expires` - кэширует решения.
+"""
+
+from ipaddress import IPv6Address, ip_address
+
+from pydantic import BaseModel, IPvAnyNetwork, NonNegativeInt
+
+__all__ = (
+    "location_header",
+    "ProxyIntegrationSettings",
+    "is_trusted_proxy",
+    "get_decision_headers",
+)
+
+location_header = "x-balancer-location"
+"""
+Заголовок ответа `GET /decide` с адресом редиректа.
+"""
+
+
+class ProxyIntegrationSettings(BaseModel):
+    """
+    Модель настроек работы за обратным прокси.
+    """
+
+    accel_redirect: str | None = None
+    """
+    Location nginx, в который делается внутренний редирект заголовком `X-Accel-Redirect` (например,
+    `@balancer_redirect`). Если не задан, заголовок не отправляется.
+    """
+
+    cache_ttl: NonNegativeInt = 0
+    """
+    Время кэширования решения прокси (в секундах, заголовок `X-Accel-Expires`). Запросы, на которые прокси ответил из
+    кэша, не учитываются счетчиком запросов. Если равно 0, заголовок не отправляется.
+    """
+
+    trusted_proxies: list[IPvAnyNetwork] = []
+    """
+    Подсети прокси-серверов, которые подключаются по TCP и передают адрес клиента заголовком `X-Real-IP`. Для запросов
+    по unix сокету заголовок учитывается всегда.
+    """
+
+
+def is_trusted_proxy(address: str, settings: ProxyIntegrationSettings) -> bool:
+    """
+    Проверяет, входит ли адрес в подсети доверенных прокси. Некорректный адрес не считается доверенным.
+    """
+
+    try:
+        parsed_address = ip_address(address)
+    except ValueError:
+        return False
+    if isinstance(parsed_address, IPv6Address) and parsed_address.ipv4_mapped:
+        parsed_address = parsed_address.ipv4_mapped
+    return any(parsed_address in network for network in settings.trusted_proxies)
+
+
+def get_decision_headers(redirect_url: str, settings: ProxyIntegrationSettings) -> dict[str, str]:
+    headers = {location_header: redirect_url}
+    if settings.accel_redirect:
+        headers["x-accel-redirect"] = settings.accel_redirect
+    if settings.cache_ttl:
+        headers["x-accel-expires"] = str(settings.cache_ttl)
+    return headers
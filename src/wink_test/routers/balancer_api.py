@@ -1,21 +1,77 @@
-import re
-from typing import Any, Callable, Coroutine
+import logging
+from contextlib import AsyncExitStack
+from typing import Any, Callable, Coroutine, NamedTuple
 
 from fastapi import APIRouter, FastAPI, HTTPException, Request, Response, status
 from fastapi.concurrency import asynccontextmanager
 from fastapi.exception_handlers import request_validation_exception_handler
 from fastapi.exceptions import RequestValidationError
 from fastapi.routing import APIRoute
-from pydantic import HttpUrl
+from pydantic import HttpUrl, ValidationError
 
-from wink_test.balancer import calculate_should_redirect_to_cdn
+from wink_test.admission import AdmissionController
+from wink_test.balancer import calculate_should_redirect_to_cdn, format_cdn_url, rewrite_video_url_for_cdn
+from wink_test.decision_log import DecisionLog
 from wink_test.dependencies import (
+    DecisionLogDependency,
+    EdgeRouterDependency,
+    HotVideoTrackerDependency,
+    ManifestCacheDependency,
     RequestCounterDependency,
+    SessionAffinityDependency,
     SettingsDependency,
+    UrlSignerDependency,
+    get_admission_controller,
+    get_app_state,
+    get_db_connection,
+    get_decision_log,
+    get_edge_router,
+    get_hot_video_tracker,
+    get_manifest_cache,
     get_redis_connection,
     get_request_counter,
+    get_url_signer,
+    warmup_request_counter,
 )
+from wink_test.edge_routing import EdgeRouter
+from wink_test.hot_videos import HotVideoTracker
+from wink_test.manifest_proxy import Manifest, ManifestError, ManifestUri, is_manifest_path, manifest_media_type
+from wink_test.proxy_integration import ProxyIntegrationSettings, get_decision_headers, is_trusted_proxy
+from wink_test.session_affinity import SessionAffinityCache
 from wink_test.settings import Settings
+from wink_test.shared_counter import LocalCounter, SharedCounter
+from wink_test.url_signing import UrlSigner
+
+logger = logging.getLogger(__name__)
+
+
+def get_cdn_redirect_url(video: HttpUrl, cdn_host: HttpUrl, settings: Settings, url_signer: UrlSigner) -> str:
+    """
+    Возвращает URL редиректа на CDN, подписанный токеном, если включена подпись URL. Если URL видео не может быть
+    переписан на CDN, возвращается исходный URL.
+    """
+
+    cdn_url = rewrite_video_url_for_cdn(video, cdn_host)
+    if settings.url_signing and cdn_url is not video:
+        return url_signer.sign(cdn_url, settings.url_signing)
+    return str(cdn_url)
+
+
+def render_manifest_for_cdn(manifest: Manifest, cdn_host: HttpUrl, settings: Settings, url_signer: UrlSigner) -> str:
+    """
+    Возвращает текст плейлиста, ссылки в котором переписаны на CDN так же, как URL редиректов. Ссылки, которые не могут
+    быть переписаны на CDN, остаются абсолютными ссылками на origin сервер.
+    """
+
+    def rewrite_uri(uri: ManifestUri) -> str:
+        if uri.file_server_subdomain is None:
+            return uri.url
+        cdn_url = format_cdn_url(cdn_host, uri.file_server_subdomain, uri.path)
+        if settings.url_signing:
+            return url_signer.sign(HttpUrl(cdn_url), settings.url_signing)
+        return cdn_url
+
+    return manifest.render(rewrite_uri)
 
 
 class BalancerAPIRoute(APIRoute):
@@ -35,10 +91,42 @@ class BalancerAPIRoute(APIRoute):
         else:
             return False
 
+    @staticmethod
+    def reject_request(request: Request, admission_controller: AdmissionController, status_code: int) -> Response:
+        """
+        Формирует ответ на запрос, не допущенный к обработке. Если включена деградация до CDN, вместо отказа делается
+        редирект на CDN без обращения к счетчику запросов.
+        """
+
+        settings = get_app_state().settings
+        if (
+            status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+            and admission_controller.settings.degrade_to_cdn
+            and settings
+        ):
+            try:
+                video = HttpUrl(request.query_params["video"])
+            except (KeyError, ValidationError):
+                pass
+            else:
+                if video.host:
+                    admission_controller.degraded_count += 1
+                    return Response(
+                        headers={
+                            "location": get_cdn_redirect_url(video, settings.cdn_host, settings, get_url_signer())
+                        },
+                        status_code=status.HTTP_301_MOVED_PERMANENTLY,
+                    )
+
+        return Response(
+            headers={"retry-after": str(admission_controller.settings.retry_after)},
+            status_code=status_code,
+        )
+
     def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
         original_route_handler = super().get_route_handler()
 
-        async def custom_route_handler(request: Request) -> Response:
+        async def validating_route_handler(request: Request) -> Response:
             try:
                 return await original_route_handler(request)
             except RequestValidationError as exc:
@@ -47,44 +135,203 @@ class BalancerAPIRoute(APIRoute):
                         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
                 return await request_validation_exception_handler(request, exc)
 
+        async def custom_route_handler(request: Request) -> Response:
+            admission_controller = get_app_state().loop.admission_controller
+            # Служебные запросы прогрева не расходуют токены клиентов и не учитываются статистикой контроля допуска.
+            if not admission_controller or warmup_request_counter.get():
+                return await validating_route_handler(request)
+
+            if not admission_controller.allow_client(request.client.host if request.client else ""):
+                return self.reject_request(request, admission_controller, status.HTTP_429_TOO_MANY_REQUESTS)
+
+            if not await admission_controller.acquire():
+                return self.reject_request(request, admission_controller, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+            try:
+                return await validating_route_handler(request)
+            finally:
+                admission_controller.release()
+
         return custom_route_handler
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI, settings: Settings):
     redis_connection = get_redis_connection(settings)
-    counter = get_request_counter(redis_connection)
-    if counter:
-        await counter.reset()
-    yield
+    get_request_counter(settings, redis_connection)
+
+    admission_controller = get_admission_controller(settings)
+
+    async with AsyncExitStack() as stack:
+        if admission_controller:
+            await stack.enter_async_context(admission_controller.run(redis_connection))
+        if decision_log := get_decision_log(settings):
+            await stack.enter_async_context(decision_log.run())
+        if edge_router := get_edge_router(settings, get_db_connection(settings)):
+            await stack.enter_async_context(edge_router.run())
+        if hot_video_tracker := get_hot_video_tracker(settings):
+            await stack.enter_async_context(hot_video_tracker.run(redis_connection))
+        if manifest_cache := get_manifest_cache(settings):
+            await stack.enter_async_context(manifest_cache.run())
+        yield
 
 
 router = APIRouter(route_class=BalancerAPIRoute)
 
 
+class Decision(NamedTuple):
+    should_redirect_to_cdn: bool
+    cdn_host: HttpUrl
+
+
+async def make_decision(
+    client_address: str,
+    video: HttpUrl,
+    request_counter: SharedCounter | LocalCounter,
+    settings: Settings,
+    edge_router: EdgeRouter | None,
+    session_affinity: SessionAffinityCache | None,
+) -> Decision:
+    """
+    Решает, куда перенаправить запрос видео: на CDN или на origin сервер.
+    """
+
+    # Без адреса клиента (unix сокет без `X-Real-IP`) сессии разных клиентов неразличимы, поэтому не привязываются.
+    if not client_address:
+        session_affinity = None
+
+    # Запросы сессии с запомненным решением не учитываются счетчиком.
+    should_redirect_to_cdn = await session_affinity.get(client_address, video) if session_affinity else None
+    if should_redirect_to_cdn is None:
+        request_index = await request_counter.increment() - 1
+        should_redirect_to_cdn = await calculate_should_redirect_to_cdn(request_index, settings.redirect_ratio)
+        if session_affinity:
+            should_redirect_to_cdn = await session_affinity.remember(client_address, video, should_redirect_to_cdn)
+
+    cdn_host = settings.cdn_host
+    if should_redirect_to_cdn and edge_router and client_address:
+        cdn_host = edge_router.get_cdn_host(client_address) or cdn_host
+
+    return Decision(should_redirect_to_cdn, cdn_host)
+
+
+async def record_decision(
+    video: HttpUrl,
+    decision: Decision,
+    settings: Settings,
+    decision_log: DecisionLog | None,
+    hot_video_tracker: HotVideoTracker | None,
+):
+    """
+    Учитывает принятое решение в журнале решений и статистике популярных видео.
+    """
+
+    assert video.host
+    if decision_log:
+        decision_log.append(video.host, video.path or "", decision.should_redirect_to_cdn, settings.version)
+    if hot_video_tracker:
+        hot_video_tracker.add(video.host, video.path or "", decision.should_redirect_to_cdn)
+
+
 @router.get("/")
 async def balancer_root(
+    request: Request,
     video: HttpUrl,
     request_counter: RequestCounterDependency,
     settings: SettingsDependency,
+    decision_log: DecisionLogDependency,
+    edge_router: EdgeRouterDependency,
+    url_signer: UrlSignerDependency,
+    hot_video_tracker: HotVideoTrackerDependency,
+    session_affinity: SessionAffinityDependency,
+    manifest_cache: ManifestCacheDependency,
 ):
     assert settings.cdn_host.host
     assert video.host
 
-    redirect_url = video
-    request_index = await request_counter.get()
-    should_redirect_to_cdn = await calculate_should_redirect_to_cdn(request_index, settings.redirect_ratio)
+    client_address = request.client.host if request.client else ""
+    if edge_router and client_address:
+        client_address = edge_router.get_client_address(client_address, request.headers.get("x-forwarded-for"))
+
+    decision = await make_decision(client_address, video, request_counter, settings, edge_router, session_affinity)
+
+    response = None
+    redirect_url = str(video)
+    if decision.should_redirect_to_cdn:
+        if (
+            manifest_cache
+            and is_manifest_path(video.path or "")
+            and (manifest_url := manifest_cache.get_origin_url(video)) is not None
+        ):
+            # Если плейлист не удалось загрузить, на него, как без проксирования, делается редирект.
+            try:
+                manifest = await manifest_cache.get(manifest_url)
+            except ManifestError as exc:
+                logger.warning("%s", exc)
+            else:
+                response = Response(
+                    render_manifest_for_cdn(manifest, decision.cdn_host, settings, url_signer),
+                    media_type=manifest_media_type,
+                )
 
-    if should_redirect_to_cdn:
-        # Поиск поддомена s1, s2, ..., sN.
-        if match := re.search(r"^(s\d+)\.", video.host):
-            file_server_subdomain = match.group(1)
-            redirect_url = HttpUrl(
-                f"{settings.cdn_host.scheme}://{settings.cdn_host.host}/{file_server_subdomain}{video.path}"
-            )
+        if response is None:
+            redirect_url = get_cdn_redirect_url(video, decision.cdn_host, settings, url_signer)
 
-    await request_counter.increment()
+    await record_decision(video, decision, settings, decision_log, hot_video_tracker)
+    if response is not None:
+        return response
     return Response(
-        headers={"location": str(redirect_url)},
+        headers={"location": redirect_url},
         status_code=status.HTTP_301_MOVED_PERMANENTLY,
     )
+
+
+def get_proxied_client_address(request: Request, settings: ProxyIntegrationSettings) -> str:
+    """
+    Определяет адрес клиента запроса от обратного прокси. Заголовок `X-Real-IP` учитывается, только если запрос пришёл
+    по unix сокету (у таких соединений нет адреса клиента) или от доверенного прокси (`trusted_proxies` настроек
+    работы за прокси), иначе адрес клиента подменяется заголовком.
+    """
+
+    real_ip = request.headers.get("x-real-ip")
+    if request.client is None:
+        return real_ip or ""
+
+    peer_address = request.client.host
+    if real_ip and is_trusted_proxy(peer_address, settings):
+        return real_ip
+    return peer_address
+
+
+@router.get("/decide")
+async def balancer_decide(
+    request: Request,
+    video: HttpUrl,
+    request_counter: RequestCounterDependency,
+    settings: SettingsDependency,
+    decision_log: DecisionLogDependency,
+    edge_router: EdgeRouterDependency,
+    url_signer: UrlSignerDependency,
+    hot_video_tracker: HotVideoTrackerDependency,
+    session_affinity: SessionAffinityDependency,
+):
+    """
+    Внутренний запрос для обратного прокси: решение принимается так же, как в `GET /`, но адрес редиректа
+    возвращается в заголовке ответа с пустым телом, а редирект клиенту отдаёт прокси.
+    """
+
+    if not settings.proxy_integration:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+
+    assert settings.cdn_host.host
+    assert video.host
+
+    client_address = get_proxied_client_address(request, settings.proxy_integration)
+
+    decision = await make_decision(client_address, video, request_counter, settings, edge_router, session_affinity)
+    redirect_url = str(video)
+    if decision.should_redirect_to_cdn:
+        redirect_url = get_cdn_redirect_url(video, decision.cdn_host, settings, url_signer)
+
+    await record_decision(video, decision, settings, decision_log, hot_video_tracker)
+    return Response(headers=get_decision_headers(redirect_url, settings.proxy_integration))
@@ -2,9 +2,12 @@ from contextlib import asynccontextmanager
 
 from fastapi import APIRouter, FastAPI, HTTPException, status
 
+from wink_test.admission import AdmissionSettings
 from wink_test.dependencies import (
+    AdmissionControllerDependency,
     AppState,
     BalancerSettingsDbModelDependency,
+    RedisConnectionDependency,
     SettingsDependency,
     get_balancer_settings_db_model,
     get_db_connection,
@@ -12,8 +15,12 @@ from wink_test.dependencies import (
 from wink_test.settings import BalancerSettings, Settings
 
 
-@asynccontextmanager
-async def lifespan(app: FastAPI, settings: Settings, app_state: AppState):
+async def sync_balancer_settings(settings: Settings, app_state: AppState):
+    """
+    Синхронизирует настройки балансировщика с БД: сохраняет текущие настройки, если в БД их нет, иначе применяет
+    настройки из БД. После синхронизации пул соединений закрывается и открывается снова только при обращении к API.
+    """
+
     db_connection = get_db_connection(settings)
     if db_connection:
         async with db_connection.connect():
@@ -25,9 +32,18 @@ async def lifespan(app: FastAPI, settings: Settings, app_state: AppState):
                 await model.create_object(settings)
             else:
                 app_state.update_balancer_settings(existing_settings)
-            yield
-    else:
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI, settings: Settings, app_state: AppState):
+    if not app_state.preloaded:
+        await sync_balancer_settings(settings, app_state)
+
+    try:
         yield
+    finally:
+        if app_state.loop.db_connection:
+            await app_state.loop.db_connection.close()
 
 
 router = APIRouter(prefix="/settings")
@@ -36,13 +52,49 @@ router = APIRouter(prefix="/settings")
 @router.get("")
 @router.get("/", include_in_schema=False)
 async def read_settings(settings: SettingsDependency):
-    return BalancerSettings(cdn_host=settings.cdn_host, redirect_ratio=settings.redirect_ratio)
+    return BalancerSettings(
+        cdn_host=settings.cdn_host, redirect_ratio=settings.redirect_ratio, url_signing=settings.url_signing
+    )
 
 
 @router.put("")
 @router.put("/", include_in_schema=False)
 async def update_settings(settings: BalancerSettings, balancer_settings_db_model: BalancerSettingsDbModelDependency):
+    """
+    Изменяет настройки балансировщика. Настройки подписи без `url_signing` не меняются, а ключи со скрытым значением
+    `**********` сохраняют текущие значения, поэтому ответ `GET /settings` можно изменить и отправить обратно.
+    """
+
     if not balancer_settings_db_model:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-    return await balancer_settings_db_model.update_object(settings)
+    try:
+        return await balancer_settings_db_model.update_object(settings)
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(exc))
+
+
+@router.get("/admission")
+async def read_admission_settings(admission_controller: AdmissionControllerDependency):
+    if not admission_controller:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+
+    return admission_controller.settings
+
+
+@router.put("/admission")
+async def update_admission_settings(
+    admission_settings: AdmissionSettings,
+    admission_controller: AdmissionControllerDependency,
+    redis_connection: RedisConnectionDependency,
+):
+    """
+    Изменяет пороги контроля допуска запросов без перезапуска. Пороги сохраняются в Redis и применяются воркером,
+    обработавшим запрос, сразу, а остальными воркерами (и циклами событий других потоков) - в течение `sync_interval`.
+    """
+
+    if not admission_controller:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+
+    await admission_controller.save_settings(redis_connection, admission_settings)
+    return admission_controller.settings
@@ -0,0 +1,133 @@
+from typing import Annotated
+
+from fastapi import APIRouter, Query
+
+from wink_test.dependencies import (
+    AdmissionControllerDependency,
+    DecisionLogDependency,
+    HotVideoTrackerDependency,
+    ManifestCacheDependency,
+    RedisConnectionDependency,
+    RequestCounterDependency,
+    SessionAffinityDependency,
+    UrlSignerDependency,
+)
+
+router = APIRouter(prefix="/stats")
+
+
+@router.get("/decision-log")
+async def read_decision_log_stats(decision_log: DecisionLogDependency):
+    if not decision_log:
+        return {"enabled": False}
+
+    return {
+        "enabled": True,
+        "appended": decision_log.appended_count,
+        "flushed": decision_log.flushed_count,
+        "pending": decision_log.pending_count,
+        "dropped": decision_log.dropped_count,
+        "truncated": decision_log.truncated_count,
+    }
+
+
+@router.get("/admission")
+async def read_admission_stats(admission_controller: AdmissionControllerDependency):
+    if not admission_controller:
+        return {"enabled": False}
+
+    return {
+        "enabled": True,
+        "active": admission_controller.active_count,
+        "queued": admission_controller.queued_count,
+        "admitted": admission_controller.admitted_count,
+        "shed": admission_controller.shed_count,
+        "rate_limited": admission_controller.rate_limited_count,
+        "degraded": admission_controller.degraded_count,
+    }
+
+
+@router.get("/url-signing")
+async def read_url_signing_stats(url_signer: UrlSignerDependency):
+    cache_info = url_signer.get_cache_info()
+    lookups_count = cache_info.hits + cache_info.misses
+    return {
+        "signed": url_signer.signed_count,
+        "cache_hits": cache_info.hits,
+        "cache_misses": cache_info.misses,
+        "cache_hit_rate": cache_info.hits / lookups_count if lookups_count else 0.0,
+        "cache_size": cache_info.currsize,
+        "signing_seconds": url_signer.signing_seconds,
+        "signing_seconds_per_miss": url_signer.signing_seconds / cache_info.misses if cache_info.misses else 0.0,
+    }
+
+
+@router.get("/counter")
+async def read_counter_stats(request_counter: RequestCounterDependency):
+    stripes = await request_counter.get_stripes()
+    return {
+        "total": sum(stripes),
+        "stripe": request_counter.stripe,
+        "stripes": stripes,
+    }
+
+
+@router.get("/affinity")
+async def read_session_affinity_stats(session_affinity: SessionAffinityDependency):
+    if not session_affinity:
+        return {"enabled": False}
+
+    lookups_count = session_affinity.hits_count + session_affinity.shared_hits_count + session_affinity.misses_count
+    return {
+        "enabled": True,
+        "size": session_affinity.size,
+        "hits": session_affinity.hits_count,
+        "shared_hits": session_affinity.shared_hits_count,
+        "misses": session_affinity.misses_count,
+        "hit_rate": (lookups_count - session_affinity.misses_count) / lookups_count if lookups_count else 0.0,
+        "evictions": session_affinity.evictions_count,
+        "shared_refreshes": session_affinity.shared_refreshes_count,
+    }
+
+
+@router.get("/manifest-proxy")
+async def read_manifest_proxy_stats(manifest_cache: ManifestCacheDependency):
+    if not manifest_cache:
+        return {"enabled": False}
+
+    lookups_count = manifest_cache.hits_count + manifest_cache.coalesced_count + manifest_cache.misses_count
+    return {
+        "enabled": True,
+        "size": manifest_cache.size,
+        "hits": manifest_cache.hits_count,
+        "coalesced": manifest_cache.coalesced_count,
+        "misses": manifest_cache.misses_count,
+        "hit_rate": (lookups_count - manifest_cache.misses_count) / lookups_count if lookups_count else 0.0,
+        "errors": manifest_cache.errors_count,
+    }
+
+
+@router.get("/top")
+async def read_top_videos(
+    hot_video_tracker: HotVideoTrackerDependency,
+    redis_connection: RedisConnectionDependency,
+    count: Annotated[int, Query(ge=1)] = 10,
+    merged: bool = True,
+):
+    """
+    Самые популярные видео: по всем воркерам (`merged=true`) или только по воркеру, обработавшему запрос.
+    """
+
+    if not hot_video_tracker:
+        return {"enabled": False}
+
+    tracker = hot_video_tracker
+    if merged:
+        await hot_video_tracker.publish(redis_connection)
+        tracker = await hot_video_tracker.read_merged(redis_connection)
+
+    return {
+        "enabled": True,
+        "merged": merged,
+        "videos": [hot_video._asdict() for hot_video in tracker.get_top(count)],
+    }
@@ -0,0 +1,155 @@
+"""
+Привязка сессии просмотра к месту редиректа. HLS плеер запрашивает плейлист `.m3u8`, а затем много сегментов; чтобы
+зритель не переключался между CDN и origin сервером, первое решение для пары (клиент, видео) запоминается, и остальные
+запросы сессии перенаправляются туда же. Счетчик запросов учитывает только первые запросы сессий, поэтому заданное
+отношение редиректов соблюдается по сессиям.
+
+Решения хранятся в ограниченном кэше воркера с вытеснением по времени жизни и, если включено, в Redis - тогда сессия
+сохраняет привязку, даже если её запросы попадают в разные воркеры и узлы.
+"""
+
+import posixpath
+import time
+from collections import OrderedDict
+
+import redis.asyncio as redis
+from pydantic import BaseModel, HttpUrl, PositiveFloat, PositiveInt
+
+__all__ = (
+    "SessionAffinitySettings",
+    "SessionAffinityCache",
+)
+
+
+class SessionAffinitySettings(BaseModel):
+    """
+    Модель настроек привязки сессий просмотра.
+    """
+
+    ttl: PositiveFloat = 300.0
+    """
+    Время жизни привязки после последнего запроса сессии (в секундах).
+    """
+
+    max_entries: PositiveInt = 65536
+    """
+    Максимальное количество привязок в кэше воркера. При переполнении вытесняются давно не использовавшиеся.
+    """
+
+    shared: bool = False
+    """
+    Хранить привязки также в Redis, чтобы они действовали во всех воркерах и на всех узлах.
+    """
+
+
+class SessionAffinityCache:
+    """
+    Кэш решений о редиректе по сессиям. Сессия определяется адресом клиента и каталогом видео: плейлист и сегменты
+    одного видео лежат в одном каталоге.
+    """
+
+    redis_namespace = "session-affinity"
+
+    def __init__(self, settings: SessionAffinitySettings, redis_client: redis.Redis | None = None):
+        self.settings = settings
+        self.redis_client = redis_client if settings.shared else None
+        self._entries: OrderedDict[str, tuple[float, bool, float]] = OrderedDict()
+        """
+        Записи кэша: время истечения, решение и время последнего продления привязки в Redis.
+        """
+        self.hits_count = 0
+        self.shared_hits_count = 0
+        self.misses_count = 0
+        self.evictions_count = 0
+        self.shared_refreshes_count = 0
+
+    @property
+    def size(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def get_session_key(client_address: str, video: HttpUrl) -> str:
+        return f"{client_address}|{video.host}{posixpath.dirname(video.path or '/')}"
+
+    def _get_redis_key(self, session_key: str) -> str:
+        return self.redis_namespace + ":" + session_key
+
+    def _store(self, session_key: str, to_cdn: bool, now: float, refreshed_at: float):
+        entries = self._entries
+        entries[session_key] = (now + self.settings.ttl, to_cdn, refreshed_at)
+        entries.move_to_end(session_key)
+        while len(entries) > self.settings.max_entries:
+            entries.popitem(last=False)
+            self.evictions_count += 1
+
+    def _evict_expired(self, now: float):
+        # Записи упорядочены по времени последнего использования, поэтому истёкшие - в начале.
+        entries = self._entries
+        while entries:
+            session_key, (expires_at, _, _) = next(iter(entries.items()))
+            if expires_at > now:
+                break
+            del entries[session_key]
+            self.evictions_count += 1
+
+    async def get(self, client_address: str, video: HttpUrl, now: float | None = None) -> bool | None:
+        """
+        Возвращает запомненное решение для сессии (`True` - редирект на CDN) или `None`, если сессия новая.
+
+        При попадании в кэш воркера время жизни привязки в Redis продлевается не чаще раза в половину `ttl`, чтобы
+        привязка не истекла в Redis, пока сессия обслуживается одним воркером.
+        """
+
+        now = time.monotonic() if now is None else now
+        self._evict_expired(now)
+        session_key = self.get_session_key(client_address, video)
+
+        if (entry := self._entries.get(session_key)) is not None:
+            self.hits_count += 1
+            _, to_cdn, refreshed_at = entry
+            if self.redis_client and now - refreshed_at >= self.settings.ttl / 2:
+                await self._refresh_shared(session_key, to_cdn)
+                refreshed_at = now
+            self._store(session_key, to_cdn, now, refreshed_at)
+            return to_cdn
+
+        if self.redis_client:
+            redis_key = self._get_redis_key(session_key)
+            value = await self.redis_client.getex(redis_key, px=int(self.settings.ttl * 1000))
+            if value is not None:
+                self.shared_hits_count += 1
+                to_cdn = value in (b"1", "1")
+                self._store(session_key, to_cdn, now, now)
+                return to_cdn
+
+        self.misses_count += 1
+        return None
+
+    async def remember(self, client_address: str, video: HttpUrl, to_cdn: bool, now: float | None = None) -> bool:
+        """
+        Запоминает решение для новой сессии. Если другой воркер уже запомнил решение для неё в Redis, возвращается
+        его решение.
+        """
+
+        now = time.monotonic() if now is None else now
+        session_key = self.get_session_key(client_address, video)
+
+        if self.redis_client:
+            redis_key = self._get_redis_key(session_key)
+            ttl = int(self.settings.ttl * 1000)
+            if not await self.redis_client.set(redis_key, "1" if to_cdn else "0", px=ttl, nx=True):
+                value = await self.redis_client.get(redis_key)
+                if value is not None:
+                    to_cdn = value in (b"1", "1")
+
+        self._store(session_key, to_cdn, now, now)
+        return to_cdn
+
+    async def _refresh_shared(self, session_key: str, to_cdn: bool):
+        assert self.redis_client
+        self.shared_refreshes_count += 1
+        redis_key = self._get_redis_key(session_key)
+        ttl = int(self.settings.ttl * 1000)
+        # Если привязка уже истекла в Redis, она восстанавливается решением воркера.
+        if not await self.redis_client.pexpire(redis_key, ttl):
+            await self.redis_client.set(redis_key, "1" if to_cdn else "0", px=ttl, nx=True)
@@ -1,8 +1,17 @@
 from pydantic import BaseModel, RedisDsn
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
+from wink_test.admission import AdmissionSettings
 from wink_test.balancer import BalancerSettings, BalancerSettingsDbModel
+from wink_test.decision_log import DecisionLogSettings
+from wink_test.edge_routing import EdgeRoutingSettings
+from wink_test.hot_videos import HotVideosSettings
+from wink_test.manifest_proxy import ManifestProxySettings
 from wink_test.postgres import Postgres, PostgresSettings
+from wink_test.proxy_integration import ProxyIntegrationSettings
+from wink_test.session_affinity import SessionAffinitySettings
+from wink_test.shared_counter import SharedCounterSettings
+from wink_test.warmup import WarmupSettings
 
 __all__ = (
     "DatabaseOnlySettings",
@@ -39,6 +48,51 @@ class Settings(BalancerSettings, DatabaseOnlySettings):
     URL хранилища Redis. В Redis хранится счетчик обработанных запросов.
     """
 
+    counter: SharedCounterSettings = SharedCounterSettings()
+    """
+    Настройки разделения счетчика обработанных запросов на полосы.
+    """
+
+    decision_log: DecisionLogSettings | None = None
+    """
+    Настройки журнала решений балансировщика. Если не заданы, журнал не ведётся.
+    """
+
+    admission: AdmissionSettings | None = None
+    """
+    Настройки контроля допуска запросов. Если не заданы, количество одновременных запросов не ограничивается.
+    """
+
+    edge_routing: EdgeRoutingSettings | None = None
+    """
+    Настройки выбора узла CDN по адресу клиента. Если не заданы, все редиректы на CDN идут на `cdn_host`.
+    """
+
+    hot_videos: HotVideosSettings | None = None
+    """
+    Настройки отслеживания популярных видео. Если не заданы, популярные видео не отслеживаются.
+    """
+
+    session_affinity: SessionAffinitySettings | None = None
+    """
+    Настройки привязки сессий просмотра к месту редиректа. Если не заданы, каждый запрос распределяется отдельно.
+    """
+
+    manifest_proxy: ManifestProxySettings | None = None
+    """
+    Настройки проксирования плейлистов HLS. Если не заданы, на плейлисты, как и на остальные файлы, делается редирект.
+    """
+
+    proxy_integration: ProxyIntegrationSettings | None = None
+    """
+    Настройки работы за обратным прокси. Если не заданы, `GET /decide` недоступен.
+    """
+
+    warmup: WarmupSettings = WarmupSettings()
+    """
+    Настройки прогрева воркера перед приёмом запросов.
+    """
+
 
 def construct_settings_from_env():
     """
@@ -61,5 +115,6 @@ async def construct_settings_from_env_and_db(db_settings: PostgresSettings):
             return Settings(
                 cdn_host=balancer_settings.cdn_host,
                 redirect_ratio=balancer_settings.redirect_ratio,
+                url_signing=balancer_settings.url_signing,
                 database=db_settings,  # type: ignore
             )
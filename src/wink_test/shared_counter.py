@@ -1,6 +1,62 @@
+import threading
+
 import redis.asyncio as redis
+from pydantic import BaseModel, NonNegativeInt, PositiveInt, model_validator
+
+__all__ = (
+    "SharedCounterSettings",
+    "SharedCounter",
+    "LocalCounter",
+)
+
+
+class SharedCounterSettings(BaseModel):
+    """
+    Модель настроек разделения счетчика запросов на полосы (stripes).
+
+    Каждый воркер увеличивает только свою полосу и применяет отношение редиректов к её значению, поэтому нагрузка на
+    Redis распределяется между `stripes` ключами, а общее распределение запросов отличается от заданного не более чем
+    на `stripes` запросов. Воркер с индексом `i` работает с полосой `(stripe + i) % stripes`, поэтому полосы
+    распределяются между воркерами равномерно и не меняются при их перезапуске.
+    """
+
+    stripes: PositiveInt = 1
+    """
+    Количество полос счетчика.
+    """
+
+    stripe: NonNegativeInt = 0
+    """
+    Номер полосы первого воркера узла. Чтобы воркеры разных узлов работали с разными полосами, на каждом узле задаётся
+    своё смещение (например, номер узла, умноженный на количество воркеров).
+    """
+
+    local: bool = False
+    """
+    Считать запросы в памяти процесса, без Redis. Подходит, если сервис работает одним процессом
+    (`wink_test.threaded_server`) на одном узле.
+    """
+
+    hash_tag: bool = False
+    """
+    Заключать имя полосы в hash tag (`{...}`), чтобы размещение полос по слотам Redis Cluster определялось только
+    именем полосы.
+    """
+
+    @model_validator(mode="after")
+    def check_stripe(self):
+        if self.stripe >= self.stripes:
+            raise ValueError("Номер полосы счетчика должен быть меньше количества полос.")
+        return self
+
+    def get_stripe(self, worker_index: int = 0) -> int:
+        """
+        Возвращает номер полосы воркера.
 
-__all__ = ("SharedCounter",)
+        :param worker_index: индекс воркера на узле (см. `wink_test.gunicorn_conf`).
+        """
+
+        return (self.stripe + worker_index) % self.stripes
 
 
 class SharedCounter:
@@ -8,17 +64,35 @@ class SharedCounter:
 
     @property
     def redis_counter_key(self):
-        return self.redis_namespace + ":" + self.name
+        return self.redis_counter_keys[self.stripe]
+
+    def __init__(
+        self, redis_client: redis.Redis, name: str, stripes: int = 1, stripe: int = 0, hash_tag: bool = False
+    ) -> None:
+        """
+        :param redis_client: клиент Redis.
+        :param name: имя счетчика.
+        :param stripes: количество полос счетчика.
+        :param stripe: номер полосы, которую увеличивает этот экземпляр.
+        :param hash_tag: заключать имя полосы в hash tag для Redis Cluster.
+        """
 
-    def __init__(self, redis_client: redis.Redis, name: str) -> None:
         self.redis_client = redis_client
         self.name = name
+        self.stripes = stripes
+        self.stripe = stripe
 
-    async def reset(self):
-        await self.redis_client.delete(self.redis_counter_key)
+        # С одной полосой ключ совпадает с ключом счетчика без полос.
+        if stripes == 1:
+            stripe_names = [name]
+        else:
+            stripe_names = [f"{name}:{i}" for i in range(stripes)]
+        if hash_tag:
+            stripe_names = [f"{{{stripe_name}}}" for stripe_name in stripe_names]
+        self.redis_counter_keys = [self.redis_namespace + ":" + stripe_name for stripe_name in stripe_names]
 
-    async def get(self) -> int:
-        raw_value = await self.redis_client.get(self.redis_counter_key)
+    @staticmethod
+    def parse_value(raw_value: bytes | str | None) -> int:
         match raw_value:
             case None:
                 return 0
@@ -29,5 +103,95 @@ class SharedCounter:
             case _:
                 raise TypeError
 
-    async def increment(self):
-        await self.redis_client.incr(self.redis_counter_key)
+    async def reset(self):
+        """
+        Сбрасывает все полосы счетчика.
+        """
+
+        await self.redis_client.delete(*self.redis_counter_keys)
+
+    async def get(self) -> int:
+        """
+        Возвращает точное значение счетчика - сумму всех полос.
+        """
+
+        if self.stripes == 1:
+            return await self.get_stripe()
+        return sum(await self.get_stripes())
+
+    async def get_stripe(self) -> int:
+        """
+        Возвращает значение полосы этого экземпляра.
+        """
+
+        return self.parse_value(await self.redis_client.get(self.redis_counter_key))
+
+    async def get_stripes(self) -> list[int]:
+        """
+        Возвращает значения всех полос.
+        """
+
+        # В Redis Cluster ключи полос лежат в разных слотах, поэтому вместо MGET - отдельные команды в одном конвейере.
+        async with self.redis_client.pipeline(transaction=False) as pipeline:
+            for key in self.redis_counter_keys:
+                pipeline.get(key)
+            raw_values = await pipeline.execute()
+        return [self.parse_value(raw_value) for raw_value in raw_values]
+
+    async def increment(self) -> int:
+        """
+        Увеличивает полосу этого экземпляра и возвращает её новое значение. Полосу могут увеличивать несколько
+        экземпляров, поэтому порядковый номер запроса берётся из ответа `INCR`, а не отдельным чтением.
+        """
+
+        return await self.redis_client.incr(self.redis_counter_key)
+
+
+class LocalCounter:
+    """
+    Счетчик в памяти процесса с тем же интерфейсом, что и `SharedCounter`. Каждый поток увеличивает свою полосу, поэтому
+    счетчик работает без блокировок: блокировка берётся только при первом обращении потока. Общее распределение
+    запросов отличается от заданного не более чем на количество потоков.
+    """
+
+    def __init__(self) -> None:
+        self._stripes: list[list[int]] = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _get_stripe_cell(self) -> list[int]:
+        try:
+            return self._local.cell
+        except AttributeError:
+            cell = self._local.cell = [0]
+            with self._lock:
+                self._stripes.append(cell)
+            return cell
+
+    @property
+    def stripes(self) -> int:
+        return len(self._stripes)
+
+    @property
+    def stripe(self) -> int:
+        cell = self._get_stripe_cell()
+        return next(i for i, stripe_cell in enumerate(self._stripes) if stripe_cell is cell)
+
+    async def reset(self):
+        for cell in self._stripes:
+            cell[0] = 0
+
+    async def get(self) -> int:
+        return sum(cell[0] for cell in self._stripes)
+
+    async def get_stripe(self) -> int:
+        return self._get_stripe_cell()[0]
+
+    async def get_stripes(self) -> list[int]:
+        return [cell[0] for cell in self._stripes]
+
+    async def increment(self) -> int:
+        # Полосу изменяет только её поток, поэтому чтение и запись не пересекаются с другими потоками.
+        cell = self._get_stripe_cell()
+        cell[0] += 1
+        return cell[0]
@@ -0,0 +1,466 @@
+"""
+Симулятор нагрузки для планирования мощностей. Прогоняет журнал запросов через ту же логику выбора CDN/origin сервера,
+что и `balancer_root`, для нескольких вариантов отношения редиректов и строит посекундные кривые нагрузки
+на CDN и каждый origin сервер.
+
+Решения вычисляются векторно с помощью NumPy блоками записей, поэтому объём памяти не зависит от размера журнала.
+Запросы нумеруются в порядке следования в журнале, как если бы общий счетчик запросов в Redis увеличивался строго
+последовательно.
+
+Источники запросов:
+
+* файлы журнала решений балансировщика (`*.bin`, см. `wink_test.decision_log`) - самый быстрый вариант;
+* CSV файлы с колонками `timestamp` (Unix время в секундах) и `video` (URL видео);
+* синтетический поток запросов с распределением Ципфа по видео.
+
+Пример:
+
+    python -m wink_test.simulator --ratio 3:1 --ratio 9:1 --output-dir simulation decisions/*.bin
+    python -m wink_test.simulator --ratio 3:1 --synthetic 100000000 --rate 1200 --hosts 8
+"""
+
+import argparse
+import csv
+import json
+import sys
+from dataclasses import dataclass, field
+from fractions import Fraction
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterable, Iterator, Sequence
+from urllib.parse import urlsplit
+
+import numpy as np
+import numpy.typing as npt
+
+from wink_test.balancer import file_server_subdomain_pattern, parse_redirect_ratio, should_redirect_to_cdn
+from wink_test.decision_log import file_header_struct, file_magic, record_struct, supported_file_format_versions
+
+__all__ = (
+    "calculate_should_redirect_to_cdn_vectorized",
+    "HostTable",
+    "RequestsChunk",
+    "ReplayResult",
+    "replay",
+    "read_decision_log_chunks",
+    "read_csv_chunks",
+    "generate_synthetic_chunks",
+)
+
+chunk_size = 1 << 20
+"""
+Количество запросов в одном блоке.
+"""
+
+decision_log_dtype = np.dtype(
+    [
+        ("timestamp_ns", "<i8"),
+        ("settings_version", "<u4"),
+        ("flags", "u1"),
+        ("video_host", "S64"),
+        ("video_path", "S179"),
+    ]
+)
+"""
+Запись журнала решений в виде структурного типа NumPy. Соответствует `wink_test.decision_log.record_struct`.
+"""
+
+assert decision_log_dtype.itemsize == record_struct.size
+
+
+@lru_cache(maxsize=64)
+def get_redirect_pattern(redirect_ratio: Fraction) -> npt.NDArray[np.bool_]:
+    """
+    Решения `wink_test.balancer.should_redirect_to_cdn` для одного блока запросов (числитель + знаменатель отношения).
+    """
+
+    requests_count_per_block = redirect_ratio.numerator + redirect_ratio.denominator
+    return np.array(
+        [should_redirect_to_cdn(i, redirect_ratio) for i in range(requests_count_per_block)], dtype=np.bool_
+    )
+
+
+def calculate_should_redirect_to_cdn_vectorized(
+    request_indices: npt.NDArray[np.int64], redirect_ratio: Fraction
+) -> npt.NDArray[np.bool_]:
+    """
+    Векторный вариант `wink_test.balancer.calculate_should_redirect_to_cdn`: для каждого порядкового номера запроса
+    определяет, делать ли редирект на CDN. Решение зависит только от номера запроса внутри блока, поэтому берётся из
+    таблицы решений балансировщика для одного блока.
+
+    :param request_indices: порядковые номера запросов (начиная с 0).
+    :param redirect_ratio: отношение количества редиректов на CDN и на origin сервера.
+    """
+
+    pattern = get_redirect_pattern(redirect_ratio)
+    return pattern[request_indices % len(pattern)]
+
+
+class HostTable:
+    """
+    Таблица хостов origin серверов. Сопоставляет каждому хосту целочисленный код.
+    """
+
+    def __init__(self):
+        self.hosts: list[str] = []
+        self.codes: dict[str, int] = {}
+        self.rewritable: list[bool] = []
+        """
+        Для каждого хоста - будет ли URL переписан на CDN (есть ли поддомен файлового сервера sN).
+        """
+
+    def get_code(self, host: str) -> int:
+        code = self.codes.get(host)
+        if code is None:
+            code = self.codes[host] = len(self.hosts)
+            self.hosts.append(host)
+            self.rewritable.append(bool(file_server_subdomain_pattern.search(host)))
+        return code
+
+    def get_rewritable_mask(self) -> npt.NDArray[np.bool_]:
+        return np.array(self.rewritable, dtype=np.bool_)
+
+
+@dataclass
+class RequestsChunk:
+    """
+    Блок запросов: время запроса в наносекундах и код хоста видео из `HostTable`.
+    """
+
+    timestamps_ns: npt.NDArray[np.int64]
+    host_codes: npt.NDArray[np.int64]
+
+
+@dataclass
+class ReplayResult:
+    """
+    Результат симуляции для одного отношения редиректов.
+    """
+
+    redirect_ratio: Fraction
+    cdn_per_second: npt.NDArray[np.int64] = field(default_factory=lambda: np.zeros(0, dtype=np.int64))
+    """
+    Количество редиректов на CDN в каждую секунду.
+    """
+    origin_per_second: npt.NDArray[np.int64] = field(default_factory=lambda: np.zeros((0, 0), dtype=np.int64))
+    """
+    Количество редиректов на каждый origin сервер (строки - коды хостов) в каждую секунду (столбцы).
+    """
+    max_origin_burst: int = 0
+    """
+    Максимальное количество запросов подряд, отправленных на origin сервера.
+    """
+    current_origin_burst: int = 0
+
+    def ensure_shape(self, hosts_count: int, seconds_count: int):
+        if seconds_count > self.cdn_per_second.shape[0]:
+            self.cdn_per_second = np.pad(self.cdn_per_second, (0, seconds_count - self.cdn_per_second.shape[0]))
+
+        rows, columns = self.origin_per_second.shape
+        if hosts_count > rows or seconds_count > columns:
+            self.origin_per_second = np.pad(
+                self.origin_per_second, ((0, max(hosts_count - rows, 0)), (0, max(seconds_count - columns, 0)))
+            )
+
+    def add_chunk(
+        self,
+        seconds: npt.NDArray[np.int64],
+        host_codes: npt.NDArray[np.int64],
+        served_by_cdn: npt.NDArray[np.bool_],
+        hosts_count: int,
+    ):
+        first_second = int(seconds.min())
+        seconds_span = int(seconds.max()) - first_second + 1
+        self.ensure_shape(hosts_count, first_second + seconds_span)
+
+        relative_seconds = seconds - first_second
+        self.cdn_per_second[first_second : first_second + seconds_span] += np.bincount(
+            relative_seconds[served_by_cdn], minlength=seconds_span
+        )
+
+        served_by_origin = ~served_by_cdn
+        origin_counts = np.bincount(
+            host_codes[served_by_origin] * seconds_span + relative_seconds[served_by_origin],
+            minlength=hosts_count * seconds_span,
+        )
+        self.origin_per_second[:hosts_count, first_second : first_second + seconds_span] += origin_counts.reshape(
+            hosts_count, seconds_span
+        )
+
+        self.update_origin_burst(served_by_origin)
+
+    def update_origin_burst(self, served_by_origin: npt.NDArray[np.bool_]):
+        """
+        Обновляет максимальную серию запросов подряд на origin сервера с учётом серии, начатой в предыдущем блоке.
+        """
+
+        breaks = np.flatnonzero(~served_by_origin)
+        if not breaks.size:
+            self.current_origin_burst += served_by_origin.size
+            self.max_origin_burst = max(self.max_origin_burst, self.current_origin_burst)
+            return
+
+        runs = [self.current_origin_burst + int(breaks[0]), served_by_origin.size - int(breaks[-1]) - 1]
+        if breaks.size > 1:
+            runs.append(int((np.diff(breaks) - 1).max()))
+        self.max_origin_burst = max(self.max_origin_burst, *runs)
+        self.current_origin_burst = runs[1]
+
+    def summarize(self, hosts: Sequence[str]) -> dict[str, object]:
+        origin_total_per_second = self.origin_per_second.sum(axis=0)
+        cdn_requests = int(self.cdn_per_second.sum())
+        origin_requests = int(origin_total_per_second.sum())
+        requests = cdn_requests + origin_requests
+
+        return {
+            "redirect_ratio": f"{self.redirect_ratio.numerator}:{self.redirect_ratio.denominator}",
+            "requests": requests,
+            "cdn_requests": cdn_requests,
+            "origin_requests": origin_requests,
+            "cdn_share": cdn_requests / requests if requests else 0.0,
+            "seconds": int(self.cdn_per_second.shape[0]),
+            "peak_cdn_rps": int(self.cdn_per_second.max(initial=0)),
+            "peak_origin_rps": int(origin_total_per_second.max(initial=0)),
+            "p99_origin_rps": float(np.percentile(origin_total_per_second, 99)) if requests else 0.0,
+            "max_origin_burst": self.max_origin_burst,
+            "origins": {
+                host: {
+                    "requests": int(self.origin_per_second[code].sum()),
+                    "peak_rps": int(self.origin_per_second[code].max(initial=0)),
+                }
+                for code, host in enumerate(hosts)
+                if code < self.origin_per_second.shape[0]
+            },
+        }
+
+    def write_load_curves(self, path: Path, hosts: Sequence[str]):
+        """
+        Записывает посекундные кривые нагрузки в CSV: CDN, все origin сервера вместе и каждый origin сервер.
+        """
+
+        hosts_count = self.origin_per_second.shape[0]
+        with path.open("w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(["second", "cdn", "origin", *hosts[:hosts_count]])
+            curves = np.column_stack(
+                [
+                    np.arange(self.cdn_per_second.shape[0]),
+                    self.cdn_per_second,
+                    self.origin_per_second.sum(axis=0),
+                    self.origin_per_second.T,
+                ]
+            )
+            writer.writerows(curves.tolist())
+
+
+def replay(
+    chunks: Iterable[RequestsChunk], host_table: HostTable, redirect_ratios: Sequence[Fraction]
+) -> list[ReplayResult]:
+    """
+    Прогоняет блоки запросов через логику балансировщика для каждого из отношений редиректов.
+
+    :param chunks: блоки запросов в порядке поступления.
+    :param host_table: таблица хостов, по которой закодированы запросы.
+    :param redirect_ratios: сравниваемые отношения редиректов.
+    """
+
+    results = [ReplayResult(redirect_ratio) for redirect_ratio in redirect_ratios]
+    first_timestamp_ns: int | None = None
+    requests_count = 0
+
+    for chunk in chunks:
+        if not chunk.timestamps_ns.size:
+            continue
+        if first_timestamp_ns is None:
+            first_timestamp_ns = int(chunk.timestamps_ns[0])
+
+        seconds = np.maximum((chunk.timestamps_ns - first_timestamp_ns) // 1_000_000_000, 0)
+        request_indices = np.arange(requests_count, requests_count + chunk.timestamps_ns.size, dtype=np.int64)
+        rewritable = host_table.get_rewritable_mask()[chunk.host_codes]
+        requests_count += chunk.timestamps_ns.size
+
+        for result in results:
+            served_by_cdn = rewritable & calculate_should_redirect_to_cdn_vectorized(
+                request_indices, result.redirect_ratio
+            )
+            result.add_chunk(seconds, chunk.host_codes, served_by_cdn, len(host_table.hosts))
+
+    return results
+
+
+def get_fixed_string_words(values: npt.NDArray[np.bytes_]) -> npt.NDArray[np.uint64]:
+    """
+    Представляет строки фиксированной длины (длина должна быть кратна 8 байтам) как строки матрицы 64-битных слов.
+    """
+
+    return np.ascontiguousarray(values).view("<u8").reshape(values.shape[0], -1)
+
+
+def hash_fixed_strings(values: npt.NDArray[np.bytes_]) -> npt.NDArray[np.uint64]:
+    """
+    Вычисляет 64-битный хэш строк фиксированной длины (длина должна быть кратна 8 байтам).
+    """
+
+    words = get_fixed_string_words(values)
+    multipliers = np.array(
+        [(0x9E3779B97F4A7C15 * (i * 2 + 1)) & 0xFFFFFFFFFFFFFFFF for i in range(words.shape[1])], dtype=np.uint64
+    )
+    with np.errstate(over="ignore"):
+        return (words * multipliers).sum(axis=1, dtype=np.uint64)
+
+
+def unique_fixed_strings(values: npt.NDArray[np.bytes_]) -> tuple[npt.NDArray[np.intp], npt.NDArray[np.intp]]:
+    """
+    Находит различные строки фиксированной длины. Возвращает индексы первых вхождений различных строк и для каждой
+    строки - номер различной строки.
+
+    Строки группируются по хэшу (это в несколько раз быстрее сортировки строк), а затем группировка проверяется
+    сравнением строк: при коллизии хэшей строки группируются сортировкой.
+    """
+
+    _, first_indices, inverse = np.unique(hash_fixed_strings(values), return_index=True, return_inverse=True)
+    inverse = inverse.ravel()
+    words = get_fixed_string_words(values)
+    if not np.array_equal(words[first_indices][inverse], words):
+        _, first_indices, inverse = np.unique(values, return_index=True, return_inverse=True)
+        inverse = inverse.ravel()
+    return first_indices, inverse
+
+
+def read_decision_log_chunks(paths: Iterable[Path], host_table: HostTable) -> Iterator[RequestsChunk]:
+    """
+    Читает файлы журнала решений балансировщика блоками через отображение файлов в память.
+    """
+
+    for path in paths:
+        with path.open("rb") as file:
+            magic, version, record_size = file_header_struct.unpack(file.read(file_header_struct.size))
+        if magic != file_magic or version not in supported_file_format_versions or record_size != record_struct.size:
+            raise ValueError(f"Файл {path} не является журналом решений поддерживаемой версии.")
+
+        records_count = (path.stat().st_size - file_header_struct.size) // record_struct.size
+        if not records_count:
+            continue
+
+        records = np.memmap(
+            path, dtype=decision_log_dtype, mode="r", offset=file_header_struct.size, shape=(records_count,)
+        )
+        for start in range(0, records_count, chunk_size):
+            chunk = records[start : start + chunk_size]
+            hosts = chunk["video_host"]
+            first_indices, inverse = unique_fixed_strings(hosts)
+            codes = np.array(
+                [host_table.get_code(hosts[i].rstrip(b"\0").decode(errors="replace")) for i in first_indices],
+                dtype=np.int64,
+            )
+            yield RequestsChunk(
+                timestamps_ns=np.array(chunk["timestamp_ns"], dtype=np.int64), host_codes=codes[inverse]
+            )
+
+
+def read_csv_chunks(paths: Iterable[Path], host_table: HostTable) -> Iterator[RequestsChunk]:
+    """
+    Читает CSV файлы с колонками `timestamp` (Unix время в секундах) и `video` (URL видео).
+    """
+
+    for path in paths:
+        with path.open(newline="") as file:
+            timestamps: list[float] = []
+            host_codes: list[int] = []
+            for row in csv.DictReader(file):
+                timestamps.append(float(row["timestamp"]))
+                host_codes.append(host_table.get_code(urlsplit(row["video"]).hostname or ""))
+                if len(timestamps) == chunk_size:
+                    yield RequestsChunk(
+                        (np.array(timestamps) * 1e9).astype(np.int64), np.array(host_codes, dtype=np.int64)
+                    )
+                    timestamps, host_codes = [], []
+            if timestamps:
+                yield RequestsChunk((np.array(timestamps) * 1e9).astype(np.int64), np.array(host_codes, dtype=np.int64))
+
+
+def generate_synthetic_chunks(
+    requests_count: int,
+    rate: float,
+    hosts_count: int,
+    host_table: HostTable,
+    zipf_exponent: float = 1.2,
+    seed: int = 0,
+) -> Iterator[RequestsChunk]:
+    """
+    Генерирует синтетический поток запросов: пуассоновский поток с заданной интенсивностью, популярность видео
+    распределена по закону Ципфа, видео равномерно распределены по origin серверам `s1.origin-cluster`, ...
+
+    :param requests_count: количество запросов.
+    :param rate: средняя интенсивность потока (запросов в секунду).
+    :param hosts_count: количество origin серверов.
+    """
+
+    rng = np.random.default_rng(seed)
+    codes = np.array([host_table.get_code(f"s{i + 1}.origin-cluster") for i in range(hosts_count)], dtype=np.int64)
+    last_timestamp_ns = 0
+
+    for start in range(0, requests_count, chunk_size):
+        size = min(chunk_size, requests_count - start)
+        timestamps_ns = last_timestamp_ns + np.cumsum(rng.exponential(1e9 / rate, size)).astype(np.int64)
+        last_timestamp_ns = int(timestamps_ns[-1])
+        video_ids = rng.zipf(zipf_exponent, size)
+        yield RequestsChunk(timestamps_ns=timestamps_ns, host_codes=codes[video_ids % hosts_count])
+
+
+def main(argv: Sequence[str] | None = None):
+    parser = argparse.ArgumentParser(description="Симуляция распределения нагрузки балансировщика.")
+    parser.add_argument(
+        "--ratio", action="append", required=True, help="отношение редиректов на CDN и origin сервера, например 3:1"
+    )
+    parser.add_argument("--output-dir", type=Path, help="директория для кривых нагрузки и итогов в JSON")
+    parser.add_argument("--synthetic", type=int, help="количество синтетических запросов вместо файлов")
+    parser.add_argument("--rate", type=float, default=1000.0, help="интенсивность синтетического потока (RPS)")
+    parser.add_argument("--hosts", type=int, default=4, help="количество origin серверов в синтетическом потоке")
+    parser.add_argument("--zipf", type=float, default=1.2, help="параметр распределения Ципфа популярности видео")
+    parser.add_argument("--seed", type=int, default=0, help="seed генератора синтетического потока")
+    parser.add_argument("paths", nargs="*", type=Path, help="файлы журнала решений (*.bin) или CSV файлы")
+    args = parser.parse_args(argv)
+
+    redirect_ratios = [parse_redirect_ratio(ratio) for ratio in args.ratio]
+    host_table = HostTable()
+
+    if args.synthetic:
+        chunks = generate_synthetic_chunks(args.synthetic, args.rate, args.hosts, host_table, args.zipf, args.seed)
+    elif args.paths and all(path.suffix == ".bin" for path in args.paths):
+        chunks = read_decision_log_chunks(args.paths, host_table)
+    elif args.paths:
+        chunks = read_csv_chunks(args.paths, host_table)
+    else:
+        parser.error("Нужно указать файлы с запросами или --synthetic.")
+
+    results = replay(chunks, host_table, redirect_ratios)
+    summaries = [result.summarize(host_table.hosts) for result in results]
+
+    if args.output_dir:
+        args.output_dir.mkdir(parents=True, exist_ok=True)
+        for result in results:
+            ratio_name = f"{result.redirect_ratio.numerator}-{result.redirect_ratio.denominator}"
+            result.write_load_curves(args.output_dir / f"load-{ratio_name}.csv", host_table.hosts)
+        (args.output_dir / "summary.json").write_text(json.dumps(summaries, indent=2))
+
+    writer = csv.writer(sys.stdout)
+    writer.writerow(
+        ["ratio", "requests", "cdn_share", "peak_cdn_rps", "peak_origin_rps", "p99_origin_rps", "max_origin_burst"]
+    )
+    for summary in summaries:
+        writer.writerow(
+            [
+                summary["redirect_ratio"],
+                summary["requests"],
+                f"{summary['cdn_share']:.4f}",
+                summary["peak_cdn_rps"],
+                summary["peak_origin_rps"],
+                summary["p99_origin_rps"],
+                summary["max_origin_burst"],
+            ]
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Запуск сервиса одним процессом с несколькими потоками, в каждом из которых работает свой цикл событий Uvicorn на общем
+слушающем сокете. Режим рассчитан на интерпретатор без GIL (free-threaded сборка Python 3.13, `python3.13t`): потоки
+используют общие настройки, кэш подписей URL и счетчик запросов в памяти процесса, а соединения с Redis и БД у каждого
+цикла событий свои.
+
+    python3.13t -m wink_test.threaded_server --bind 0.0.0.0:80 --threads 8
+    python3.13t -m wink_test.threaded_server --bind unix:/run/balancer/balancer.sock --threads 8
+
+Настройки загружаются один раз до запуска потоков. Счетчик запросов по умолчанию хранится в памяти процесса
+(`BALANCER_COUNTER_LOCAL=true`); Redis для счетчика нужен, только если сервис работает на нескольких узлах.
+"""
+
+import argparse
+import logging
+import os
+import signal
+import socket
+import sys
+import threading
+from contextlib import suppress
+from typing import Any
+
+import uvicorn
+
+__all__ = ("serve",)
+
+logger = logging.getLogger(__name__)
+
+
+def is_gil_enabled() -> bool:
+    is_gil_enabled = getattr(sys, "_is_gil_enabled", None)
+    return is_gil_enabled() if is_gil_enabled else True
+
+
+def create_socket(bind: str, backlog: int) -> socket.socket:
+    if bind.startswith("unix:"):
+        path = bind.removeprefix("unix:")
+        with suppress(FileNotFoundError):
+            os.unlink(path)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(path)
+        sock.listen(backlog)
+    else:
+        host, _, port = bind.rpartition(":")
+        host = host.strip("[]")
+        family = socket.AF_INET6 if ":" in host else socket.AF_INET
+        sock = socket.create_server((host, int(port)), family=family, backlog=backlog)
+    sock.setblocking(False)
+    return sock
+
+
+def serve(app: Any, bind: str, threads_count: int, backlog: int = 2048, keep_alive: int = 5):
+    """
+    Запускает `threads_count` серверов Uvicorn в отдельных потоках на одном сокете и ждёт сигнала завершения.
+
+    :param bind: адрес и порт (`host:port`) или путь к unix сокету (`unix:path`).
+    :param keep_alive: время ожидания следующего запроса в соединении (в секундах).
+    """
+
+    from wink_test.dependencies import get_app_state
+
+    app_state = get_app_state()
+    sock = create_socket(bind, backlog)
+    servers: list[uvicorn.Server] = []
+    server_threads: list[threading.Thread] = []
+
+    def run_server(server: uvicorn.Server):
+        # Состояние цикла событий создаётся до его запуска, чтобы его унаследовали все задачи цикла.
+        app_state.enter_loop()
+        # У каждого потока своя копия дескриптора сокета: сервер закрывает свои сокеты при завершении.
+        server.run(sockets=[sock.dup()])
+
+    for thread_index in range(threads_count):
+        config = uvicorn.Config(app, lifespan="on", backlog=backlog, timeout_keep_alive=keep_alive, log_config=None)
+        server = uvicorn.Server(config)
+        servers.append(server)
+        server_threads.append(threading.Thread(target=run_server, args=(server,), name=f"server-{thread_index}"))
+
+    stop_event = threading.Event()
+
+    def handle_exit(signum: int, frame: Any):
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, handle_exit)
+    signal.signal(signal.SIGTERM, handle_exit)
+
+    for server_thread in server_threads:
+        server_thread.start()
+    logger.info("Сервис запущен на %s, потоков: %s", bind, threads_count)
+
+    while not stop_event.wait(0.5):
+        if not any(server_thread.is_alive() for server_thread in server_threads):
+            break
+
+    for server in servers:
+        server.should_exit = True
+    for server_thread in server_threads:
+        server_thread.join()
+    sock.close()
+    if bind.startswith("unix:"):
+        with suppress(FileNotFoundError):
+            os.unlink(bind.removeprefix("unix:"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Запуск сервиса одним процессом с несколькими потоками.")
+    parser.add_argument("--bind", default="127.0.0.1:8000", help="адрес и порт или unix:путь к сокету")
+    parser.add_argument("--threads", type=int, default=os.cpu_count() or 1, help="количество потоков")
+    parser.add_argument("--backlog", type=int, default=2048, help="размер очереди соединений")
+    parser.add_argument("--keep-alive", type=int, default=5, help="время ожидания запроса в соединении (в секундах)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if is_gil_enabled():
+        logger.warning("Интерпретатор работает с GIL: потоки не будут обрабатывать запросы параллельно.")
+
+    os.environ.setdefault("BALANCER_COUNTER_LOCAL", "true")
+
+    from wink_test.main import app, preload
+
+    preload()
+
+    serve(app, args.bind, args.threads, args.backlog, args.keep_alive)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Подпись URL на CDN токеном с ограниченным временем жизни. Время истечения токена округляется до интервала, поэтому
+для популярного видео подпись вычисляется один раз за интервал и дальше берётся из кэша.
+
+Формат подписанного URL: `<URL на CDN>?expires=<Unix время>&kid=<ID ключа>&token=<HMAC-SHA256>`, где токен -
+HMAC-SHA256 от строки `<путь>:<expires>` в кодировке base64url без выравнивания.
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import time
+from functools import lru_cache
+from urllib.parse import quote
+
+from pydantic import BaseModel, HttpUrl, PositiveInt, SecretStr, model_validator
+
+__all__ = (
+    "UrlSigningSettings",
+    "UrlSigner",
+)
+
+
+masked_secret = str(SecretStr("secret"))
+"""
+Скрытое значение ключа в ответах API.
+"""
+
+
+class UrlSigningSettings(BaseModel):
+    """
+    Модель настроек подписи URL на CDN.
+    """
+
+    keys: dict[str, SecretStr]
+    """
+    Ключи подписи по их ID. Для ротации новый ключ добавляется, становится активным, а старый удаляется после того,
+    как истекут выданные им токены.
+    """
+
+    active_key_id: str
+    """
+    ID ключа, которым подписываются новые URL.
+    """
+
+    ttl: PositiveInt = 3600
+    """
+    Минимальное время жизни токена (в секундах).
+    """
+
+    time_bucket: PositiveInt = 300
+    """
+    Интервал (в секундах), до которого округляется время истечения токена. Фактическое время жизни токена -
+    от `ttl` до `ttl + time_bucket`.
+    """
+
+    cache_size: PositiveInt = 65536
+    """
+    Максимальное количество подписей в кэше воркера.
+    """
+
+    @model_validator(mode="after")
+    def check_active_key_id(self):
+        if self.active_key_id not in self.keys:
+            raise ValueError("Активный ключ подписи отсутствует в списке ключей.")
+        return self
+
+    def restore_masked_keys(self, stored_settings: "UrlSigningSettings | None") -> "UrlSigningSettings":
+        """
+        Возвращает настройки, в которых скрытые значения ключей (`**********`, как их отдаёт `GET /settings`) заменены
+        значениями сохранённых ключей с теми же ID.
+
+        :raises ValueError: скрытое значение у ключа, которого нет среди сохранённых.
+        """
+
+        keys: dict[str, SecretStr] = {}
+        for key_id, key in self.keys.items():
+            if key.get_secret_value() == masked_secret:
+                if not stored_settings or key_id not in stored_settings.keys:
+                    raise ValueError(f"Значение ключа подписи {key_id} не задано.")
+                key = stored_settings.keys[key_id]
+            keys[key_id] = key
+        return self.model_copy(update={"keys": keys})
+
+    def dump_json_with_secrets(self) -> str:
+        """
+        Сериализует настройки в JSON вместе со значениями ключей (для хранения в БД).
+        """
+
+        dumped_settings = self.model_dump(mode="json")
+        dumped_settings["keys"] = {key_id: key.get_secret_value() for key_id, key in self.keys.items()}
+        return json.dumps(dumped_settings)
+
+
+class UrlSigner:
+    """
+    Подписывает URL на CDN с кэшированием подписей по (путь, интервал времени, ID ключа).
+    """
+
+    def __init__(self):
+        self.signed_count = 0
+        self.signing_seconds = 0.0
+        """
+        Суммарное время вычисления подписей (промахи кэша).
+        """
+        self._settings: UrlSigningSettings | None = None
+        self._get_token = lru_cache(maxsize=1)(self._compute_token)
+
+    def _compute_token(self, path: str, expires: int, key: str) -> str:
+        # Ключ передаётся аргументом, а не берётся из `self._settings`: в режиме с несколькими потоками настройки могут
+        # смениться во время подписи.
+        start_time = time.perf_counter()
+        digest = hmac.digest(key.encode(), f"{path}:{expires}".encode(), hashlib.sha256)
+        token = base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
+        self.signing_seconds += time.perf_counter() - start_time
+        return token
+
+    def _use_settings(self, settings: UrlSigningSettings):
+        # Новые настройки (в том числе ротация ключей) - новый кэш.
+        if settings is not self._settings:
+            self._settings = settings
+            self._get_token = lru_cache(maxsize=settings.cache_size)(self._compute_token)
+
+    def get_cache_info(self):
+        return self._get_token.cache_info()
+
+    def sign(self, url: HttpUrl, settings: UrlSigningSettings, now: float | None = None) -> str:
+        """
+        Возвращает подписанный URL.
+
+        :param url: URL на CDN.
+        :param settings: настройки подписи.
+        :param now: текущее Unix время (по умолчанию - системное).
+        """
+
+        self._use_settings(settings)
+        time_bucket = int(time.time() if now is None else now) // settings.time_bucket
+        expires = (time_bucket + 1) * settings.time_bucket + settings.ttl
+        path = url.path or "/"
+        token = self._get_token(path, expires, settings.keys[settings.active_key_id].get_secret_value())
+        self.signed_count += 1
+        return f"{url}?expires={expires}&kid={quote(settings.active_key_id, safe='')}&token={token}"
@@ -0,0 +1,124 @@
+"""
+Прогрев воркера перед приёмом запросов: открытие соединений с Redis и БД и выполнение служебных запросов через
+обработчики балансировщика, чтобы первые запросы клиентов не тратили время на ленивую инициализацию.
+"""
+
+import asyncio
+from typing import Any
+from urllib.parse import urlencode
+
+from pydantic import BaseModel, NonNegativeInt, PositiveFloat
+from redis.asyncio import Redis
+
+from wink_test.postgres import Postgres
+
+__all__ = (
+    "WarmupSettings",
+    "WarmupError",
+    "call_app",
+    "open_connections",
+    "send_requests",
+)
+
+warmup_video_url = "http://s1.warmup.invalid/warmup/file.m3u8"
+"""
+URL видео для служебных запросов прогрева.
+"""
+
+
+class WarmupSettings(BaseModel):
+    """
+    Модель настроек прогрева воркера.
+    """
+
+    redis_connections: NonNegativeInt = 8
+    """
+    Количество соединений с Redis, открываемых заранее.
+    """
+
+    postgres_connections: NonNegativeInt = 0
+    """
+    Количество соединений с БД, открываемых заранее (не больше размера пула).
+    """
+
+    requests: NonNegativeInt = 100
+    """
+    Количество служебных запросов к `GET /` и `GET /settings` (каждого).
+    """
+
+    retry_interval: PositiveFloat = 5.0
+    """
+    Интервал повтора прогрева после ошибки (в секундах).
+    """
+
+
+class WarmupError(Exception):
+    """
+    Служебный запрос прогрева завершился ошибкой.
+    """
+
+
+async def call_app(app: Any, path: str, params: dict[str, str] | None = None) -> int:
+    """
+    Выполняет GET запрос к ASGI приложению напрямую, без сетевого соединения, и возвращает код ответа.
+    """
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": urlencode(params or {}).encode(),
+        "root_path": "",
+        "headers": [(b"host", b"localhost")],
+        "client": ("127.0.0.1", 0),
+        "server": ("localhost", 80),
+    }
+    status_code = 0
+
+    async def receive() -> dict[str, Any]:
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message: dict[str, Any]):
+        nonlocal status_code
+        if message["type"] == "http.response.start":
+            status_code = message["status"]
+
+    await app(scope, receive, send)
+    return status_code
+
+
+async def open_connections(redis_connection: Redis, db_connection: Postgres | None, warmup_settings: WarmupSettings):
+    """
+    Заранее открывает соединения с Redis и БД, чтобы они уже были в пулах к приходу первых запросов.
+    """
+
+    # Параллельные команды заставляют пул открыть отдельное соединение для каждой из них.
+    await asyncio.gather(*(redis_connection.ping() for _ in range(warmup_settings.redis_connections)))
+
+    if warmup_settings.postgres_connections and db_connection:
+        pool = await db_connection.get_pool()
+        connections = [
+            await pool.acquire()
+            for _ in range(min(warmup_settings.postgres_connections, db_connection.settings.pool_max_size))
+        ]
+        for connection in connections:
+            await pool.release(connection)
+
+
+async def send_requests(app: Any, requests_count: int):
+    """
+    Выполняет служебные запросы к `GET /` и `GET /settings`, чтобы заполнить кэши FastAPI и pydantic и выполнить
+    первые обращения к зависимостям обработчиков.
+
+    :raises WarmupError: запрос завершился ответом с кодом ошибки - воркер не готов обрабатывать запросы.
+    """
+
+    for _ in range(requests_count):
+        for path, params in (("/", {"video": warmup_video_url}), ("/settings", None)):
+            status_code = await call_app(app, path, params)
+            if not 200 <= status_code < 400:
+                raise WarmupError(f"Служебный запрос {path} завершился с кодом {status_code}.")
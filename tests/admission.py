@@ -0,0 +1,206 @@
+import asyncio
+import unittest
+from typing import Any
+
+import httpx
+from pydantic import HttpUrl
+from redis.asyncio import Redis
+
+from tests.utils import external_services
+from wink_test.admission import AdmissionController, AdmissionSettings, TokenBucketRateLimiter
+from wink_test.dependencies import get_app_state
+from wink_test.main import app
+from wink_test.settings import Settings
+
+
+class TestAdmissionController(unittest.IsolatedAsyncioTestCase):
+    """
+    Тестирование ограничения количества одновременно обрабатываемых запросов.
+    """
+
+    async def test_requests_over_queue_size_are_shed(self):
+        controller = AdmissionController(AdmissionSettings(max_concurrency=1, max_queue_size=0))
+
+        self.assertTrue(await controller.acquire())
+        self.assertFalse(await controller.acquire())
+        self.assertEqual(controller.shed_count, 1)
+
+        controller.release()
+        self.assertTrue(await controller.acquire())
+
+    async def test_queued_request_gets_released_slot(self):
+        controller = AdmissionController(AdmissionSettings(max_concurrency=1, max_queue_size=1, queue_timeout=1))
+
+        self.assertTrue(await controller.acquire())
+        waiting = asyncio.create_task(controller.acquire())
+        await asyncio.sleep(0)
+        self.assertEqual(controller.queued_count, 1)
+
+        controller.release()
+        self.assertTrue(await waiting)
+        self.assertEqual(controller.active_count, 1)
+        self.assertEqual(controller.queued_count, 0)
+
+    async def test_queued_request_times_out(self):
+        controller = AdmissionController(AdmissionSettings(max_concurrency=1, max_queue_size=1, queue_timeout=0.01))
+
+        self.assertTrue(await controller.acquire())
+        self.assertFalse(await controller.acquire())
+        self.assertEqual(controller.shed_count, 1)
+        self.assertEqual(controller.queued_count, 0)
+
+    async def test_raising_limit_wakes_queued_requests(self):
+        controller = AdmissionController(AdmissionSettings(max_concurrency=1, max_queue_size=2, queue_timeout=1))
+
+        self.assertTrue(await controller.acquire())
+        waiting = [asyncio.create_task(controller.acquire()) for _ in range(2)]
+        await asyncio.sleep(0)
+
+        controller.update_settings(AdmissionSettings(max_concurrency=3, max_queue_size=2, queue_timeout=1))
+        self.assertEqual(await asyncio.gather(*waiting), [True, True])
+        self.assertEqual(controller.active_count, 3)
+
+
+class TestTokenBucketRateLimiter(unittest.TestCase):
+    """
+    Тестирование ограничения частоты запросов клиентов.
+    """
+
+    def test_burst_is_limited(self):
+        rate_limiter = TokenBucketRateLimiter(rate=0.001, burst=3, max_clients=10)
+
+        self.assertEqual([rate_limiter.allow("client") for _ in range(4)], [True, True, True, False])
+        self.assertTrue(rate_limiter.allow("other-client"))
+
+    def test_least_recent_clients_are_evicted(self):
+        rate_limiter = TokenBucketRateLimiter(rate=0.001, burst=1, max_clients=2)
+
+        for client in ("a", "b", "c"):
+            rate_limiter.allow(client)
+
+        self.assertEqual(list(rate_limiter.buckets), ["b", "c"])
+
+
+class TestAdmissionRoute(unittest.IsolatedAsyncioTestCase):
+    """
+    Тестирование ответов `GET /` на запросы, не допущенные к обработке. Запросы отклоняются до обращения к счетчику,
+    поэтому Redis не нужен.
+    """
+
+    video_url = "http://s1.origin-cluster/video/1/file.m3u8"
+
+    def setUp(self):
+        app_state = get_app_state()
+        self.saved_settings = app_state.settings
+        self.saved_admission_controller = app_state.loop.admission_controller
+        app_state.settings = Settings(
+            cdn_host=HttpUrl("http://cdn-domain"),
+            redirect_ratio="1:1",  # type: ignore
+            redis_url="redis://localhost",  # type: ignore
+        )
+
+    def tearDown(self):
+        app_state = get_app_state()
+        app_state.settings = self.saved_settings
+        app_state.loop.admission_controller = self.saved_admission_controller
+
+    async def request_video(self, controller: AdmissionController) -> httpx.Response:
+        get_app_state().loop.admission_controller = controller
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            return await client.get("/", params={"video": self.video_url})
+
+    async def test_shed_request(self):
+        controller = AdmissionController(AdmissionSettings(max_concurrency=1, max_queue_size=0, retry_after=7))
+        self.assertTrue(await controller.acquire())
+
+        response = await self.request_video(controller)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers["retry-after"], "7")
+        self.assertEqual(controller.shed_count, 1)
+
+    async def test_rate_limited_request(self):
+        controller = AdmissionController(AdmissionSettings(rate_limit=0.001, rate_limit_burst=1, retry_after=3))
+        self.assertTrue(controller.allow_client("127.0.0.1"))
+
+        response = await self.request_video(controller)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers["retry-after"], "3")
+        self.assertEqual(controller.rate_limited_count, 1)
+
+    async def test_shed_request_degrades_to_cdn(self):
+        controller = AdmissionController(AdmissionSettings(max_concurrency=1, max_queue_size=0, degrade_to_cdn=True))
+        self.assertTrue(await controller.acquire())
+
+        response = await self.request_video(controller)
+        self.assertEqual(response.status_code, 301)
+        self.assertEqual(response.headers["location"], "http://cdn-domain/s1/video/1/file.m3u8")
+        self.assertEqual(controller.degraded_count, 1)
+
+
+class TestSharedAdmissionSettings(unittest.IsolatedAsyncioTestCase):
+    """
+    Тестирование общих для воркеров порогов контроля допуска в Redis.
+    """
+
+    def run(self, result: Any = None):
+        with external_services():
+            super().run(result)
+
+    async def asyncSetUp(self):
+        self.redis_client = Redis(host="localhost")
+        await self.redis_client.delete(AdmissionController.redis_key)
+
+        app_state = get_app_state()
+        self.saved_settings = app_state.settings
+        self.saved_admission_controller = app_state.loop.admission_controller
+        self.saved_redis_connection = app_state.loop.redis_connection
+        app_state.settings = Settings(
+            cdn_host=HttpUrl("http://cdn-domain"),
+            redirect_ratio="1:1",  # type: ignore
+            redis_url="redis://localhost:6379",  # type: ignore
+            admission=AdmissionSettings(),
+        )
+        app_state.loop.admission_controller = None
+        app_state.loop.redis_connection = None
+
+    async def asyncTearDown(self):
+        app_state = get_app_state()
+        if app_state.loop.redis_connection:
+            await app_state.loop.redis_connection.aclose()
+        app_state.settings = self.saved_settings
+        app_state.loop.admission_controller = self.saved_admission_controller
+        app_state.loop.redis_connection = self.saved_redis_connection
+
+        await self.redis_client.delete(AdmissionController.redis_key)
+        await self.redis_client.aclose()
+
+    async def test_update_reaches_other_workers(self):
+        other_worker_controller = AdmissionController(AdmissionSettings(sync_interval=0.01))
+        async with other_worker_controller.run(self.redis_client):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+                response = await client.put(
+                    "/settings/admission", json={"max_concurrency": 8, "retry_after": 5, "sync_interval": 0.01}
+                )
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(get_app_state().loop.admission_controller.settings.max_concurrency, 8)  # type: ignore
+
+            async with asyncio.timeout(1):
+                while other_worker_controller.settings.max_concurrency != 8:
+                    await asyncio.sleep(0.01)
+        self.assertEqual(other_worker_controller.settings.retry_after, 5)
+
+    async def test_new_worker_uses_stored_settings(self):
+        await AdmissionController(AdmissionSettings()).save_settings(
+            self.redis_client, AdmissionSettings(max_queue_size=3)
+        )
+
+        controller = AdmissionController(AdmissionSettings())
+        self.assertTrue(await controller.sync_settings(self.redis_client))
+        self.assertEqual(controller.settings.max_queue_size, 3)
+        self.assertFalse(await controller.sync_settings(self.redis_client))
+
+
+if __name__ == "__main__":
+    unittest.main()
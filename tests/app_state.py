@@ -0,0 +1,48 @@
+import asyncio
+import threading
+import unittest
+
+from wink_test.dependencies import AppState
+
+
+class TestAppStateLoops(unittest.TestCase):
+    """
+    Тестирование разделения состояния приложения между циклами событий потоков.
+    """
+
+    def test_loop_state_per_thread(self):
+        app_state = AppState()
+        loop_states = {}
+
+        def run_thread(name: str):
+            app_state.enter_loop()
+
+            async def read_loop_state():
+                # Синхронные зависимости FastAPI выполняются в пуле потоков и должны видеть то же состояние.
+                return app_state.loop, await asyncio.to_thread(lambda: app_state.loop)
+
+            loop_states[name] = asyncio.run(read_loop_state())
+
+        threads = [threading.Thread(target=run_thread, args=(f"thread-{i}",)) for i in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        (first_loop_state, first_pool_loop_state), (second_loop_state, second_pool_loop_state) = loop_states.values()
+        assert first_loop_state is first_pool_loop_state
+        assert second_loop_state is second_pool_loop_state
+        assert first_loop_state is not second_loop_state
+        assert {id(loop_state) for loop_state in app_state.get_loop_states()} == {
+            id(first_loop_state),
+            id(second_loop_state),
+        }
+
+    def test_main_loop_by_default(self):
+        app_state = AppState()
+        assert app_state.loop is app_state.main_loop
+        assert app_state.get_loop_states() == [app_state.main_loop]
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,9 +3,16 @@ from collections import Counter
 from typing import Any
 
 import httpx
+from fastapi import Request
+from redis.asyncio import Redis
 
 from tests.utils import external_services, get_random_video_url, patch_environ
+from wink_test.dependencies import get_app_state, get_settings
 from wink_test.main import app
+from wink_test.proxy_integration import ProxyIntegrationSettings
+from wink_test.routers.balancer_api import get_proxied_client_address
+from wink_test.settings import Settings
+from wink_test.shared_counter import SharedCounter
 
 
 class TestBalancerRatio(unittest.IsolatedAsyncioTestCase):
@@ -17,6 +24,13 @@ class TestBalancerRatio(unittest.IsolatedAsyncioTestCase):
         with external_services():
             super().run(result)
 
+    async def asyncSetUp(self):
+        # Распределение проверяется с первого запроса, поэтому счетчик не должен зависеть от предыдущих тестов.
+        redis_client = Redis(host="localhost")
+        await SharedCounter(redis_client, "request-counter").reset()
+        await redis_client.aclose()
+        get_app_state().loop.request_counter = None
+
     @patch_environ(
         BALANCER_CDN_HOST="http://cdn-domain", BALANCER_REDIRECT_RATIO="3:1", BALANCER_REDIS_URL="redis://localhost"
     )
@@ -42,5 +56,124 @@ class TestBalancerRatio(unittest.IsolatedAsyncioTestCase):
             assert redirect_url_counter["origin-server"] == 25
 
 
+class TestBalancerReadiness(unittest.IsolatedAsyncioTestCase):
+    """
+    Тестирование готовности сервиса после прогрева.
+    """
+
+    def run(self, result: Any = None):
+        with external_services():
+            super().run(result)
+
+    @patch_environ(
+        BALANCER_CDN_HOST="http://cdn-domain", BALANCER_REDIRECT_RATIO="3:1", BALANCER_REDIS_URL="redis://localhost"
+    )
+    async def test_ready_after_warmup(self):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            response = await client.get("/ready")
+            assert response.status_code == 503
+
+            async with app.router.lifespan_context(app):
+                response = await client.get("/ready")
+                assert response.status_code == 200
+
+                # Служебные запросы прогрева не сдвигают распределение запросов клиентов.
+                redirect_urls = []
+                for i in range(4):
+                    random_video_url = get_random_video_url(i)
+                    response = await client.get("/", params={"video": random_video_url})
+                    redirect_urls.append(response.headers["location"] != random_video_url)
+                assert redirect_urls.count(True) == 3
+
+            response = await client.get("/ready")
+            assert response.status_code == 503
+
+
+class TestBalancerDecide(unittest.IsolatedAsyncioTestCase):
+    """
+    Тестирование внутреннего запроса решения для обратного прокси.
+    """
+
+    def run(self, result: Any = None):
+        with external_services():
+            super().run(result)
+
+    async def request_decisions(self, settings: Settings, count: int) -> list[httpx.Response]:
+        app.dependency_overrides[get_settings] = lambda: settings
+        try:
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+                return [
+                    await client.get(
+                        "/decide", params={"video": get_random_video_url(i)}, headers={"x-real-ip": "1.2.3.4"}
+                    )
+                    for i in range(count)
+                ]
+        finally:
+            del app.dependency_overrides[get_settings]
+
+    async def test_decide(self):
+        settings = Settings(
+            cdn_host="http://cdn-domain",  # type: ignore
+            redirect_ratio="1:1",  # type: ignore
+            redis_url="redis://localhost",  # type: ignore
+            proxy_integration=ProxyIntegrationSettings(accel_redirect="@balancer_redirect", cache_ttl=1),
+        )
+
+        responses = await self.request_decisions(settings, 4)
+        redirect_urls = []
+        for i, response in enumerate(responses):
+            assert response.status_code == 200
+            assert response.content == b""
+            assert response.headers["x-accel-redirect"] == "@balancer_redirect"
+            assert response.headers["x-accel-expires"] == "1"
+            redirect_urls.append(response.headers["x-balancer-location"] != get_random_video_url(i))
+        assert redirect_urls.count(True) == 2
+
+    async def test_disabled(self):
+        settings = Settings(
+            cdn_host="http://cdn-domain",  # type: ignore
+            redirect_ratio="1:1",  # type: ignore
+            redis_url="redis://localhost",  # type: ignore
+        )
+
+        (response,) = await self.request_decisions(settings, 1)
+        assert response.status_code == 404
+
+
+class TestProxiedClientAddress(unittest.TestCase):
+    """
+    Тестирование определения адреса клиента в запросах от обратного прокси.
+    """
+
+    @staticmethod
+    def make_request(client: tuple[str, int] | None, real_ip: str | None = "1.2.3.4") -> Request:
+        headers = [(b"x-real-ip", real_ip.encode())] if real_ip else []
+        return Request({"type": "http", "method": "GET", "path": "/decide", "headers": headers, "client": client})
+
+    def test_unix_socket(self):
+        settings = ProxyIntegrationSettings()
+
+        assert get_proxied_client_address(self.make_request(None), settings) == "1.2.3.4"
+        assert get_proxied_client_address(self.make_request(None, real_ip=None), settings) == ""
+
+    def test_untrusted_peer(self):
+        settings = ProxyIntegrationSettings(trusted_proxies=["10.0.0.0/8"])  # type: ignore
+
+        assert get_proxied_client_address(self.make_request(("192.168.0.1", 1234)), ProxyIntegrationSettings()) == (
+            "192.168.0.1"
+        )
+        assert get_proxied_client_address(self.make_request(("192.168.0.1", 1234)), settings) == "192.168.0.1"
+
+    def test_trusted_peer(self):
+        # Доверенные прокси задаются в настройках работы за прокси, выбор узла CDN для этого не нужен.
+        settings = ProxyIntegrationSettings(trusted_proxies=["10.0.0.0/8"])  # type: ignore
+
+        assert get_proxied_client_address(self.make_request(("10.0.0.5", 1234)), settings) == "1.2.3.4"
+        assert get_proxied_client_address(self.make_request(("::ffff:10.0.0.5", 1234)), settings) == "1.2.3.4"
+        assert get_proxied_client_address(self.make_request(("10.0.0.5", 1234), real_ip=None), settings) == "10.0.0.5"
+
+
 if __name__ == "__main__":
     unittest.main()
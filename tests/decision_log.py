@@ -0,0 +1,82 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from wink_test.decision_log import DecisionLog, DecisionLogSettings, read_decision_log
+
+
+class TestDecisionLog(unittest.IsolatedAsyncioTestCase):
+    """
+    Тестирование журнала решений балансировщика.
+    """
+
+    async def asyncSetUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.directory = Path(self.temp_dir.name)
+
+    async def asyncTearDown(self):
+        self.temp_dir.cleanup()
+
+    def read_all_records(self):
+        return [record for path in sorted(self.directory.iterdir()) for record in read_decision_log(path)]
+
+    async def test_records_are_written_and_read(self):
+        decision_log = DecisionLog(DecisionLogSettings(directory=self.directory, capacity=16))
+        async with decision_log.run():
+            decision_log.append("s1.origin-cluster", "/video/1/file.m3u8", True, 42)
+            decision_log.append("s2.origin-cluster", "/video/2/file.m3u8", False, 42)
+
+        records = self.read_all_records()
+        self.assertEqual(len(records), 2)
+        self.assertEqual(records[0].video_host, "s1.origin-cluster")
+        self.assertEqual(records[0].video_path, "/video/1/file.m3u8")
+        self.assertTrue(records[0].redirected_to_cdn)
+        self.assertEqual(records[0].settings_version, 42)
+        self.assertFalse(records[1].redirected_to_cdn)
+
+    async def test_long_paths_are_flagged_as_truncated(self):
+        decision_log = DecisionLog(DecisionLogSettings(directory=self.directory, capacity=16))
+        long_path = "/video/" + "a" * 200 + "/file.m3u8"
+        async with decision_log.run():
+            decision_log.append("s1.origin-cluster", long_path, True, 0)
+            decision_log.append("s1.origin-cluster", "/video/1/file.m3u8", False, 0)
+
+        records = self.read_all_records()
+        self.assertEqual(records[0].video_path, long_path[:179])
+        self.assertTrue(records[0].truncated)
+        self.assertTrue(records[0].redirected_to_cdn)
+        self.assertFalse(records[1].truncated)
+        self.assertFalse(records[1].redirected_to_cdn)
+        self.assertEqual(decision_log.truncated_count, 1)
+
+    async def test_records_are_dropped_when_buffer_is_full(self):
+        decision_log = DecisionLog(DecisionLogSettings(directory=self.directory, capacity=4))
+        results = [decision_log.append("s1.origin-cluster", f"/video/{i}", True, 0) for i in range(6)]
+
+        self.assertEqual(results, [True] * 4 + [False] * 2)
+        self.assertEqual(decision_log.dropped_count, 2)
+
+    async def test_buffer_wraps_around(self):
+        decision_log = DecisionLog(DecisionLogSettings(directory=self.directory, capacity=4))
+        for i in range(3):
+            decision_log.append("s1.origin-cluster", f"/video/{i}", True, 0)
+        await decision_log.flush()
+        for i in range(3, 7):
+            decision_log.append("s1.origin-cluster", f"/video/{i}", True, 0)
+        await decision_log.flush()
+        decision_log._close_file()
+
+        self.assertEqual([record.video_path for record in self.read_all_records()], [f"/video/{i}" for i in range(7)])
+
+    async def test_files_are_rotated(self):
+        decision_log = DecisionLog(DecisionLogSettings(directory=self.directory, capacity=4, max_file_size=1))
+        for i in range(3):
+            decision_log.append("s1.origin-cluster", f"/video/{i}", True, 0)
+            await decision_log.flush()
+
+        self.assertEqual(len(list(self.directory.iterdir())), 3)
+        self.assertEqual(len(self.read_all_records()), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
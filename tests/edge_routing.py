@@ -0,0 +1,129 @@
+import os
+import tempfile
+import unittest
+from ipaddress import ip_network
+from pathlib import Path
+
+from pydantic import HttpUrl
+
+from wink_test.edge_routing import EdgeRouter, EdgeRoutingSettings, PrefixIndex
+
+
+class TestPrefixIndex(unittest.TestCase):
+    """
+    Тестирование поиска по наиболее длинному префиксу.
+    """
+
+    def setUp(self):
+        self.index = PrefixIndex(
+            [
+                (ip_network("10.0.0.0/8"), "wide"),
+                (ip_network("10.1.0.0/16"), "narrow"),
+                (ip_network("10.1.2.0/24"), "narrowest"),
+                (ip_network("10.255.255.0/24"), "tail"),
+                (ip_network("2001:db8::/32"), "ipv6"),
+                (ip_network("2001:db8:1::/48"), "ipv6-narrow"),
+            ]
+        )
+
+    def test_longest_prefix_wins(self):
+        self.assertEqual(self.index.lookup("10.0.0.1"), "wide")
+        self.assertEqual(self.index.lookup("10.1.0.1"), "narrow")
+        self.assertEqual(self.index.lookup("10.1.2.3"), "narrowest")
+        self.assertEqual(self.index.lookup("10.1.3.0"), "narrow")
+        self.assertEqual(self.index.lookup("10.2.0.0"), "wide")
+        self.assertEqual(self.index.lookup("10.255.255.255"), "tail")
+
+    def test_address_outside_prefixes(self):
+        self.assertIsNone(self.index.lookup("11.0.0.0"))
+        self.assertIsNone(self.index.lookup("9.255.255.255"))
+        self.assertIsNone(self.index.lookup("2001:db9::1"))
+        self.assertIsNone(self.index.lookup("not-an-address"))
+
+    def test_ipv6(self):
+        self.assertEqual(self.index.lookup("2001:db8::1"), "ipv6")
+        self.assertEqual(self.index.lookup("2001:db8:1::1"), "ipv6-narrow")
+        self.assertEqual(self.index.lookup("2001:db8:2::1"), "ipv6")
+
+    def test_ipv4_mapped_ipv6(self):
+        self.assertEqual(self.index.lookup("::ffff:10.1.2.3"), "narrowest")
+
+    def test_whole_address_space(self):
+        index = PrefixIndex([(ip_network("0.0.0.0/0"), "all"), (ip_network("255.255.255.255/32"), "last")])
+        self.assertEqual(index.lookup("0.0.0.0"), "all")
+        self.assertEqual(index.lookup("255.255.255.254"), "all")
+        self.assertEqual(index.lookup("255.255.255.255"), "last")
+
+
+class TestEdgeRouter(unittest.IsolatedAsyncioTestCase):
+    """
+    Тестирование выбора узла CDN по адресу клиента.
+    """
+
+    async def test_edge_map_is_loaded_from_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "edges.txt"
+            path.write_text("# Европа\n10.0.0.0/8 http://cdn-eu\n\n2001:db8::/32 http://cdn-asia\n")
+
+            edge_router = EdgeRouter(EdgeRoutingSettings(file=path))
+            await edge_router.reload()
+
+        self.assertEqual(edge_router.get_cdn_host("10.1.2.3"), HttpUrl("http://cdn-eu"))
+        self.assertEqual(edge_router.get_cdn_host("2001:db8::1"), HttpUrl("http://cdn-asia"))
+        self.assertIsNone(edge_router.get_cdn_host("192.168.0.1"))
+
+    async def test_unchanged_file_is_not_reloaded(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "edges.txt"
+            path.write_text("10.0.0.0/8 http://cdn-eu\n")
+
+            edge_router = EdgeRouter(EdgeRoutingSettings(file=path))
+            await edge_router.reload()
+            await edge_router.reload()
+            self.assertEqual(edge_router.reloads_count, 1)
+
+            path.write_text("10.0.0.0/8 http://cdn-asia\n")
+            os.utime(path, (0, 1))
+            await edge_router.reload()
+
+        self.assertEqual(edge_router.reloads_count, 2)
+        self.assertEqual(edge_router.get_cdn_host("10.1.2.3"), HttpUrl("http://cdn-asia"))
+
+    async def test_unchanged_database_table_is_not_reloaded(self):
+        class CdnEdgesDbModelStub:
+            version = 1
+            rows = [("10.0.0.0/8", "http://cdn-eu")]
+            fetches_count = 0
+
+            async def get_version(self):
+                return self.version
+
+            async def get_objects(self):
+                self.fetches_count += 1
+                return self.rows
+
+        db_model = CdnEdgesDbModelStub()
+        edge_router = EdgeRouter(EdgeRoutingSettings(from_database=True))
+        edge_router.db_model = db_model  # type: ignore
+
+        await edge_router.reload()
+        await edge_router.reload()
+        self.assertEqual((db_model.fetches_count, edge_router.reloads_count), (1, 1))
+
+        db_model.version = 2
+        db_model.rows = [("10.0.0.0/8", "http://cdn-asia")]
+        await edge_router.reload()
+        self.assertEqual((db_model.fetches_count, edge_router.reloads_count), (2, 2))
+        self.assertEqual(edge_router.get_cdn_host("10.1.2.3"), HttpUrl("http://cdn-asia"))
+
+    def test_forwarded_for_is_used_only_from_trusted_proxies(self):
+        edge_router = EdgeRouter(EdgeRoutingSettings(trusted_proxies=[ip_network("172.16.0.0/12")]))
+
+        self.assertEqual(edge_router.get_client_address("203.0.113.1", "10.0.0.1"), "203.0.113.1")
+        self.assertEqual(edge_router.get_client_address("172.16.0.1", "10.0.0.1, 172.16.0.2"), "10.0.0.1")
+        self.assertEqual(edge_router.get_client_address("172.16.0.1", "1.1.1.1, 10.0.0.1"), "10.0.0.1")
+        self.assertEqual(edge_router.get_client_address("172.16.0.1", None), "172.16.0.1")
+
+
+if __name__ == "__main__":
+    unittest.main()
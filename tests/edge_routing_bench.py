@@ -0,0 +1,72 @@
+"""
+Тестирование скорости поиска узла CDN по адресу клиента на таблице из 1 000 000 подсетей.
+"""
+
+import argparse
+import random
+import time
+import tracemalloc
+from ipaddress import IPv4Network, IPv6Network
+
+from wink_test.edge_routing import PrefixIndex
+
+
+def generate_prefixes(prefixes_count: int, edges_count: int, seed: int):
+    """
+    Генерирует случайные подсети IPv4 (/8 - /24) и IPv6 (/32 - /64) с вложенными подсетями.
+    """
+
+    rng = random.Random(seed)
+    edges = [f"http://cdn-edge-{i}" for i in range(edges_count)]
+    prefixes: list[tuple[IPv4Network | IPv6Network, str]] = []
+    for _ in range(prefixes_count):
+        if rng.random() < 0.8:
+            prefix_length = rng.randint(8, 24)
+            network = IPv4Network((rng.getrandbits(prefix_length) << (32 - prefix_length), prefix_length))
+        else:
+            prefix_length = rng.randint(32, 64)
+            network = IPv6Network((rng.getrandbits(prefix_length) << (128 - prefix_length), prefix_length))
+        prefixes.append((network, rng.choice(edges)))
+    return prefixes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Тестирование скорости поиска узла CDN по адресу клиента.")
+    parser.add_argument("--prefixes", type=int, default=1_000_000, help="количество подсетей")
+    parser.add_argument("--edges", type=int, default=32, help="количество узлов CDN")
+    parser.add_argument("--lookups", type=int, default=1_000_000, help="количество поисков")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    prefixes = generate_prefixes(args.prefixes, args.edges, args.seed)
+
+    start_time = time.perf_counter()
+    index = PrefixIndex(prefixes)
+    build_time = time.perf_counter() - start_time
+
+    # Размер индекса измеряется отдельной сборкой, так как tracemalloc сильно замедляет её.
+    tracemalloc.start()
+    measured_index = PrefixIndex(prefixes)
+    index_size, build_peak_size = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del measured_index
+    print(f"Index of {index.prefixes_count} prefixes built in {build_time:.3f} seconds.")
+    print(f"Index size: {index_size / 2**20:.1f} MiB, peak during build: {build_peak_size / 2**20:.1f} MiB")
+
+    rng = random.Random(args.seed + 1)
+    ipv4_addresses = [str(IPv4Network(rng.getrandbits(32)).network_address) for _ in range(args.lookups)]
+    ipv6_addresses = [str(IPv6Network(rng.getrandbits(128)).network_address) for _ in range(args.lookups)]
+
+    for name, addresses in (("IPv4", ipv4_addresses), ("IPv6", ipv6_addresses)):
+        lookup = index.lookup
+        start_time = time.perf_counter()
+        found = sum(1 for address in addresses if lookup(address) is not None)
+        exec_time = time.perf_counter() - start_time
+        print(
+            f"[{name}] {len(addresses)} lookups in {exec_time:.3f} seconds: "
+            f"{exec_time / len(addresses) * 1e6:.2f} us per lookup, {found} addresses matched"
+        )
+
+
+if __name__ == "__main__":
+    main()
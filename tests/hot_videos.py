@@ -0,0 +1,99 @@
+import json
+import random
+import unittest
+
+from wink_test.hot_videos import HotVideosSettings, HotVideoTracker
+
+
+def add_requests(tracker: HotVideoTracker, requests: list[tuple[str, bool]], start_time: float, duration: float):
+    for i, (video, to_cdn) in enumerate(requests):
+        tracker.add("s1.origin", video, to_cdn, now=start_time + duration * i / len(requests))
+
+
+def generate_requests(seed: int, count: int = 20_000) -> list[tuple[str, bool]]:
+    """
+    Генерирует запросы: 5 популярных видео (по 4-20% запросов) и длинный хвост из 100 000 видео.
+    """
+
+    rng = random.Random(seed)
+    requests: list[tuple[str, bool]] = []
+    for i in range(count):
+        if rng.random() < 0.6:
+            video = f"/hot/{min(int(rng.expovariate(0.5)), 4)}.m3u8"
+        else:
+            video = f"/tail/{rng.randrange(100_000)}.m3u8"
+        requests.append((video, i % 4 != 0))
+    return requests
+
+
+class TestHotVideoTracker(unittest.TestCase):
+    def setUp(self):
+        self.settings = HotVideosSettings(width=1024, depth=4, capacity=20, half_life=60.0)
+
+    def test_finds_heavy_hitters(self):
+        tracker = HotVideoTracker(self.settings, start_time=0.0)
+        add_requests(tracker, generate_requests(0), start_time=0.0, duration=100.0)
+
+        top = tracker.get_top(5, now=100.0)
+        assert {hot_video.video for hot_video in top} == {f"s1.origin/hot/{i}.m3u8" for i in range(5)}
+        assert top[0].video == "s1.origin/hot/0.m3u8"
+        assert abs(top[0].cdn_share - 0.75) < 0.05
+        assert len(tracker.top) == self.settings.capacity
+
+    def test_rate_estimate_and_decay(self):
+        tracker = HotVideoTracker(self.settings, start_time=0.0)
+        # 10 запросов в секунду в течение 10 периодов полураспада.
+        for i in range(6000):
+            tracker.add("s1.origin", "/video.m3u8", True, now=i / 10)
+
+        (hot_video,) = tracker.get_top(1, now=600.0)
+        assert abs(hot_video.requests_per_second - 10) < 0.1
+
+        (hot_video,) = tracker.get_top(1, now=660.0)
+        assert abs(hot_video.requests_per_second - 5) < 0.05
+
+    def test_normalize_keeps_estimates(self):
+        tracker = HotVideoTracker(self.settings, start_time=0.0)
+        add_requests(tracker, generate_requests(1), start_time=0.0, duration=100.0)
+        before = tracker.get_top(5, now=100.0)
+
+        tracker.normalize(100.0)
+        after = tracker.get_top(5, now=100.0)
+        assert [hot_video.video for hot_video in before] == [hot_video.video for hot_video in after]
+        for hot_video_before, hot_video_after in zip(before, after):
+            assert abs(hot_video_before.requests_per_second - hot_video_after.requests_per_second) < 1e-6
+
+        # Нормировка при достижении максимального веса.
+        tracker.add("s1.origin", "/hot/0.m3u8", True, now=100.0 + 200 * self.settings.half_life)
+        assert tracker.start_time > 100.0
+
+    def test_merge(self):
+        requests = generate_requests(2)
+        single_tracker = HotVideoTracker(self.settings, start_time=0.0)
+        add_requests(single_tracker, requests, start_time=0.0, duration=100.0)
+
+        # Запросы распределены между двумя воркерами, запущенными в разное время.
+        first_tracker = HotVideoTracker(self.settings, start_time=0.0)
+        second_tracker = HotVideoTracker(self.settings, start_time=30.0)
+        for i, (video, to_cdn) in enumerate(requests):
+            tracker = first_tracker if i % 2 else second_tracker
+            tracker.add("s1.origin", video, to_cdn, now=max(100.0 * i / len(requests), tracker.start_time))
+
+        merged_tracker = HotVideoTracker(self.settings, start_time=50.0)
+        for tracker in (first_tracker, second_tracker):
+            merged_tracker.merge(HotVideoTracker.from_snapshot(json.loads(tracker.dump()), self.settings))
+
+        expected_top = single_tracker.get_top(5, now=100.0)
+        merged_top = merged_tracker.get_top(5, now=100.0)
+        assert [hot_video.video for hot_video in merged_top] == [hot_video.video for hot_video in expected_top]
+        for expected, merged in zip(expected_top, merged_top):
+            assert abs(expected.requests_per_second - merged.requests_per_second) / expected.requests_per_second < 0.05
+
+    def test_merge_incompatible(self):
+        tracker = HotVideoTracker(self.settings)
+        with self.assertRaises(ValueError):
+            tracker.merge(HotVideoTracker(self.settings.model_copy(update={"width": 512})))
+
+
+if __name__ == "__main__":
+    unittest.main()
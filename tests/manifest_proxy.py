@@ -0,0 +1,290 @@
+import asyncio
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+from pydantic import HttpUrl, SecretStr, ValidationError
+
+from wink_test.dependencies import get_app_state, get_settings
+from wink_test.main import app
+from wink_test.manifest_proxy import (
+    ManifestCache,
+    ManifestError,
+    ManifestProxySettings,
+    manifest_media_type,
+    parse_manifest,
+)
+from wink_test.routers.balancer_api import render_manifest_for_cdn
+from wink_test.settings import Settings
+from wink_test.shared_counter import LocalCounter
+from wink_test.url_signing import UrlSigner, UrlSigningSettings
+
+master_playlist = """#EXTM3U
+#EXT-X-MEDIA:TYPE=AUDIO,GROUP-ID="audio",NAME="ru",URI="audio/ru.m3u8"
+#EXT-X-STREAM-INF:BANDWIDTH=1280000,AUDIO="audio"
+http://s2.origin-cluster/video/1/720p.m3u8
+#EXT-X-STREAM-INF:BANDWIDTH=640000,AUDIO="audio"
+360p.m3u8
+"""
+
+media_playlist = """#EXTM3U
+#EXT-X-TARGETDURATION:6
+#EXT-X-MAP:URI="init.mp4"
+#EXTINF:6.0,
+segment-1.ts
+#EXTINF:6.0,
+/video/1/segment-2.ts
+#EXTINF:6.0,
+http://ads.example.com/ad.ts
+#EXT-X-ENDLIST
+"""
+
+cdn_host = HttpUrl("http://cdn-host")
+
+origin_domains = ["origin-cluster"]
+
+
+class TestParseManifest(unittest.TestCase):
+    """
+    Тестирование разбора и переписывания плейлистов.
+    """
+
+    def test_relative_uris_are_resolved(self):
+        manifest = parse_manifest(master_playlist, "http://s1.origin-cluster/video/1/master.m3u8")
+
+        assert [(uri.url, uri.file_server_subdomain) for uri in manifest.uris] == [
+            ("http://s1.origin-cluster/video/1/audio/ru.m3u8", "s1"),
+            ("http://s2.origin-cluster/video/1/720p.m3u8", "s2"),
+            ("http://s1.origin-cluster/video/1/360p.m3u8", "s1"),
+        ]
+
+    def test_render_for_cdn(self):
+        settings = Settings(cdn_host=cdn_host, redirect_ratio="1:1", redis_url="redis://localhost:6379")  # type: ignore
+        manifest = parse_manifest(media_playlist, "http://s1.origin-cluster/video/1/file.m3u8")
+
+        assert render_manifest_for_cdn(manifest, cdn_host, settings, UrlSigner()) == media_playlist.replace(
+            '"init.mp4"', '"http://cdn-host/s1/video/1/init.mp4"'
+        ).replace("segment-1.ts", "http://cdn-host/s1/video/1/segment-1.ts").replace(
+            "/video/1/segment-2.ts", "http://cdn-host/s1/video/1/segment-2.ts"
+        )
+
+    def test_render_signed(self):
+        settings = Settings(
+            cdn_host=cdn_host,
+            redirect_ratio="1:1",  # type: ignore
+            redis_url="redis://localhost:6379",  # type: ignore
+            url_signing=UrlSigningSettings(keys={"k1": SecretStr("secret")}, active_key_id="k1"),
+        )
+        manifest = parse_manifest(media_playlist, "http://s1.origin-cluster/video/1/file.m3u8")
+        lines = render_manifest_for_cdn(manifest, cdn_host, settings, UrlSigner()).splitlines()
+
+        assert lines[4].startswith("http://cdn-host/s1/video/1/segment-1.ts?expires=")
+        assert "&token=" in lines[4]
+        assert lines[8] == "http://ads.example.com/ad.ts"
+
+    def test_not_a_playlist(self):
+        with self.assertRaises(ManifestError):
+            parse_manifest("<html></html>", "http://s1.origin-cluster/video/1/file.m3u8")
+
+
+class StubOriginHandler(BaseHTTPRequestHandler):
+    server: "StubOrigin"
+
+    def do_GET(self):
+        self.server.requests_count += 1
+        time.sleep(self.server.delay)
+        if self.path == "/missing.m3u8":
+            self.send_error(404)
+            return
+        if self.path == "/redirect.m3u8":
+            self.send_response(302)
+            self.send_header("location", "/video/1/file.m3u8")
+            self.send_header("content-length", "0")
+            self.end_headers()
+            return
+        content = media_playlist.encode()
+        self.send_response(200)
+        self.send_header("content-type", "application/vnd.apple.mpegurl")
+        self.send_header("content-length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format: str, *args):
+        pass
+
+
+class StubOrigin(ThreadingHTTPServer):
+    """
+    Origin сервер, отдающий плейлист на любой запрос.
+    """
+
+    def __init__(self, delay: float = 0.0):
+        super().__init__(("127.0.0.1", 0), StubOriginHandler)
+        self.delay = delay
+        self.requests_count = 0
+
+    def get_url(self, path: str) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}{path}"
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
+
+
+class TestManifestCache(unittest.IsolatedAsyncioTestCase):
+    """
+    Тестирование загрузки плейлистов с origin сервера.
+    """
+
+    async def test_concurrent_requests_are_coalesced(self):
+        cache = ManifestCache(ManifestProxySettings(origin_domains=origin_domains))
+        with StubOrigin(delay=0.2) as origin:
+            async with cache.run():
+                url = origin.get_url("/video/1/file.m3u8")
+                manifests = await asyncio.gather(*(cache.get(url) for _ in range(20)))
+
+        assert origin.requests_count == 1
+        assert all(manifest is manifests[0] for manifest in manifests)
+        assert manifests[0].uris[0].url == origin.get_url("/video/1/init.mp4")
+        assert (cache.misses_count, cache.coalesced_count) == (1, 19)
+
+    async def test_ttl(self):
+        cache = ManifestCache(ManifestProxySettings(ttl=10, origin_domains=origin_domains))
+        with StubOrigin() as origin:
+            async with cache.run():
+                url = origin.get_url("/video/1/file.m3u8")
+                await cache.get(url, now=0)
+                await cache.get(url, now=5)
+                await cache.get(url, now=11)
+
+        assert origin.requests_count == 2
+        assert (cache.hits_count, cache.misses_count) == (1, 2)
+
+    async def test_origin_errors(self):
+        cache = ManifestCache(ManifestProxySettings(max_size=16, origin_domains=origin_domains))
+        with StubOrigin() as origin:
+            async with cache.run():
+                with self.assertRaises(ManifestError):
+                    await cache.get(origin.get_url("/missing.m3u8"))
+                with self.assertRaises(ManifestError):
+                    await cache.get(origin.get_url("/video/1/file.m3u8"))
+
+        assert cache.errors_count == 2
+        assert cache.size == 0
+
+    async def test_redirects_are_not_followed(self):
+        cache = ManifestCache(ManifestProxySettings(origin_domains=origin_domains))
+        with StubOrigin() as origin:
+            async with cache.run():
+                with self.assertRaises(ManifestError):
+                    await cache.get(origin.get_url("/redirect.m3u8"))
+
+        assert origin.requests_count == 1
+
+
+class TestManifestOriginUrl(unittest.TestCase):
+    """
+    Тестирование выбора плейлистов, которые можно загружать с origin сервера.
+    """
+
+    def test_only_file_servers_are_allowed(self):
+        cache = ManifestCache(ManifestProxySettings(origin_domains=origin_domains))
+
+        assert (
+            cache.get_origin_url(HttpUrl("http://s1.origin-cluster/video/1/file.m3u8"))
+            == "http://s1.origin-cluster/video/1/file.m3u8"
+        )
+        assert cache.get_origin_url(HttpUrl("http://169.254.169.254/latest/file.m3u8")) is None
+        assert cache.get_origin_url(HttpUrl("http://internal-service/file.m3u8")) is None
+
+    def test_query_is_dropped(self):
+        cache = ManifestCache(ManifestProxySettings(origin_domains=origin_domains))
+
+        assert (
+            cache.get_origin_url(HttpUrl("http://s1.origin-cluster/video/1/file.m3u8?nocache=1#top"))
+            == "http://s1.origin-cluster/video/1/file.m3u8"
+        )
+
+    def test_origin_domains(self):
+        cache = ManifestCache(ManifestProxySettings(origin_domains=origin_domains))
+
+        assert cache.get_origin_url(HttpUrl("http://s2.origin-cluster/video/1/file.m3u8")) is not None
+        assert cache.get_origin_url(HttpUrl("http://s2.attacker.example/video/1/file.m3u8")) is None
+        assert cache.get_origin_url(HttpUrl("http://s2.origin-cluster.attacker.example/file.m3u8")) is None
+
+    def test_origin_domains_are_required(self):
+        with self.assertRaises(ValidationError):
+            ManifestProxySettings(origin_domains=[])
+
+
+class TestBalancerManifestProxy(unittest.IsolatedAsyncioTestCase):
+    """
+    Тестирование ответа `GET /` переписанным плейлистом. Запросы к origin серверу обслуживает заглушка в транспорте HTTP
+    клиента кэша, а запросы считаются счетчиком в памяти, поэтому внешние сервисы не нужны.
+    """
+
+    def setUp(self):
+        self.settings = Settings(
+            cdn_host=cdn_host,
+            redirect_ratio="1:1",  # type: ignore
+            redis_url="redis://localhost",  # type: ignore
+            manifest_proxy=ManifestProxySettings(origin_domains=origin_domains),
+        )
+        self.origin_requests: list[str] = []
+
+        def handle_origin_request(request: httpx.Request) -> httpx.Response:
+            self.origin_requests.append(str(request.url))
+            return httpx.Response(200, text=media_playlist, headers={"content-type": manifest_media_type})
+
+        loop_state = get_app_state().loop
+        self.saved_loop_state = (loop_state.request_counter, loop_state.manifest_cache)
+        loop_state.request_counter = LocalCounter()
+        loop_state.manifest_cache = ManifestCache(self.settings.manifest_proxy)  # type: ignore
+        loop_state.manifest_cache.client = httpx.AsyncClient(transport=httpx.MockTransport(handle_origin_request))
+        app.dependency_overrides[get_settings] = lambda: self.settings
+
+    def tearDown(self):
+        del app.dependency_overrides[get_settings]
+        loop_state = get_app_state().loop
+        loop_state.request_counter, loop_state.manifest_cache = self.saved_loop_state
+
+    async def test_manifest_is_rewritten(self):
+        video = "http://s1.origin-cluster/video/1/file.m3u8?token=1"
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            cdn_response = await client.get("/", params={"video": video})
+            origin_response = await client.get("/", params={"video": video})
+
+        assert cdn_response.status_code == 200
+        assert cdn_response.headers["content-type"].split(";")[0] == manifest_media_type
+        assert cdn_response.text == render_manifest_for_cdn(
+            parse_manifest(media_playlist, "http://s1.origin-cluster/video/1/file.m3u8"),
+            cdn_host,
+            self.settings,
+            UrlSigner(),
+        )
+        assert "http://cdn-host/s1/video/1/segment-1.ts" in cdn_response.text
+        assert self.origin_requests == ["http://s1.origin-cluster/video/1/file.m3u8"]
+
+        assert origin_response.status_code == 301
+        assert origin_response.headers["location"] == video
+
+    async def test_other_hosts_are_redirected(self):
+        video = "http://s1.attacker.example/video/1/file.m3u8"
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            response = await client.get("/", params={"video": video})
+
+        assert response.status_code == 301
+        assert response.headers["location"] == "http://cdn-host/s1/video/1/file.m3u8"
+        assert self.origin_requests == []
+
+
+if __name__ == "__main__":
+    unittest.main()
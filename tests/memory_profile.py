@@ -0,0 +1,352 @@
+"""
+Профилирование потребления памяти сервисом балансировщика. Результаты записываются в JSON файл, чтобы регрессии можно
+было отслеживать между версиями:
+
+* RSS интерпретатора до и после импорта сервиса, а также распределение памяти по модулям после импорта;
+* пик, количество выделенных байт и объектов и остаточный объём памяти на один запрос к `GET /` и `GET /settings`
+  (по данным tracemalloc);
+* рост памяти на длинной серии запросов (поиск утечек);
+* RSS/PSS воркеров Gunicorn сразу после запуска и после нагрузки.
+
+Запросы выполняются напрямую через ASGI интерфейс приложения, без HTTP клиента, чтобы в измерения не попадали
+выделения памяти на стороне клиента.
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any
+
+import aiohttp
+
+from tests.rps_test import balancer_env, balancer_host, make_requests
+from tests.utils import external_services, get_random_video_url, wait_for_balancer_api
+from wink_test.warmup import call_app
+
+project_root = Path(__file__).parent.parent
+
+profile_env = {
+    **balancer_env,
+    "PYTHONPATH": os.pathsep.join([str(project_root), str(project_root / "src"), os.environ.get("PYTHONPATH", "")]),
+}
+
+
+def read_process_memory(pid: int | str = "self") -> dict[str, int]:
+    """
+    Возвращает RSS, пиковый RSS и PSS процесса (в байтах) по данным `/proc`.
+
+    :param pid: ID процесса.
+    """
+
+    memory: dict[str, int] = {}
+    with open(f"/proc/{pid}/status") as status_file:
+        for line in status_file:
+            if line.startswith(("VmRSS:", "VmHWM:")):
+                name, value, _ = line.split()
+                memory[{"VmRSS:": "rss_bytes", "VmHWM:": "peak_rss_bytes"}[name]] = int(value) * 1024
+
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as smaps_file:
+            for line in smaps_file:
+                if line.startswith("Pss:"):
+                    memory["pss_bytes"] = int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    return memory
+
+
+def get_module_name(filename: str) -> str:
+    """
+    Возвращает имя модуля (пакета) верхнего уровня, которому принадлежит файл. Память, выделенная встроенными
+    модулями (например, байт-код загружаемых модулей в `<frozen importlib._bootstrap_external>`), учитывается по
+    имени файла как есть.
+    """
+
+    if filename.startswith("<"):
+        return filename
+
+    path = Path(filename)
+    for root in sorted((Path(p) for p in sys.path if p), key=lambda p: len(p.parts), reverse=True):
+        if path.is_relative_to(root):
+            return path.relative_to(root).parts[0].removesuffix(".py")
+    return "<other>"
+
+
+def import_probe():
+    """
+    Выполняется в отдельном процессе: измеряет память и время импорта сервиса и распределение памяти по модулям.
+    """
+
+    tracemalloc.start()
+    memory_before_import = read_process_memory()
+    start_time = time.perf_counter()
+
+    import wink_test.main  # noqa: F401
+
+    import_seconds = time.perf_counter() - start_time
+    memory_after_import = read_process_memory()
+
+    modules: dict[str, list[int]] = {}
+    for statistic in tracemalloc.take_snapshot().statistics("filename"):
+        module = modules.setdefault(get_module_name(statistic.traceback[0].filename), [0, 0])
+        module[0] += statistic.size
+        module[1] += statistic.count
+
+    print(
+        json.dumps(
+            {
+                "import_seconds": import_seconds,
+                "before_import": memory_before_import,
+                "after_import": memory_after_import,
+                "modules": [
+                    {"module": name, "bytes": size, "blocks": count}
+                    for name, (size, count) in sorted(modules.items(), key=lambda item: item[1][0], reverse=True)
+                ],
+            }
+        )
+    )
+
+
+def measure_import_memory() -> dict[str, Any]:
+    # Без tracemalloc, чтобы его собственные структуры не попали в RSS.
+    plain_import = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import json, time; t = time.perf_counter(); import wink_test.main; print(json.dumps(time.perf_counter() - t))",
+        ],
+        env=profile_env,
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    traced_import = subprocess.run(
+        [sys.executable, "-m", "tests.memory_profile", "--import-probe"],
+        env=profile_env,
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+
+    result = json.loads(traced_import.stdout)
+    result["import_seconds"] = json.loads(plain_import.stdout)
+    return result
+
+
+def get_request_params(path: str, index: int) -> dict[str, str] | None:
+    return {"video": get_random_video_url(index)} if path == "/" else None
+
+
+async def measure_request_allocations(app: Any, path: str, requests_count: int) -> dict[str, Any]:
+    """
+    Измеряет память на один запрос: средний пик (сколько памяти запрос занимает во время обработки), сколько байт и
+    объектов запрос оставляет до сборки мусора, и сколько памяти и блоков остаётся занятыми после неё.
+
+    Оставленные до сборки мусора байты и объекты (`uncollected_*`) - сумма разниц снимков tracemalloc до и после серии
+    запросов при отключенном сборщике мусора, делённая на количество запросов: объекты в циклических ссылках, которые
+    позже соберёт сборщик мусора, и удерживаемые объекты. Это не объём выделений: временные объекты, освобождённые по
+    счетчику ссылок до конца запроса, в неё не входят, а их объём ограничен сверху средним пиком.
+    """
+
+    for i in range(100):
+        await call_app(app, path, get_request_params(path, i))
+
+    gc.collect()
+    tracemalloc.start()
+    baseline_bytes, _ = tracemalloc.get_traced_memory()
+    baseline_blocks = sys.getallocatedblocks()
+    peak_bytes_sum = 0
+
+    for i in range(requests_count):
+        params = get_request_params(path, i)
+        current_bytes, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        await call_app(app, path, params)
+        _, peak_bytes = tracemalloc.get_traced_memory()
+        peak_bytes_sum += peak_bytes - current_bytes
+
+    gc.collect()
+    retained_bytes, _ = tracemalloc.get_traced_memory()
+    retained_blocks = sys.getallocatedblocks()
+
+    gc.disable()
+    try:
+        snapshot_before = tracemalloc.take_snapshot()
+        for i in range(requests_count):
+            await call_app(app, path, get_request_params(path, i))
+        snapshot_after = tracemalloc.take_snapshot()
+    finally:
+        gc.enable()
+    tracemalloc.stop()
+    gc.collect()
+
+    statistics_diff = snapshot_after.compare_to(snapshot_before, "lineno")
+    top_uncollected = sorted(statistics_diff, key=lambda statistic: statistic.size_diff, reverse=True)[:10]
+
+    return {
+        "requests": requests_count,
+        "peak_bytes_per_request": peak_bytes_sum / requests_count,
+        "uncollected_bytes_per_request": sum(statistic.size_diff for statistic in statistics_diff) / requests_count,
+        "uncollected_objects_per_request": sum(statistic.count_diff for statistic in statistics_diff) / requests_count,
+        "top_uncollected": [
+            {
+                "location": f"{statistic.traceback[0].filename}:{statistic.traceback[0].lineno}",
+                "bytes_per_request": statistic.size_diff / requests_count,
+                "objects_per_request": statistic.count_diff / requests_count,
+            }
+            for statistic in top_uncollected
+        ],
+        "retained_bytes_per_request": (retained_bytes - baseline_bytes) / requests_count,
+        "retained_blocks_per_request": (retained_blocks - baseline_blocks) / requests_count,
+    }
+
+
+async def measure_memory_growth(app: Any, requests_count: int, samples_count: int = 50) -> dict[str, Any]:
+    """
+    Выполняет серию запросов к `GET /` и оценивает рост RSS и количества выделенных блоков памяти.
+    """
+
+    sample_interval = max(requests_count // samples_count, 1)
+    samples: list[dict[str, int]] = []
+
+    for i in range(requests_count):
+        await call_app(app, "/", get_request_params("/", i))
+        if (i + 1) % sample_interval == 0:
+            gc.collect()
+            samples.append(
+                {
+                    "requests": i + 1,
+                    "rss_bytes": read_process_memory()["rss_bytes"],
+                    "allocated_blocks": sys.getallocatedblocks(),
+                }
+            )
+
+    requests = [sample["requests"] for sample in samples]
+    result: dict[str, Any] = {"requests": requests_count, "samples": samples}
+    if len(samples) >= 2:
+        result["rss_bytes_per_1000_requests"] = (
+            statistics.linear_regression(requests, [sample["rss_bytes"] for sample in samples]).slope * 1000
+        )
+        result["blocks_per_1000_requests"] = (
+            statistics.linear_regression(requests, [sample["allocated_blocks"] for sample in samples]).slope * 1000
+        )
+    return result
+
+
+async def profile_requests(requests_count: int, growth_requests_count: int) -> dict[str, Any]:
+    for name, value in balancer_env.items():
+        os.environ.setdefault(name, value)
+
+    from wink_test.main import app
+
+    async with app.router.lifespan_context(app):
+        return {
+            "requests": {
+                "GET /": await measure_request_allocations(app, "/", requests_count),
+                "GET /settings": await measure_request_allocations(app, "/settings", requests_count),
+            },
+            "growth": await measure_memory_growth(app, growth_requests_count),
+        }
+
+
+def get_child_pids(pid: int) -> list[int]:
+    with open(f"/proc/{pid}/task/{pid}/children") as children_file:
+        return [int(child_pid) for child_pid in children_file.read().split()]
+
+
+async def wait_for_workers():
+    async with aiohttp.ClientSession(base_url=f"http://{balancer_host}") as client:
+        await wait_for_balancer_api(client)
+
+
+def summarize_workers_memory(pids: list[int]) -> dict[str, Any]:
+    memory = [read_process_memory(pid) for pid in pids]
+    return {
+        "workers": memory,
+        "median_rss_bytes": statistics.median(item["rss_bytes"] for item in memory),
+        "total_pss_bytes": sum(item.get("pss_bytes", 0) for item in memory),
+    }
+
+
+def profile_workers(workers_count: int, load_requests_count: int) -> dict[str, Any]:
+    """
+    Запускает сервис через Gunicorn и измеряет память воркеров после запуска и после нагрузки.
+    """
+
+    start_cmd = [
+        "gunicorn",
+        "wink_test.main:app",
+        "--bind",
+        balancer_host,
+        "--workers",
+        str(workers_count),
+        "--worker-class",
+        "uvicorn.workers.UvicornWorker",
+    ]
+
+    with subprocess.Popen(
+        start_cmd, env=profile_env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    ) as balancer_process:
+        try:
+            asyncio.run(wait_for_workers())
+            time.sleep(1)
+            pids = get_child_pids(balancer_process.pid)
+            after_start = summarize_workers_memory(pids)
+
+            for start_index in range(0, load_requests_count, 1000):
+                asyncio.run(make_requests(range(start_index, min(start_index + 1000, load_requests_count))))
+
+            return {
+                "workers_count": len(pids),
+                "master": read_process_memory(balancer_process.pid),
+                "after_start": after_start,
+                "after_load": summarize_workers_memory(pids),
+            }
+        finally:
+            balancer_process.terminate()
+            balancer_process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Профилирование потребления памяти сервисом балансировщика.")
+    parser.add_argument("--output", type=Path, default=Path("memory_profile.json"), help="файл для результатов")
+    parser.add_argument("--requests", type=int, default=10_000, help="запросов для измерения выделений на запрос")
+    parser.add_argument("--growth-requests", type=int, default=1_000_000, help="запросов для поиска утечек")
+    parser.add_argument("--workers", type=int, default=9, help="количество воркеров Gunicorn")
+    parser.add_argument("--load-requests", type=int, default=10_000, help="запросов нагрузки на воркеры")
+    parser.add_argument("--skip-workers", action="store_true", help="не измерять память воркеров Gunicorn")
+    parser.add_argument("--import-probe", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.import_probe:
+        import_probe()
+        return
+
+    result: dict[str, Any] = {
+        "python": sys.version,
+        "platform": platform.platform(),
+        "timestamp": time.time(),
+        "import": measure_import_memory(),
+    }
+
+    with external_services():
+        result.update(asyncio.run(profile_requests(args.requests, args.growth_requests)))
+        if not args.skip_workers:
+            result["gunicorn"] = profile_workers(args.workers, args.load_requests)
+
+    args.output.write_text(json.dumps(result, indent=2))
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
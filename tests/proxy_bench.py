@@ -0,0 +1,173 @@
+"""
+Сравнение прямой работы сервиса (редирект отдаёт Python) и работы за nginx (Python только принимает решение в
+`GET /decide` по unix сокету, а редирект отдаёт nginx) по количеству запросов в секунду:
+
+    pdm run proxy-bench
+
+Если nginx не установлен, вместо него нагрузка подаётся на `GET /decide` напрямую через unix сокет с постоянными
+соединениями - так измеряется только сторона Python в работе за прокси.
+"""
+
+import argparse
+import asyncio
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+import aiohttp
+
+from tests.memory_profile import profile_env
+from tests.rps_test import balancer_host
+from tests.utils import external_services, get_random_video_url, wait_for_balancer_api
+
+proxy_host = "127.0.0.1:3001"
+
+nginx_config_template = """
+worker_processes auto;
+pid {prefix}/nginx.pid;
+error_log {prefix}/error.log warn;
+
+events {{
+    worker_connections 4096;
+}}
+
+http {{
+    access_log off;
+    client_body_temp_path {prefix}/client_body;
+    proxy_temp_path {prefix}/proxy;
+    fastcgi_temp_path {prefix}/fastcgi;
+    uwsgi_temp_path {prefix}/uwsgi;
+    scgi_temp_path {prefix}/scgi;
+    proxy_cache_path {prefix}/cache keys_zone=balancer_decisions:10m;
+
+    upstream balancer {{
+        server unix:{socket_path};
+        keepalive 64;
+    }}
+
+    server {{
+        listen {listen};
+
+        proxy_http_version 1.1;
+        proxy_set_header Connection "";
+        proxy_set_header X-Real-IP $remote_addr;
+
+        location = / {{
+            rewrite ^ /decide break;
+            proxy_pass http://balancer;
+            proxy_cache balancer_decisions;
+            proxy_cache_key $args;
+        }}
+
+        location @balancer_redirect {{
+            return 301 $upstream_http_x_balancer_location;
+        }}
+
+        location / {{
+            proxy_pass http://balancer;
+        }}
+    }}
+}}
+"""
+
+
+async def make_requests(client: aiohttp.ClientSession, path: str, header: str, requests_count: int):
+    await wait_for_balancer_api(client)
+
+    async def make_request(index: int):
+        response = await client.get(path, params={"video": get_random_video_url(index + 1)}, allow_redirects=False)
+        assert response.headers.get(header)
+
+    await asyncio.gather(*(make_request(i) for i in range(requests_count)))
+
+
+def measure_rps(base_url: str, path: str, header: str, requests_count: int, socket_path: str | None = None) -> float:
+    async def run():
+        connector = aiohttp.UnixConnector(path=socket_path) if socket_path else aiohttp.TCPConnector()
+        async with aiohttp.ClientSession(base_url=base_url, connector=connector, raise_for_status=True) as client:
+            start_time = time.perf_counter()
+            await make_requests(client, path, header, requests_count)
+            return requests_count / (time.perf_counter() - start_time)
+
+    return asyncio.run(run())
+
+
+def bench(name: str, rounds_count: int, *args, **kwargs) -> float:
+    # Первый раунд прогревает сервис.
+    measure_rps(*args, **kwargs)
+    median_rps = statistics.median(measure_rps(*args, **kwargs) for _ in range(rounds_count))
+    print(f"{name:<16} {median_rps:8.0f} req/s")
+    return median_rps
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение прямой работы сервиса и работы за nginx.")
+    parser.add_argument("--workers", type=int, default=8, help="количество воркеров Gunicorn")
+    parser.add_argument("--requests", type=int, default=3000, help="запросов в раунде")
+    parser.add_argument("--rounds", type=int, default=5, help="количество раундов")
+    parser.add_argument("--cache-ttl", type=int, default=0, help="время кэширования решений в nginx (в секундах)")
+    parser.add_argument("--nginx", default=shutil.which("nginx"), help="путь к nginx")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as prefix, external_services():
+        socket_path = str(Path(prefix) / "balancer.sock")
+        balancer_cmd = [
+            "gunicorn",
+            "-c",
+            "python:wink_test.gunicorn_conf",
+            "wink_test.main:app",
+            "--bind",
+            balancer_host,
+            "--bind",
+            f"unix:{socket_path}",
+            "--workers",
+            str(args.workers),
+            "--keep-alive",
+            "75",
+        ]
+        balancer_env = {
+            **profile_env,
+            "BALANCER_PROXY_INTEGRATION_ACCEL_REDIRECT": "@balancer_redirect",
+            "BALANCER_PROXY_INTEGRATION_CACHE_TTL": str(args.cache_ttl),
+        }
+
+        with subprocess.Popen(
+            balancer_cmd, env=balancer_env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        ) as balancer_process:
+            try:
+                bench("direct", args.rounds, f"http://{balancer_host}", "/", "location", args.requests)
+
+                if args.nginx:
+                    nginx_config_path = Path(prefix) / "nginx.conf"
+                    nginx_config_path.write_text(
+                        nginx_config_template.format(prefix=prefix, socket_path=socket_path, listen=proxy_host)
+                    )
+                    nginx_cmd = [args.nginx, "-p", prefix, "-c", str(nginx_config_path), "-g", "daemon off;"]
+                    with subprocess.Popen(nginx_cmd, stderr=subprocess.DEVNULL) as nginx_process:
+                        try:
+                            bench("nginx", args.rounds, f"http://{proxy_host}", "/", "location", args.requests)
+                        finally:
+                            nginx_process.terminate()
+                            nginx_process.wait()
+                else:
+                    print("nginx не найден, измеряется только GET /decide через unix сокет.")
+
+                bench(
+                    "decide (unix)",
+                    args.rounds,
+                    "http://localhost",
+                    "/decide",
+                    "x-balancer-location",
+                    args.requests,
+                    socket_path=socket_path,
+                )
+            finally:
+                balancer_process.terminate()
+                balancer_process.wait()
+
+
+if __name__ == "__main__":
+    main()
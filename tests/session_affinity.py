@@ -0,0 +1,134 @@
+import unittest
+from typing import Any
+
+from pydantic import HttpUrl
+from redis.asyncio import Redis
+
+from tests.utils import external_services
+from wink_test.routers.balancer_api import make_decision
+from wink_test.session_affinity import SessionAffinityCache, SessionAffinitySettings
+from wink_test.settings import Settings
+from wink_test.shared_counter import LocalCounter
+
+playlist_url = HttpUrl("http://s1.origin-cluster/video/1/file.m3u8")
+segment_url = HttpUrl("http://s1.origin-cluster/video/1/segment-1.ts")
+other_video_url = HttpUrl("http://s1.origin-cluster/video/2/file.m3u8")
+
+
+class TestSessionAffinityCache(unittest.IsolatedAsyncioTestCase):
+    """
+    Тестирование кэша привязки сессий в памяти воркера.
+    """
+
+    async def test_segments_follow_playlist_decision(self):
+        cache = SessionAffinityCache(SessionAffinitySettings())
+
+        assert await cache.get("10.0.0.1", playlist_url, now=0) is None
+        assert await cache.remember("10.0.0.1", playlist_url, True, now=0)
+        assert await cache.get("10.0.0.1", segment_url, now=1) is True
+        assert await cache.get("10.0.0.2", segment_url, now=1) is None
+        assert await cache.get("10.0.0.1", other_video_url, now=1) is None
+
+        assert (cache.hits_count, cache.misses_count, cache.size) == (1, 3, 1)
+
+    async def test_ttl_is_sliding(self):
+        cache = SessionAffinityCache(SessionAffinitySettings(ttl=10))
+        await cache.remember("10.0.0.1", playlist_url, False, now=0)
+
+        assert await cache.get("10.0.0.1", segment_url, now=8) is False
+        assert await cache.get("10.0.0.1", segment_url, now=16) is False
+        assert await cache.get("10.0.0.1", segment_url, now=27) is None
+        assert cache.size == 0
+        assert cache.evictions_count == 1
+
+    async def test_size_is_bounded(self):
+        cache = SessionAffinityCache(SessionAffinitySettings(max_entries=2))
+        await cache.remember("10.0.0.1", playlist_url, True, now=0)
+        await cache.remember("10.0.0.2", playlist_url, True, now=1)
+        await cache.get("10.0.0.1", segment_url, now=2)
+        await cache.remember("10.0.0.3", playlist_url, True, now=3)
+
+        assert cache.size == 2
+        # Вытеснена давно не использовавшаяся сессия.
+        assert await cache.get("10.0.0.2", segment_url, now=4) is None
+        assert await cache.get("10.0.0.1", segment_url, now=4) is True
+
+
+class TestDecisionAffinity(unittest.IsolatedAsyncioTestCase):
+    """
+    Тестирование привязки сессий при принятии решения.
+    """
+
+    async def test_unknown_client_is_not_bound(self):
+        settings = Settings(
+            cdn_host="http://cdn-domain",  # type: ignore
+            redirect_ratio="1:1",  # type: ignore
+            redis_url="redis://localhost",  # type: ignore
+        )
+        cache = SessionAffinityCache(SessionAffinitySettings())
+        counter = LocalCounter()
+
+        decisions = [
+            (await make_decision("", url, counter, settings, None, cache)).should_redirect_to_cdn
+            for url in (playlist_url, segment_url)
+        ]
+
+        assert decisions == [True, False]
+        assert (cache.hits_count, cache.misses_count, cache.size) == (0, 0, 0)
+
+
+class TestSharedSessionAffinityCache(unittest.IsolatedAsyncioTestCase):
+    """
+    Тестирование привязки сессий, общей для воркеров через Redis.
+    """
+
+    def run(self, result: Any = None):
+        with external_services():
+            super().run(result)
+
+    async def asyncSetUp(self):
+        self.redis_client = Redis(host="localhost")
+        self.settings = SessionAffinitySettings(shared=True)
+
+    async def asyncTearDown(self):
+        keys = await self.redis_client.keys(SessionAffinityCache.redis_namespace + ":*")
+        if keys:
+            await self.redis_client.delete(*keys)
+        await self.redis_client.aclose()
+
+    async def test_decision_is_shared_between_workers(self):
+        first_worker_cache = SessionAffinityCache(self.settings, self.redis_client)
+        second_worker_cache = SessionAffinityCache(self.settings, self.redis_client)
+
+        assert await first_worker_cache.get("10.0.0.1", playlist_url) is None
+        assert await first_worker_cache.remember("10.0.0.1", playlist_url, True)
+
+        assert await second_worker_cache.get("10.0.0.1", segment_url) is True
+        assert second_worker_cache.shared_hits_count == 1
+
+        # Решение, запомненное первым, не перезаписывается одновременно начатой сессией в другом воркере.
+        assert await second_worker_cache.remember("10.0.0.1", playlist_url, False) is True
+
+    async def test_local_hits_refresh_shared_ttl(self):
+        cache = SessionAffinityCache(SessionAffinitySettings(ttl=10, shared=True), self.redis_client)
+        redis_key = cache.redis_namespace + ":" + cache.get_session_key("10.0.0.1", playlist_url)
+        await cache.remember("10.0.0.1", playlist_url, True, now=0)
+
+        # Продление не чаще раза в половину времени жизни.
+        for now in range(1, 5):
+            assert await cache.get("10.0.0.1", segment_url, now=now) is True
+        assert cache.shared_refreshes_count == 0
+
+        await self.redis_client.pexpire(redis_key, 1000)
+        assert await cache.get("10.0.0.1", segment_url, now=5) is True
+        assert cache.shared_refreshes_count == 1
+        assert await self.redis_client.pttl(redis_key) > 9000
+
+        # Истёкшая в Redis привязка восстанавливается.
+        await self.redis_client.delete(redis_key)
+        assert await cache.get("10.0.0.1", segment_url, now=10) is True
+        assert await self.redis_client.get(redis_key) == b"1"
+
+
+if __name__ == "__main__":
+    unittest.main()
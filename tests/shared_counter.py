@@ -0,0 +1,124 @@
+import asyncio
+import threading
+import unittest
+from fractions import Fraction
+from types import SimpleNamespace
+from typing import Any
+
+from redis.asyncio import Redis
+
+from tests.utils import external_services
+from wink_test.balancer import calculate_should_redirect_to_cdn
+from wink_test.gunicorn_conf import pre_fork
+from wink_test.shared_counter import LocalCounter, SharedCounter, SharedCounterSettings
+
+
+class TestSharedCounterSettings(unittest.TestCase):
+    def test_stripe_out_of_range(self):
+        with self.assertRaises(ValueError):
+            SharedCounterSettings(stripes=4, stripe=4)
+
+    def test_worker_stripe(self):
+        settings = SharedCounterSettings(stripes=4, stripe=2)
+        assert [settings.get_stripe(worker_index) for worker_index in range(4)] == [2, 3, 0, 1]
+        assert SharedCounterSettings().get_stripe(3) == 0
+
+
+class TestGunicornWorkerIndex(unittest.TestCase):
+    def test_restarted_worker_takes_free_index(self):
+        server = SimpleNamespace(WORKERS={})
+        for pid in range(3):
+            worker = SimpleNamespace()
+            pre_fork(server, worker)
+            server.WORKERS[pid] = worker
+
+        del server.WORKERS[1]
+        restarted_worker = SimpleNamespace()
+        pre_fork(server, restarted_worker)
+
+        assert [worker.index for worker in server.WORKERS.values()] == [0, 2]
+        assert restarted_worker.index == 1
+
+
+class TestSharedCounterKeys(unittest.TestCase):
+    def test_single_stripe_key(self):
+        counter = SharedCounter(Redis(), "request-counter")
+        assert counter.redis_counter_keys == ["shared-counter:request-counter"]
+
+    def test_striped_keys(self):
+        counter = SharedCounter(Redis(), "request-counter", stripes=2, stripe=1, hash_tag=True)
+        assert counter.redis_counter_keys == [
+            "shared-counter:{request-counter:0}",
+            "shared-counter:{request-counter:1}",
+        ]
+        assert counter.redis_counter_key == "shared-counter:{request-counter:1}"
+
+
+class TestStripedSharedCounter(unittest.IsolatedAsyncioTestCase):
+    """
+    Тестирование счетчика с полосами на Redis.
+    """
+
+    def run(self, result: Any = None):
+        with external_services():
+            super().run(result)
+
+    async def asyncSetUp(self):
+        self.redis_client = Redis(host="localhost")
+        self.counters = [SharedCounter(self.redis_client, "test-counter", stripes=4, stripe=i) for i in range(4)]
+        await self.counters[0].reset()
+
+    async def asyncTearDown(self):
+        await self.counters[0].reset()
+        await self.redis_client.aclose()
+
+    async def test_get_aggregates_stripes(self):
+        values = [await self.counters[i % 3].increment() for i in range(10)]
+        assert values == [1, 1, 1, 2, 2, 2, 3, 3, 3, 4]
+
+        assert await self.counters[0].get_stripe() == 4
+        assert await self.counters[3].get_stripe() == 0
+        assert await self.counters[3].get_stripes() == [4, 3, 3, 0]
+        assert await self.counters[3].get() == 10
+
+    async def test_ratio_within_stripes_count(self):
+        redirect_ratio = Fraction(3, 1)
+        cdn_requests_count = 0
+        for i in range(1001):
+            request_index = await self.counters[i * 7 % 4].increment() - 1
+            cdn_requests_count += await calculate_should_redirect_to_cdn(request_index, redirect_ratio)
+
+        assert abs(cdn_requests_count - 1001 * 3 / 4) <= 4
+
+
+class TestLocalCounter(unittest.TestCase):
+    """
+    Тестирование счетчика в памяти процесса с полосами по потокам.
+    """
+
+    def test_threads_use_own_stripes(self):
+        counter = LocalCounter()
+        redirect_ratio = Fraction(3, 1)
+        cdn_requests_counts: list[int] = []
+
+        async def make_requests(count: int):
+            cdn_requests_count = 0
+            for _ in range(count):
+                request_index = await counter.increment() - 1
+                cdn_requests_count += await calculate_should_redirect_to_cdn(request_index, redirect_ratio)
+            cdn_requests_counts.append(cdn_requests_count)
+
+        threads = [threading.Thread(target=asyncio.run, args=(make_requests(1000 + i),)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert counter.stripes == 4
+        assert sorted(asyncio.run(counter.get_stripes())) == [1000, 1001, 1002, 1003]
+        assert asyncio.run(counter.get()) == 4006
+        assert abs(sum(cdn_requests_counts) - 4006 * 3 / 4) <= 4
+
+
+if __name__ == "__main__":
+    unittest.main()
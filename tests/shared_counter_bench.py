@@ -0,0 +1,112 @@
+"""
+Тестирование пропускной способности счетчика запросов с разным количеством полос (по умолчанию 1, 4 и 16) на
+локальном Redis. Каждый процесс имитирует воркер балансировщика: читает значение своей полосы, принимает решение
+о редиректе и увеличивает полосу. Помимо пропускной способности выводится отклонение доли редиректов на CDN от
+заданного отношения.
+"""
+
+import argparse
+import asyncio
+import time
+from concurrent import futures
+from fractions import Fraction
+
+from redis.asyncio import Redis
+
+from tests.utils import external_services
+from wink_test.balancer import calculate_should_redirect_to_cdn
+from wink_test.shared_counter import SharedCounter
+
+redirect_ratio = Fraction(3, 1)
+
+
+async def run_worker(stripes: int, stripe: int, requests_count: int, concurrency: int, hash_tag: bool) -> int:
+    """
+    Выполняет `requests_count` запросов к счетчику в `concurrency` параллельных задачах и возвращает количество
+    редиректов на CDN.
+    """
+
+    redis_client = Redis(host="localhost", max_connections=concurrency)
+    counter = SharedCounter(redis_client, "bench-counter", stripes=stripes, stripe=stripe, hash_tag=hash_tag)
+    cdn_requests_count = 0
+
+    async def make_requests(count: int):
+        nonlocal cdn_requests_count
+        for _ in range(count):
+            request_index = await counter.increment() - 1
+            cdn_requests_count += await calculate_should_redirect_to_cdn(request_index, redirect_ratio)
+
+    try:
+        await asyncio.gather(
+            *(
+                make_requests(requests_count // concurrency + (i < requests_count % concurrency))
+                for i in range(concurrency)
+            )
+        )
+    finally:
+        await redis_client.aclose()
+    return cdn_requests_count
+
+
+def run_worker_process(stripes: int, stripe: int, requests_count: int, concurrency: int, hash_tag: bool) -> int:
+    return asyncio.run(run_worker(stripes, stripe, requests_count, concurrency, hash_tag))
+
+
+async def reset_counter(stripes: int, hash_tag: bool):
+    redis_client = Redis(host="localhost")
+    try:
+        await SharedCounter(redis_client, "bench-counter", stripes=stripes, hash_tag=hash_tag).reset()
+    finally:
+        await redis_client.aclose()
+
+
+async def read_counter(stripes: int, hash_tag: bool) -> int:
+    redis_client = Redis(host="localhost")
+    try:
+        return await SharedCounter(redis_client, "bench-counter", stripes=stripes, hash_tag=hash_tag).get()
+    finally:
+        await redis_client.aclose()
+
+
+def bench(stripes: int, workers_count: int, requests_count: int, concurrency: int, hash_tag: bool):
+    asyncio.run(reset_counter(stripes, hash_tag))
+
+    with futures.ProcessPoolExecutor(workers_count) as executor:
+        start_time = time.perf_counter()
+        results = executor.map(
+            run_worker_process,
+            [stripes] * workers_count,
+            [worker_index % stripes for worker_index in range(workers_count)],
+            [requests_count] * workers_count,
+            [concurrency] * workers_count,
+            [hash_tag] * workers_count,
+        )
+        cdn_requests_count = sum(results)
+        elapsed_time = time.perf_counter() - start_time
+
+    total_requests_count = workers_count * requests_count
+    expected_cdn_requests_count = total_requests_count * redirect_ratio / (1 + redirect_ratio)
+    print(
+        f"K={stripes:<3} {total_requests_count / elapsed_time:10.0f} req/s, "
+        f"counter total {asyncio.run(read_counter(stripes, hash_tag))}/{total_requests_count}, "
+        f"CDN redirects {cdn_requests_count} (expected {float(expected_cdn_requests_count):.0f})"
+    )
+    asyncio.run(reset_counter(stripes, hash_tag))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Тестирование пропускной способности счетчика запросов с полосами.")
+    parser.add_argument("--stripes", type=int, nargs="+", default=[1, 4, 16], help="количество полос")
+    parser.add_argument("--workers", type=int, default=8, help="количество процессов")
+    parser.add_argument("--requests", type=int, default=20_000, help="запросов на процесс")
+    parser.add_argument("--concurrency", type=int, default=16, help="параллельных запросов в процессе")
+    parser.add_argument("--hash-tag", action="store_true", help="заключать имена полос в hash tag")
+    args = parser.parse_args()
+
+    with external_services():
+        for stripes in args.stripes:
+            bench(stripes, args.workers, args.requests, args.concurrency, args.hash_tag)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import unittest
+from fractions import Fraction
+
+import numpy as np
+
+from wink_test.balancer import calculate_should_redirect_to_cdn
+from wink_test.simulator import (
+    HostTable,
+    ReplayResult,
+    RequestsChunk,
+    calculate_should_redirect_to_cdn_vectorized,
+    hash_fixed_strings,
+    replay,
+    unique_fixed_strings,
+)
+
+
+class TestVectorizedDecision(unittest.IsolatedAsyncioTestCase):
+    """
+    Векторный расчёт решений должен совпадать с расчётом балансировщика.
+    """
+
+    async def test_matches_balancer_decision(self):
+        request_indices = np.concatenate(
+            [np.arange(1000, dtype=np.int64), np.arange(2**40, 2**40 + 1000, dtype=np.int64)]
+        )
+        redirect_ratios = {Fraction(cdn, origin) for cdn in range(1, 13) for origin in range(1, 13)}
+        for redirect_ratio in sorted(redirect_ratios | {Fraction(99, 1), Fraction(1, 99), Fraction(97, 89)}):
+            expected = [await calculate_should_redirect_to_cdn(int(i), redirect_ratio) for i in request_indices]
+            actual = calculate_should_redirect_to_cdn_vectorized(request_indices, redirect_ratio)
+            self.assertEqual(actual.tolist(), expected, redirect_ratio)
+
+
+class TestUniqueFixedStrings(unittest.TestCase):
+    """
+    Группировка хостов журнала решений не должна объединять разные хосты с одинаковым хэшем.
+    """
+
+    def test_hash_collision(self):
+        # Хэш - сумма слов с множителями, поэтому сдвиг двух слов на взаимные множители хэш не меняет.
+        multipliers = [0x9E3779B97F4A7C15 * (i * 2 + 1) % 2**64 for i in range(2)]
+        colliding_words = np.zeros(8, dtype="<u8")
+        colliding_words[0] = multipliers[1]
+        colliding_words[1] = (-multipliers[0]) % 2**64
+        colliding_host = colliding_words.view("S64")[0]
+        hosts = np.array([b"s1.origin-cluster", colliding_host, b"", b"s1.origin-cluster", b""], dtype="S64")
+
+        hashes = hash_fixed_strings(hosts)
+        self.assertEqual(hashes[1], hashes[2])
+
+        first_indices, inverse = unique_fixed_strings(hosts)
+        self.assertEqual(len(first_indices), 3)
+        self.assertEqual(hosts[first_indices][inverse].tolist(), hosts.tolist())
+        self.assertEqual(inverse[0], inverse[3])
+        self.assertNotEqual(inverse[1], inverse[2])
+
+    def test_without_collisions(self):
+        hosts = np.array([b"s1.origin-cluster", b"s2.origin-cluster", b"s1.origin-cluster"], dtype="S64")
+        first_indices, inverse = unique_fixed_strings(hosts)
+
+        self.assertEqual(sorted(first_indices.tolist()), [0, 1])
+        self.assertEqual(hosts[first_indices][inverse].tolist(), hosts.tolist())
+
+
+class TestReplay(unittest.TestCase):
+    """
+    Тестирование симуляции распределения нагрузки.
+    """
+
+    def test_load_is_split_by_ratio_and_origin(self):
+        host_table = HostTable()
+        codes = np.array([host_table.get_code("s1.origin-cluster"), host_table.get_code("s2.origin-cluster")])
+        chunks = [
+            RequestsChunk(
+                timestamps_ns=np.arange(start, start + 400, dtype=np.int64) * 10_000_000,
+                host_codes=codes[np.arange(start, start + 400) % 2],
+            )
+            for start in (0, 400)
+        ]
+
+        (result,) = replay(chunks, host_table, [Fraction(3, 1)])
+        summary = result.summarize(host_table.hosts)
+
+        self.assertEqual(summary["requests"], 800)
+        self.assertEqual(summary["cdn_requests"], 600)
+        self.assertEqual(summary["seconds"], 8)
+        self.assertEqual(result.cdn_per_second.tolist(), [75] * 8)
+        self.assertEqual(summary["max_origin_burst"], 1)
+
+    def test_not_rewritable_hosts_stay_on_origin(self):
+        host_table = HostTable()
+        code = host_table.get_code("origin-cluster")
+
+        (result,) = replay(
+            [RequestsChunk(np.zeros(10, dtype=np.int64), np.full(10, code))], host_table, [Fraction(3, 1)]
+        )
+
+        self.assertEqual(result.summarize(host_table.hosts)["origin_requests"], 10)
+        self.assertEqual(result.max_origin_burst, 10)
+
+    def test_origin_burst_spans_chunks(self):
+        result = ReplayResult(Fraction(1, 1))
+        result.update_origin_burst(np.array([False, True, True]))
+        result.update_origin_burst(np.array([True, True, False, True]))
+
+        self.assertEqual(result.max_origin_burst, 4)
+        self.assertEqual(result.current_origin_burst, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
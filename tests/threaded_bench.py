@@ -0,0 +1,94 @@
+"""
+Сравнение режима с несколькими процессами (Gunicorn, N воркеров) и режима с несколькими потоками
+(`wink_test.threaded_server`, N потоков) по количеству запросов в секунду и потреблению памяти. Режим с потоками имеет
+смысл запускать интерпретатором без GIL:
+
+    pdm run threaded-bench --threaded-python python3.13t
+"""
+
+import argparse
+import asyncio
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any
+
+from tests.memory_profile import get_child_pids, profile_env, read_process_memory
+from tests.rps_test import balancer_host, make_requests
+from tests.utils import external_services
+
+
+def measure_rps(requests_count: int, rounds_count: int) -> list[float]:
+    rps_values: list[float] = []
+    for _ in range(rounds_count):
+        start_time = time.perf_counter()
+        asyncio.run(make_requests(range(requests_count)))
+        rps_values.append(requests_count / (time.perf_counter() - start_time))
+    return rps_values
+
+
+def bench(
+    name: str, start_cmd: list[str], env: dict[str, str], requests_count: int, rounds_count: int
+) -> dict[str, Any]:
+    with subprocess.Popen(start_cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL) as process:
+        try:
+            # Первый раунд ждёт готовности сервиса и прогревает его.
+            measure_rps(requests_count, 1)
+            rps_values = measure_rps(requests_count, rounds_count)
+
+            pids = [process.pid, *get_child_pids(process.pid)]
+            memory = [read_process_memory(pid) for pid in pids]
+            result = {
+                "name": name,
+                "median_rps": statistics.median(rps_values),
+                "processes": len(pids),
+                "total_rss_bytes": sum(item["rss_bytes"] for item in memory),
+                "total_pss_bytes": sum(item.get("pss_bytes", 0) for item in memory),
+            }
+        finally:
+            process.terminate()
+            process.wait()
+
+    print(
+        f"{result['name']:<10} {result['median_rps']:8.0f} req/s, processes: {result['processes']}, "
+        f"RSS: {result['total_rss_bytes'] / 2**20:.1f} MiB, PSS: {result['total_pss_bytes'] / 2**20:.1f} MiB"
+    )
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение режимов с несколькими процессами и потоками.")
+    parser.add_argument("--workers", type=int, default=8, help="количество воркеров Gunicorn и потоков")
+    parser.add_argument("--requests", type=int, default=3000, help="запросов в раунде")
+    parser.add_argument("--rounds", type=int, default=5, help="количество раундов")
+    parser.add_argument("--threaded-python", default=sys.executable, help="интерпретатор для режима с потоками")
+    args = parser.parse_args()
+
+    processes_cmd = [
+        "gunicorn",
+        "-c",
+        "python:wink_test.gunicorn_conf",
+        "wink_test.main:app",
+        "--bind",
+        balancer_host,
+        "--workers",
+        str(args.workers),
+    ]
+    threads_cmd = [
+        args.threaded_python,
+        "-m",
+        "wink_test.threaded_server",
+        "--bind",
+        balancer_host,
+        "--threads",
+        str(args.workers),
+    ]
+
+    with external_services():
+        bench("processes", processes_cmd, profile_env, args.requests, args.rounds)
+        bench("threads", threads_cmd, {**profile_env, "PYTHON_GIL": "0"}, args.requests, args.rounds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+import base64
+import hashlib
+import hmac
+import unittest
+from urllib.parse import parse_qs, urlsplit
+
+from pydantic import HttpUrl, SecretStr, ValidationError
+
+from wink_test.balancer import BalancerSettings
+from wink_test.url_signing import UrlSigner, UrlSigningSettings
+
+
+class TestUrlSigner(unittest.TestCase):
+    """
+    Тестирование подписи URL на CDN.
+    """
+
+    def setUp(self):
+        self.settings = UrlSigningSettings(
+            keys={"k1": SecretStr("secret-1"), "k2": SecretStr("secret-2")}, active_key_id="k1", ttl=60, time_bucket=10
+        )
+        self.url = HttpUrl("http://cdn-domain/s1/video/1/file.m3u8")
+
+    def test_token_is_valid_hmac(self):
+        signed_url = urlsplit(UrlSigner().sign(self.url, self.settings, now=1005))
+        query = parse_qs(signed_url.query)
+
+        self.assertEqual(query["expires"], ["1070"])
+        self.assertEqual(query["kid"], ["k1"])
+        expected_token = base64.urlsafe_b64encode(
+            hmac.digest(b"secret-1", b"/s1/video/1/file.m3u8:1070", hashlib.sha256)
+        ).rstrip(b"=")
+        self.assertEqual(query["token"], [expected_token.decode()])
+
+    def test_signature_is_cached_within_time_bucket(self):
+        url_signer = UrlSigner()
+        first_url = url_signer.sign(self.url, self.settings, now=1000)
+        second_url = url_signer.sign(self.url, self.settings, now=1009)
+        third_url = url_signer.sign(self.url, self.settings, now=1010)
+
+        self.assertEqual(first_url, second_url)
+        self.assertNotEqual(first_url, third_url)
+        cache_info = url_signer.get_cache_info()
+        self.assertEqual((cache_info.hits, cache_info.misses), (1, 2))
+
+    def test_key_rotation(self):
+        url_signer = UrlSigner()
+        url_signer.sign(self.url, self.settings, now=1000)
+        rotated_settings = self.settings.model_copy(update={"active_key_id": "k2"})
+        signed_url = urlsplit(url_signer.sign(self.url, rotated_settings, now=1000))
+
+        self.assertEqual(parse_qs(signed_url.query)["kid"], ["k2"])
+        self.assertEqual(url_signer.get_cache_info().misses, 1)
+
+    def test_token_uses_key_of_passed_settings(self):
+        url_signer = UrlSigner()
+        first_url = url_signer.sign(self.url, self.settings, now=1000)
+        changed_settings = self.settings.model_copy(update={"keys": {**self.settings.keys, "k1": SecretStr("changed")}})
+
+        self.assertNotEqual(url_signer.sign(self.url, changed_settings, now=1000), first_url)
+        self.assertEqual(url_signer.sign(self.url, self.settings, now=1000), first_url)
+
+    def test_masked_keys_are_restored(self):
+        masked_settings = UrlSigningSettings.model_validate_json(
+            '{"keys": {"k1": "**********", "k3": "secret-3"}, "active_key_id": "k3"}'
+        )
+        restored_settings = masked_settings.restore_masked_keys(self.settings)
+
+        self.assertEqual(
+            {key_id: key.get_secret_value() for key_id, key in restored_settings.keys.items()},
+            {"k1": "secret-1", "k3": "secret-3"},
+        )
+        self.assertEqual(restored_settings.active_key_id, "k3")
+
+    def test_masked_unknown_key_is_rejected(self):
+        masked_settings = UrlSigningSettings.model_validate_json(
+            '{"keys": {"k9": "**********"}, "active_key_id": "k9"}'
+        )
+        with self.assertRaises(ValueError):
+            masked_settings.restore_masked_keys(self.settings)
+        with self.assertRaises(ValueError):
+            masked_settings.restore_masked_keys(None)
+
+    def test_active_key_must_exist(self):
+        with self.assertRaises(ValidationError):
+            UrlSigningSettings(keys={"k1": SecretStr("secret-1")}, active_key_id="k2")
+
+    def test_settings_version_depends_on_signing(self):
+        balancer_settings = BalancerSettings(cdn_host=HttpUrl("http://cdn-domain"), redirect_ratio="1:1")
+        signed_settings = balancer_settings.model_copy(update={"url_signing": self.settings})
+        rotated_settings = balancer_settings.model_copy(
+            update={"url_signing": self.settings.model_copy(update={"active_key_id": "k2"})}
+        )
+
+        self.assertEqual(len({balancer_settings.version, signed_settings.version, rotated_settings.version}), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -37,7 +37,7 @@ async def wait_for_balancer_api(client: aiohttp.ClientSession):
 
     for _ in range(5):
         try:
-            response = await client.get("/health")
+            response = await client.get("/ready")
             if response.status == 200:
                 return
         except aiohttp.client_exceptions.ClientError:
@@ -0,0 +1,61 @@
+import unittest
+from typing import Any
+
+from pydantic import HttpUrl, SecretStr
+
+from wink_test.admission import AdmissionController, AdmissionSettings
+from wink_test.dependencies import get_app_state, get_url_signer, warmup_request_counter
+from wink_test.main import app
+from wink_test.settings import Settings
+from wink_test.shared_counter import LocalCounter
+from wink_test.url_signing import UrlSigningSettings
+from wink_test.warmup import WarmupError, send_requests
+
+
+class TestSendRequests(unittest.IsolatedAsyncioTestCase):
+    """
+    Тестирование служебных запросов прогрева. Запросы считаются счетчиком в памяти, поэтому Redis не нужен.
+    """
+
+    def setUp(self):
+        app_state = get_app_state()
+        self.saved_settings = app_state.settings
+        self.saved_admission_controller = app_state.loop.admission_controller
+        app_state.settings = Settings(
+            cdn_host=HttpUrl("http://cdn-domain"),
+            redirect_ratio="1:1",  # type: ignore
+            redis_url="redis://localhost",  # type: ignore
+            url_signing=UrlSigningSettings(keys={"k1": SecretStr("secret")}, active_key_id="k1"),
+        )
+        self.url_signer = get_url_signer()
+        self.token = warmup_request_counter.set(LocalCounter())
+
+    def tearDown(self):
+        warmup_request_counter.reset(self.token)
+        app_state = get_app_state()
+        app_state.settings = self.saved_settings
+        app_state.loop.admission_controller = self.saved_admission_controller
+
+    async def test_failed_request_fails_warmup(self):
+        async def failing_app(scope: dict[str, Any], receive: Any, send: Any):
+            await send({"type": "http.response.start", "status": 500, "headers": []})
+            await send({"type": "http.response.body", "body": b""})
+
+        with self.assertRaises(WarmupError):
+            await send_requests(failing_app, 1)
+
+    async def test_requests_are_isolated(self):
+        # Контроллер с занятым единственным слотом отклонил бы запрос клиента.
+        controller = AdmissionController(AdmissionSettings(max_concurrency=1, max_queue_size=0, rate_limit=0.001))
+        self.assertTrue(await controller.acquire())
+        get_app_state().loop.admission_controller = controller
+        signed_count = self.url_signer.signed_count
+
+        await send_requests(app, 3)
+
+        self.assertEqual((controller.shed_count, controller.rate_limited_count, controller.admitted_count), (0, 0, 1))
+        self.assertEqual(self.url_signer.signed_count, signed_count)
+
+
+if __name__ == "__main__":
+    unittest.main()